@@ -13,14 +13,35 @@ values. The following instructions are recognized:
     * div rd, rs1, rs2: rd = rs1 // rs2 (signed integer division)
     * slt rd, rs1, rs2: rd = (rs1 < rs2) ? 1 : 0 (signed comparison)
     * slti rd, rs1, imm: rd = (rs1 < imm) ? 1 : 0
+    * beq rs1, rs2, lab: pc = lab if rs1 == rs2
+    * bne rs1, rs2, lab: pc = lab if rs1 != rs2
+    * blt rs1, rs2, lab: pc = lab if rs1 < rs2 (signed comparison)
+    * jal rd, lab: rd = pc + 1; pc = lab
+    * sll rd, rs1, rs2: rd = rs1 << rs2
+    * slli rd, rs1, imm: rd = rs1 << imm
+    * srai rd, rs1, imm: rd = rs1 >> imm (arithmetic shift)
+    * and rd, rs1, rs2: rd = rs1 & rs2
+    * andi rd, rs1, imm: rd = rs1 & imm
+    * lw rd, rs1, imm: rd = mem[rs1 + imm] (32-bit word, signed)
+    * lb rd, rs1, imm: rd = mem[rs1 + imm] (byte, signed)
+    * sw rs1, rs2, imm: mem[rs1 + imm] = rs2 (lower 32 bits)
+    * sb rs1, rs2, imm: mem[rs1 + imm] = rs2 (lower 8 bits)
+
+Labels are not instructions: they are names that the program associates with
+positions in its list of instructions (see Program.add_label). Loads and
+stores work on the data memory of the program (see Memory), which is a
+linear array of bytes, separate from the environment. Words are stored in
+little-endian order, and need not be aligned.
 
 This file uses doctests all over. To test it, just run python 3 as follows:
 "python3 -m doctest Asm.py". The program uses syntax that is excluive of
 Python 3. It will not work with standard Python 2.
 """
 
+import struct
 import sys
-from collections import deque
+from collections import deque, ChainMap
+from types import MappingProxyType
 from abc import ABC, abstractmethod
 
 
@@ -29,12 +50,15 @@ class Program:
     The 'Program' is a list of instructions plus an environment that associates
     names with values, plus a program counter, which marks the next instruction
     that must be executed. The environment contains a special variable x0,
-    which always contains the value zero.
+    which always contains the value zero. The program also keeps a table of
+    labels, which maps names to positions in the list of instructions.
     """
 
     def __init__(self, env, insts):
         self.__env = env
         self.__insts = insts
+        self.__labels = {}
+        self.__memory = None
         self.pc = 0
         self.__env["x0"] = 0
 
@@ -49,6 +73,35 @@ class Program:
     def add_inst(self, inst):
         self.__insts.append(inst)
 
+    def get_insts(self):
+        return self.__insts
+
+    def get_labels(self):
+        return self.__labels
+
+    def get_env(self):
+        return self.__env
+
+    def add_label(self, label):
+        """
+        Associates the label with the position of the next instruction that
+        will be added to the program. Branches and jumps to this label will
+        continue the execution from that instruction:
+
+        >>> p = Program({}, [Addi("a", "x0", 1)])
+        >>> p.add_label("L1")
+        >>> p.add_inst(Addi("b", "x0", 2))
+        >>> p.get_label("L1")
+        1
+        """
+        self.__labels[label] = len(self.__insts)
+
+    def get_label(self, label):
+        if label in self.__labels:
+            return self.__labels[label]
+        else:
+            sys.exit("Label error")
+
     def set_pc(self, pc):
         self.pc = pc
 
@@ -68,18 +121,61 @@ class Program:
         else:
             sys.exit("Def error")
 
+    def set_memory(self, memory):
+        self.__memory = memory
+
+    def has_memory(self):
+        return self.__memory is not None
+
+    def get_memory(self):
+        """
+        Returns the data memory of the program. Programs without memory
+        cannot run loads and stores:
+
+        >>> Program({}, [Lw("a", "x0", 0)]).eval()
+        Traceback (most recent call last):
+        ...
+        SystemExit: Memory error
+        """
+        if self.__memory is None:
+            sys.exit("Memory error")
+        return self.__memory
+
     def print_env(self):
         for name, val in sorted(self.__env.items()):
             print(f"{name}: {val}")
 
     def print_insts(self):
-        for inst in self.__insts:
-            print(inst)
+        """
+        Prints the instructions of the program, one per line. Labels are
+        printed before the instruction that they mark:
 
-    def eval(self):
+        >>> p = Program({}, [])
+        >>> p.add_inst(Beq("x0", "x0", "L1"))
+        >>> p.add_inst(Addi("a", "x0", 1))
+        >>> p.add_label("L1")
+        >>> p.print_insts()
+        beq x0 x0 L1
+        a = addi x0 1
+        L1:
+        """
+        labels = {}
+        for label, pc in self.__labels.items():
+            labels.setdefault(pc, []).append(label)
+        for pc in range(len(self.__insts) + 1):
+            for label in labels.get(pc, []):
+                print(f"{label}:")
+            if pc < len(self.__insts):
+                print(self.__insts[pc])
+
+    def eval(self, profiler=None, tracer=None):
         """
         This function evaluates a program until there is no more instructions to
-        evaluate.
+        evaluate. Instructions that call set_pc, such as branches and jumps,
+        change the next instruction that this loop fetches. If a profiler is
+        given (see Profiler.py), or a tracer (see Tracer.py), it runs the
+        program instead, and records its execution; otherwise, the program
+        runs in the loop below, which does no profiling nor tracing work.
 
         Example:
             >>> insts = [Add("x0", "b0", "b1"), Sub("x1", "x0", "b2")]
@@ -92,15 +188,174 @@ class Program:
             x0: 5
             x1: 1
         """
+        if profiler is not None:
+            profiler.run(self)
+            return
+        if tracer is not None:
+            tracer.run(self)
+            return
         inst = self.get_inst()
         while inst:
             inst.eval(self)
             inst = self.get_inst()
 
+    def snapshot(self):
+        """
+        Takes a snapshot of the environment and of the program counter, from
+        which new programs can be forked (see Snapshot). Later changes to
+        this program do not change the snapshot.
+
+        Example:
+            >>> p = Program({"a": 2}, [Mul("b", "a", "a"), Addi("c", "b", 1)])
+            >>> _ = p.get_inst().eval(p)
+            >>> s = p.snapshot()
+            >>> p.eval()
+            >>> p.set_val("b", 0)
+            >>> s.pc, sorted(s.env.items())
+            (1, [('a', 2), ('b', 4), ('x0', 0)])
+        """
+        return Snapshot(self)
+
+
+class Snapshot:
+    """
+    The frozen state of a program: its environment, its program counter, its
+    instructions and its labels. Each fork is a new Program that continues
+    from the snapshot. The environment of a fork is copy-on-write: it is a
+    ChainMap, whose first map receives the registers that the fork writes,
+    and whose second map is the frozen environment of the snapshot, which
+    all forks share. Thus, forking does not copy the environment, and each
+    fork only pays for the registers that it writes.
+
+    Forks share the instructions of the snapshot too, which the snapshot
+    copies into a tuple; thus, forks cannot add instructions. To run other
+    instructions after the snapshot, pass them to fork as a suffix. The data
+    memory of the program, if it has one, is copied into the snapshot, and
+    each fork gets its own copy of it, so forks do not see the stores of
+    each other.
+
+    Example:
+        >>> p = Program({"a": 2}, [Mul("b", "a", "a"), Add("c", "b", "n")])
+        >>> _ = p.get_inst().eval(p)
+        >>> s = p.snapshot()
+        >>> forks = [s.fork({"n": n}) for n in range(3)]
+        >>> for fork in forks:
+        ...     fork.eval()
+        >>> [fork.get_val("c") for fork in forks]
+        [4, 5, 6]
+        >>> dict(forks[1].get_env().maps[0])
+        {'n': 1, 'x0': 0, 'c': 5}
+    """
+
+    def __init__(self, prog):
+        self.env = MappingProxyType(dict(prog.get_env()))
+        self.pc = prog.pc
+        self.insts = tuple(prog.get_insts())
+        self.labels = dict(prog.get_labels())
+        self.memory = bytes(prog.get_memory().view) if prog.has_memory() else None
+
+    def fork(self, inputs=None, suffix=None):
+        """
+        Creates a program that continues from the snapshot, with the given
+        inputs added to its environment. If a suffix is given, which is a
+        Program, the fork runs the instructions and labels of the suffix,
+        from its first instruction, instead of the rest of the snapshot:
+
+        >>> s = Program({"a": 3}, [Addi("b", "a", 1)]).snapshot()
+        >>> fork = s.fork(suffix=Program({}, [Mul("c", "a", "a")]))
+        >>> fork.eval()
+        >>> fork.get_val("c"), "b" in fork.get_env()
+        (9, False)
+        """
+        env = ChainMap(dict(inputs or {}), self.env)
+        if suffix is not None:
+            prog = Program(env, suffix.get_insts())
+            prog.get_labels().update(suffix.get_labels())
+        else:
+            prog = Program(env, self.insts)
+            prog.get_labels().update(self.labels)
+            prog.set_pc(self.pc)
+        if self.memory is not None:
+            prog.set_memory(Memory(bytearray(self.memory)))
+        return prog
+
+
+class Memory:
+    """
+    The data memory of programs: a linear array of bytes. The memory wraps a
+    writable buffer, such as a bytearray, without copying it; thus, callers
+    can pass inputs in a buffer of their own, and read the outputs back from
+    it, or from the memoryviews that 'read' returns. A memory can also be
+    created empty, with a given size. Accesses outside of the buffer exit
+    with "Memory error".
+
+    Example:
+        >>> data = bytearray(8)
+        >>> p = Program({"v": -2}, [Sw("x0", "v", 4), Lb("a", "x0", 4), Lw("b", "x0", 4)])
+        >>> p.set_memory(Memory(data))
+        >>> p.eval()
+        >>> p.get_val("a"), p.get_val("b"), data.hex()
+        (-2, -2, '00000000feffffff')
+        >>> p = Program({}, [Lw("a", "x0", 6)])
+        >>> p.set_memory(Memory(8))
+        >>> p.eval()
+        Traceback (most recent call last):
+        ...
+        SystemExit: Memory error
+    """
+
+    WORD = struct.Struct("<i")
+    UWORD = struct.Struct("<I")
+
+    def __init__(self, data):
+        if isinstance(data, int):
+            data = bytearray(data)
+        self.view = memoryview(data).cast("B")
+        if self.view.readonly:
+            sys.exit("Memory error")
+        self.size = len(self.view)
+
+    def check(self, addr, width):
+        if addr < 0 or addr + width > self.size:
+            sys.exit("Memory error")
+
+    def load_word(self, addr):
+        self.check(addr, 4)
+        return self.WORD.unpack_from(self.view, addr)[0]
+
+    def store_word(self, addr, value):
+        self.check(addr, 4)
+        self.UWORD.pack_into(self.view, addr, value & 0xFFFFFFFF)
+
+    def load_byte(self, addr):
+        self.check(addr, 1)
+        return (self.view[addr] ^ 0x80) - 0x80
+
+    def store_byte(self, addr, value):
+        self.check(addr, 1)
+        self.view[addr] = value & 0xFF
+
+    def read(self, addr, length):
+        """
+        Returns a view of 'length' bytes from 'addr', without copying them:
+
+        >>> m = Memory(bytearray(b"abcdef"))
+        >>> bytes(m.read(1, 3))
+        b'bcd'
+        """
+        self.check(addr, length)
+        return self.view[addr:addr + length]
+
+    def write(self, addr, data):
+        self.check(addr, len(data))
+        self.view[addr:addr + len(data)] = data
 
-def max(a, b):
+
+def max(a, b, evaluate=Program.eval):
     """
-    This example computes the maximum between a and b.
+    This example computes the maximum between a and b. The program runs with
+    the 'evaluate' function, which can be replaced with other execution
+    engines, such as Threaded.run.
 
     Example:
         >>> max(2, 3)
@@ -123,15 +378,16 @@ def max(a, b):
     p.add_inst(Mul("t0", "t0", "rs1"))
     p.add_inst(Mul("t1", "t1", "rs2"))
     p.add_inst(Add("rd", "t0", "t1"))
-    p.eval()
+    evaluate(p)
     return p.get_val("rd")
 
 
-def distance_with_acceleration(V, A, T):
+def distance_with_acceleration(V, A, T, evaluate=Program.eval):
     """
     This example computes the position of an object, given its velocity (V),
     its acceleration (A) and the time (T), assuming that it starts at position
-    zero, using the formula D = V*T + (A*T^2)/2.
+    zero, using the formula D = V*T + (A*T^2)/2. Like in 'max', the program
+    runs with the 'evaluate' function.
 
     Example:
         >>> distance_with_acceleration(3, 4, 5)
@@ -147,7 +403,7 @@ def distance_with_acceleration(V, A, T):
     p.add_inst(Mul("t2", "rs2", "t1"))
     p.add_inst(Div("t2", "t2", "two"))
     p.add_inst(Add("rd", "t0", "t2"))
-    p.eval()
+    evaluate(p)
     return p.get_val("rd")
 
 
@@ -437,4 +693,380 @@ class Slti(BinOpImm):
         prog.set_val(self.rd, 1 if rs1 < self.imm else 0)
 
     def get_opcode(self):
-        return "slti"
\ No newline at end of file
+        return "slti"
+
+
+class Beq(Inst):
+    """
+    beq rs1, rs2, lab: pc = lab if rs1 == rs2
+
+    Example:
+        >>> i = Beq("b0", "b1", "L1")
+        >>> str(i)
+        'beq b0 b1 L1'
+
+        >>> p = Program(env={"b0":2, "b1":2}, insts=[])
+        >>> p.add_inst(Beq("b0", "b1", "L1"))
+        >>> p.add_inst(Addi("a", "x0", 1))
+        >>> p.add_label("L1")
+        >>> p.add_inst(Addi("b", "x0", 2))
+        >>> p.eval()
+        >>> p.print_env()
+        b: 2
+        b0: 2
+        b1: 2
+        x0: 0
+    """
+
+    def __init__(self, rs1, rs2, lab):
+        assert isinstance(rs1, str) and isinstance(rs2, str) and isinstance(lab, str)
+        self.rs1 = rs1
+        self.rs2 = rs2
+        self.lab = lab
+
+    def __str__(self):
+        op = self.get_opcode()
+        return f"{op} {self.rs1} {self.rs2} {self.lab}"
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        rs2 = prog.get_val(self.rs2)
+        if rs1 == rs2:
+            prog.set_pc(prog.get_label(self.lab))
+
+    def get_opcode(self):
+        return "beq"
+
+
+class Bne(Beq):
+    """
+    bne rs1, rs2, lab: pc = lab if rs1 != rs2
+
+    Example:
+        >>> i = Bne("b0", "b1", "L1")
+        >>> str(i)
+        'bne b0 b1 L1'
+
+        >>> p = Program(env={"b0":2, "b1":2}, insts=[])
+        >>> p.add_inst(Bne("b0", "b1", "L1"))
+        >>> p.add_inst(Addi("a", "x0", 1))
+        >>> p.add_label("L1")
+        >>> p.eval()
+        >>> p.get_val("a")
+        1
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        rs2 = prog.get_val(self.rs2)
+        if rs1 != rs2:
+            prog.set_pc(prog.get_label(self.lab))
+
+    def get_opcode(self):
+        return "bne"
+
+
+class Blt(Beq):
+    """
+    blt rs1, rs2, lab: pc = lab if rs1 < rs2 (signed comparison)
+
+    Example:
+        >>> i = Blt("b0", "b1", "L1")
+        >>> str(i)
+        'blt b0 b1 L1'
+
+        >>> p = Program(env={"b0":-3, "b1":2}, insts=[])
+        >>> p.add_inst(Addi("a", "x0", 0))
+        >>> p.add_label("L0")
+        >>> p.add_inst(Addi("a", "a", 1))
+        >>> p.add_inst(Addi("b0", "b0", 1))
+        >>> p.add_inst(Blt("b0", "b1", "L0"))
+        >>> p.eval()
+        >>> p.get_val("a")
+        5
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        rs2 = prog.get_val(self.rs2)
+        if rs1 < rs2:
+            prog.set_pc(prog.get_label(self.lab))
+
+    def get_opcode(self):
+        return "blt"
+
+
+class Jal(Inst):
+    """
+    jal rd, lab: rd = pc + 1; pc = lab
+    The register rd receives the position of the instruction that follows the
+    jump. As in RISC-V, "jal x0, lab" is an unconditional jump: the return
+    address is discarded, and x0 keeps the value zero.
+
+    Example:
+        >>> i = Jal("x0", "L1")
+        >>> str(i)
+        'x0 = jal L1'
+
+        >>> p = Program(env={}, insts=[])
+        >>> p.add_inst(Jal("ra", "L1"))
+        >>> p.add_inst(Addi("a", "x0", 1))
+        >>> p.add_label("L1")
+        >>> p.add_inst(Jal("x0", "L2"))
+        >>> p.add_label("L2")
+        >>> p.eval()
+        >>> p.print_env()
+        ra: 1
+        x0: 0
+    """
+
+    def __init__(self, rd, lab):
+        assert isinstance(rd, str) and isinstance(lab, str)
+        self.rd = rd
+        self.lab = lab
+
+    def __str__(self):
+        op = self.get_opcode()
+        return f"{self.rd} = {op} {self.lab}"
+
+    def eval(self, prog):
+        if self.rd != "x0":
+            prog.set_val(self.rd, prog.pc)
+        prog.set_pc(prog.get_label(self.lab))
+
+    def get_opcode(self):
+        return "jal"
+
+
+class Sll(BinOp):
+    """
+    sll rd, rs1, rs2: rd = rs1 << rs2
+
+    Example:
+        >>> i = Sll("a", "b0", "b1")
+        >>> str(i)
+        'a = sll b0 b1'
+
+        >>> p = Program(env={"b0":-3, "b1":2}, insts=[Sll("a", "b0", "b1")])
+        >>> p.eval()
+        >>> p.get_val("a")
+        -12
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        rs2 = prog.get_val(self.rs2)
+        prog.set_val(self.rd, rs1 << rs2)
+
+    def get_opcode(self):
+        return "sll"
+
+
+class Slli(BinOpImm):
+    """
+    slli rd, rs1, imm: rd = rs1 << imm
+
+    Example:
+        >>> i = Slli("a", "b0", 3)
+        >>> str(i)
+        'a = slli b0 3'
+
+        >>> p = Program(env={"b0":5}, insts=[Slli("a", "b0", 3)])
+        >>> p.eval()
+        >>> p.get_val("a")
+        40
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        prog.set_val(self.rd, rs1 << self.imm)
+
+    def get_opcode(self):
+        return "slli"
+
+
+class Srai(BinOpImm):
+    """
+    srai rd, rs1, imm: rd = rs1 >> imm (arithmetic shift)
+    The arithmetic shift rounds towards negative infinity; hence, shifting by
+    k is the same as the floor division that Div performs by 2^k.
+
+    Example:
+        >>> i = Srai("a", "b0", 1)
+        >>> str(i)
+        'a = srai b0 1'
+
+        >>> p = Program(env={"b0":-7}, insts=[Srai("a", "b0", 1)])
+        >>> p.eval()
+        >>> p.get_val("a")
+        -4
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        prog.set_val(self.rd, rs1 >> self.imm)
+
+    def get_opcode(self):
+        return "srai"
+
+
+class And(BinOp):
+    """
+    and rd, rs1, rs2: rd = rs1 & rs2
+
+    Example:
+        >>> i = And("a", "b0", "b1")
+        >>> str(i)
+        'a = and b0 b1'
+
+        >>> p = Program(env={"b0":6, "b1":3}, insts=[And("a", "b0", "b1")])
+        >>> p.eval()
+        >>> p.get_val("a")
+        2
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        rs2 = prog.get_val(self.rs2)
+        prog.set_val(self.rd, rs1 & rs2)
+
+    def get_opcode(self):
+        return "and"
+
+
+class Andi(BinOpImm):
+    """
+    andi rd, rs1, imm: rd = rs1 & imm
+
+    Example:
+        >>> i = Andi("a", "b0", 7)
+        >>> str(i)
+        'a = andi b0 7'
+
+        >>> p = Program(env={"b0":-3}, insts=[Andi("a", "b0", 7)])
+        >>> p.eval()
+        >>> p.get_val("a")
+        5
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        prog.set_val(self.rd, rs1 & self.imm)
+
+    def get_opcode(self):
+        return "andi"
+
+
+class Lw(BinOpImm):
+    """
+    lw rd, rs1, imm: rd = mem[rs1 + imm]
+    Loads the signed 32-bit word at the address rs1 + imm.
+
+    Example:
+        >>> i = Lw("a", "b0", 4)
+        >>> str(i)
+        'a = lw b0 4'
+
+        >>> p = Program(env={"b0": 2}, insts=[Lw("a", "b0", 2)])
+        >>> p.set_memory(Memory(bytearray([0, 0, 0, 0, 7, 1, 0, 0])))
+        >>> p.eval()
+        >>> p.get_val("a")
+        263
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        prog.set_val(self.rd, prog.get_memory().load_word(rs1 + self.imm))
+
+    def get_opcode(self):
+        return "lw"
+
+
+class Lb(BinOpImm):
+    """
+    lb rd, rs1, imm: rd = mem[rs1 + imm]
+    Loads the signed byte at the address rs1 + imm.
+
+    Example:
+        >>> i = Lb("a", "b0", 1)
+        >>> str(i)
+        'a = lb b0 1'
+
+        >>> p = Program(env={"b0": 0}, insts=[Lb("a", "b0", 1), Lb("b", "b0", 2)])
+        >>> p.set_memory(Memory(bytearray([0, 5, 255])))
+        >>> p.eval()
+        >>> p.get_val("a"), p.get_val("b")
+        (5, -1)
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        prog.set_val(self.rd, prog.get_memory().load_byte(rs1 + self.imm))
+
+    def get_opcode(self):
+        return "lb"
+
+
+class Sw(Inst):
+    """
+    sw rs1, rs2, imm: mem[rs1 + imm] = rs2
+    Stores the lower 32 bits of rs2 at the address rs1 + imm. Stores do not
+    define registers.
+
+    Example:
+        >>> i = Sw("b0", "b1", 4)
+        >>> str(i)
+        'sw b0 b1 4'
+
+        >>> data = bytearray(4)
+        >>> p = Program(env={"b0": 0, "b1": 0x123456789}, insts=[Sw("b0", "b1", 0)])
+        >>> p.set_memory(Memory(data))
+        >>> p.eval()
+        >>> data.hex()
+        '89674523'
+    """
+
+    def __init__(self, rs1, rs2, imm):
+        assert isinstance(rs1, str) and isinstance(rs2, str) and isinstance(imm, int)
+        self.rs1 = rs1
+        self.rs2 = rs2
+        self.imm = imm
+
+    def __str__(self):
+        op = self.get_opcode()
+        return f"{op} {self.rs1} {self.rs2} {self.imm}"
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        rs2 = prog.get_val(self.rs2)
+        prog.get_memory().store_word(rs1 + self.imm, rs2)
+
+    def get_opcode(self):
+        return "sw"
+
+
+class Sb(Sw):
+    """
+    sb rs1, rs2, imm: mem[rs1 + imm] = rs2
+    Stores the lower 8 bits of rs2 at the address rs1 + imm.
+
+    Example:
+        >>> i = Sb("b0", "b1", 1)
+        >>> str(i)
+        'sb b0 b1 1'
+
+        >>> data = bytearray(2)
+        >>> p = Program(env={"b0": 0, "b1": 258}, insts=[Sb("b0", "b1", 1)])
+        >>> p.set_memory(Memory(data))
+        >>> p.eval()
+        >>> list(data)
+        [0, 2]
+    """
+
+    def eval(self, prog):
+        rs1 = prog.get_val(self.rs1)
+        rs2 = prog.get_val(self.rs2)
+        prog.get_memory().store_byte(rs1 + self.imm, rs2)
+
+    def get_opcode(self):
+        return "sb"
@@ -0,0 +1,174 @@
+"""
+This file implements a reader and a writer of Asm programs in text form,
+the format of Program.print_insts, so that compiled programs can be saved,
+and loaded back without compiling their source code again. Each line holds
+a label, followed by a colon, or an instruction:
+
+    rd = op rs1 rs2     for add, sub, mul, div, xor, slt, sll and and;
+    rd = op rs1 imm     for addi, xori, slti, slli, srai, andi, lw and lb;
+    rd = jal lab        for jumps;
+    op rs1 rs2 lab      for beq, bne and blt;
+    op rs1 rs2 imm      for sw and sb.
+
+Labels mark the instruction that follows them. Empty lines are ignored.
+The reader splits each line on white space and builds the instruction with
+the constructor of its opcode, without regular expressions or tokens; it
+exits with "Assembly error" at the first line that it cannot read. The
+text does not hold the environment of the program: inputs go into the
+environment of the program that 'read' returns, like for Program.
+
+The writer goes through a TextSink (see Sink.py), which writes the lines in
+blocks; the reader, in turn, can pass the code to any sink.
+
+This file uses doctests. To test it, run "python3 -m doctest Assembler.py".
+"""
+
+import io
+import sys
+
+import Asm as AsmModule
+import Sink
+
+
+REGISTER_OPS = {
+    "add": AsmModule.Add, "sub": AsmModule.Sub, "mul": AsmModule.Mul,
+    "div": AsmModule.Div, "xor": AsmModule.Xor, "slt": AsmModule.Slt,
+    "sll": AsmModule.Sll, "and": AsmModule.And,
+}
+
+IMMEDIATE_OPS = {
+    "addi": AsmModule.Addi, "xori": AsmModule.Xori, "slti": AsmModule.Slti,
+    "slli": AsmModule.Slli, "srai": AsmModule.Srai, "andi": AsmModule.Andi,
+    "lw": AsmModule.Lw, "lb": AsmModule.Lb,
+}
+
+BRANCHES = {"beq": AsmModule.Beq, "bne": AsmModule.Bne, "blt": AsmModule.Blt}
+
+STORES = {"sw": AsmModule.Sw, "sb": AsmModule.Sb}
+
+
+def parse_line(line):
+    """
+    Returns the instruction in the line, or its label, as a string, or None
+    if the line is empty:
+
+    >>> print(parse_line("a = addi x0 -3"))
+    a = addi x0 -3
+    >>> parse_line("loop:"), parse_line("  ")
+    ('loop', None)
+    >>> parse_line("a = mul b")
+    Traceback (most recent call last):
+    ...
+    SystemExit: Assembly error: a = mul b
+    """
+    fields = line.split()
+    size = len(fields)
+    try:
+        if size == 5 and fields[1] == "=":
+            rd, _, op, rs1, rs2 = fields
+            if op in REGISTER_OPS:
+                return REGISTER_OPS[op](rd, rs1, rs2)
+            return IMMEDIATE_OPS[op](rd, rs1, int(rs2))
+        if size == 4:
+            op, rs1, rs2, last = fields
+            if op in BRANCHES:
+                return BRANCHES[op](rs1, rs2, last)
+            if rs1 == "=" and rs2 == "jal":
+                return AsmModule.Jal(op, last)
+            return STORES[op](rs1, rs2, int(last))
+        if size == 1 and fields[0][-1] == ":":
+            return fields[0][:-1]
+        if size == 0:
+            return None
+    except (KeyError, ValueError):
+        pass
+    sys.exit(f"Assembly error: {line.strip()}")
+
+
+def read(lines, env=None, sink=None):
+    """
+    Reads the instructions in the lines, which can be a text file, and adds
+    them to the sink. By default, the sink is a new program, with the given
+    environment, which 'read' returns; otherwise, 'read' returns None.
+
+    Example:
+        >>> p = read(["beq a x0 L1", "a = addi x0 1", "L1:", "b = addi a 1"], {"a": 0})
+        >>> p.get_labels()
+        {'L1': 2}
+        >>> p.eval()
+        >>> p.get_val("b")
+        1
+    """
+    if sink is not None:
+        for line in lines:
+            item = parse_line(line)
+            if item.__class__ is str:
+                sink.add_label(item)
+            elif item is not None:
+                sink.add_inst(item)
+        return None
+    insts = []
+    labels = {}
+    for line in lines:
+        item = parse_line(line)
+        if item.__class__ is str:
+            labels[item] = len(insts)
+        elif item is not None:
+            insts.append(item)
+    prog = AsmModule.Program({} if env is None else env, insts)
+    prog.get_labels().update(labels)
+    return prog
+
+
+def loads(text, env=None):
+    return read(text.splitlines(), env)
+
+
+def replay(prog, sink):
+    """
+    Passes the instructions and the labels of the program to the sink, in
+    the order of Program.print_insts.
+    """
+    insts = prog.get_insts()
+    labels = {}
+    for label, pc in prog.get_labels().items():
+        labels.setdefault(pc, []).append(label)
+    for pc, inst in enumerate(insts):
+        for label in labels.get(pc, ()):
+            sink.add_label(label)
+        sink.add_inst(inst)
+    for label in labels.get(len(insts), ()):
+        sink.add_label(label)
+
+
+def write(prog, file, buffer_lines=4096):
+    """
+    Writes the program into a text file, 'buffer_lines' lines at a time.
+
+    Example:
+        >>> p = AsmModule.Program({}, [AsmModule.Sw("x0", "a", 4)])
+        >>> p.add_label("end")
+        >>> text = io.StringIO()
+        >>> write(p, text)
+        >>> text.getvalue()
+        'sw x0 a 4\\nend:\\n'
+    """
+    sink = Sink.TextSink(file, buffer_lines)
+    replay(prog, sink)
+    sink.close()
+
+
+def dumps(prog):
+    """
+    Returns the text of the program. Reading it back gives the same
+    instructions and labels:
+
+    >>> p = AsmModule.Program({}, [AsmModule.Lw("a", "b", -8), AsmModule.Jal("ra", "f")])
+    >>> p.add_label("f")
+    >>> q = loads(dumps(p))
+    >>> dumps(q) == dumps(p), q.get_labels()
+    (True, {'f': 2})
+    """
+    text = io.StringIO()
+    write(prog, text)
+    return text.getvalue()
@@ -0,0 +1,1267 @@
+"""
+This file contains benchmarks for the compiler and for the interpreter of Asm
+programs. Every benchmark is a function that builds its own workload and
+prints its measurements. To run all the benchmarks, just run python 3 as
+follows: "python3 Bench.py". To run only some of them, pass their names on the
+command line, e.g.: "python3 Bench.py branches".
+"""
+
+import sys
+import time
+import random
+import tempfile
+import os
+from array import array
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+
+from Expression import *
+from Visitor import GenVisitor, SethiUllmanGenVisitor, TransformVisitor, CtrGenVisitor
+import Asm as AsmModule
+import Optimizer
+import Inliner
+import Reassociator
+import Linker
+import Threaded
+import Jit
+import Tiered
+import Fusion
+import Profiler
+import Tracer
+import Encoding
+import Verifier
+import Code
+import Specializer
+import Memo
+import Sink
+import Assembler
+import Unifier
+from Lexer import Lexer
+from Parser import Parser
+
+try:
+    import Vector
+except ImportError:
+    Vector = None
+
+
+benchmarks = {}
+
+
+def benchmark(function):
+    benchmarks[function.__name__] = function
+    return function
+
+
+def timed(function, *args, repeat=3):
+    """
+    Returns the result of function(*args), plus the shortest time, in seconds,
+    that it took to run, out of 'repeat' runs.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def run_many(prog, times):
+    """
+    Evaluates the program 'times' times, from the first instruction.
+    """
+    for _ in range(times):
+        prog.set_pc(0)
+        prog.eval()
+
+
+class CountingProgram(AsmModule.Program):
+    """
+    A program that counts how many instructions it has executed, in total,
+    and at each position.
+    """
+
+    def __init__(self, env, insts):
+        super().__init__(env, insts)
+        self.executed = 0
+        self.hits = Counter()
+
+    def get_inst(self):
+        inst = super().get_inst()
+        if inst:
+            self.executed += 1
+            self.hits[self.pc - 1] += 1
+        return inst
+
+
+def compile_exp(exp, env, prog_class=AsmModule.Program, gen_class=GenVisitor):
+    """
+    Translates the expression into a program, and returns the program plus the
+    register that will hold the value of the expression.
+    """
+    prog = prog_class(dict(env), [])
+    reg = exp.accept(gen_class(), prog)
+    return prog, reg
+
+
+def expensive_exp(var, size):
+    """
+    Builds a sum with 'size' products of 'var' by itself.
+    """
+    exp = Mul(Var(var), Var(var))
+    for i in range(1, size):
+        exp = Add(exp, Mul(Var(var), Num(i)))
+    return exp
+
+
+def branchy_exp(depth, size):
+    """
+    Builds a chain of nested conditionals, in which every test is a
+    conjunction, and every branch is expensive.
+    """
+    exp = expensive_exp("x", size)
+    for i in range(depth):
+        cond = And(Lth(Var("x"), Num(i)), Or(Lth(Num(i), Var("y")), Bln(False)))
+        exp = IfThenElse(cond, expensive_exp("y", size), exp)
+    return exp
+
+
+@benchmark
+def branches():
+    print("Executed instructions on branch-heavy programs")
+    print(f"{'depth':>6} {'size':>6} {'static':>10} {'executed':>10} {'ratio':>7}")
+    for depth, size in [(4, 16), (16, 16), (64, 16), (64, 64)]:
+        exp = branchy_exp(depth, size)
+        prog, reg = compile_exp(exp, {"x": depth, "y": 0}, CountingProgram)
+        static = len(prog.get_insts())
+        prog.eval()
+        ratio = prog.executed / static
+        print(f"{depth:>6} {size:>6} {static:>10} {prog.executed:>10} {ratio:>7.3f}")
+
+
+def power_exp(var, size):
+    """
+    Builds a sum of products, quotients and remainders by powers of two.
+    """
+    exp = Var(var)
+    for i in range(size):
+        k = Num(2 ** (i % 6))
+        term = [Mul(Var(var), k), Div(Var(var), k), Mod(Var(var), k)][i % 3]
+        exp = Add(exp, term)
+    return exp
+
+
+def opcode_histogram(prog, opcodes):
+    insts = prog.get_insts()
+    return sum(1 for inst in insts if inst.get_opcode() in opcodes)
+
+
+@benchmark
+def strength():
+    print("Strength reduction of mul/div/mod by powers of two")
+    print(f"{'size':>6} {'mul+div':>8} {'after':>6} {'insts':>7} {'after':>7} {'speedup':>8}")
+    for size in [30, 100, 300]:
+        exp = power_exp("x", size)
+        prog, reg = compile_exp(exp, {"x": -12345})
+        reduced = Optimizer.strength_reduce(prog)
+        slow_ops = ("mul", "div")
+        before = opcode_histogram(prog, slow_ops)
+        after = opcode_histogram(reduced, slow_ops)
+        _, t0 = timed(run_many, prog, 30000 // size)
+        _, t1 = timed(run_many, reduced, 30000 // size)
+        assert prog.get_val(reg) == reduced.get_val(reg)
+        n0 = len(prog.get_insts())
+        n1 = len(reduced.get_insts())
+        print(f"{size:>6} {before:>8} {after:>6} {n0:>7} {n1:>7} {t0 / t1:>7.2f}x")
+
+
+class AppCounter(TransformVisitor):
+    """
+    Counts the applications in an expression.
+    """
+
+    def __init__(self):
+        self.apps = 0
+
+    def visit_app(self, exp, arg):
+        self.apps += 1
+        return super().visit_app(exp, arg)
+
+
+def count_apps(exp):
+    counter = AppCounter()
+    exp.accept(counter, None)
+    return counter.apps
+
+
+def lambda_exp(depth, names):
+    """
+    Builds a random expression with directly applied functions, functions
+    bound by let, and functions passed as arguments.
+    """
+    if depth == 0:
+        return random.choice([Var(random.choice(names)), Num(random.randint(1, 9))])
+    kind = random.randrange(4)
+    if kind == 0:
+        formal = f"a{depth}"
+        body = lambda_exp(depth - 1, names + [formal])
+        return App(Fn(formal, type(1), body), lambda_exp(depth - 1, names))
+    elif kind == 1:
+        return Add(lambda_exp(depth - 1, names), lambda_exp(depth - 1, names))
+    elif kind == 2:
+        fn = Fn("z", type(1), Mul(Var("z"), lambda_exp(depth - 1, names)))
+        uses = Add(App(Var("f"), Num(depth)), App(Var("f"), lambda_exp(depth - 1, names)))
+        return Let("f", fn, uses)
+    else:
+        fn = Fn("k", type(1), Sub(Var("k"), Num(depth)))
+        arrow = ArrowType(type(1), type(1))
+        body = Add(App(Var("g"), lambda_exp(depth - 1, names)), Num(1))
+        return App(Fn("g", arrow, body), fn)
+
+
+@benchmark
+def inlining():
+    print("Beta-reduction of applied functions")
+    print(f"{'depth':>6} {'budget':>7} {'apps':>6} {'removed':>8} {'left':>5} {'size':>7} {'after':>7} {'time':>8}")
+    for depth in [4, 8, 12]:
+        exp = lambda_exp(depth, ["x"])
+        for budget in [0, 64, 4096]:
+            inliner = Inliner.InlineVisitor(budget)
+            result, t = timed(exp.accept, inliner, None, repeat=1)
+            size = exp.accept(Inliner.SizeVisitor(), None)
+            new_size = result.accept(Inliner.SizeVisitor(), None)
+            apps, left = count_apps(exp), count_apps(result)
+            print(f"{depth:>6} {budget:>7} {apps:>6} {inliner.removed:>8} {left:>5} {size:>7} {new_size:>7} {t:>8.4f}")
+            if left == 0:
+                prog, reg = compile_exp(result, {"x": 3})
+                prog.eval()
+
+
+def chain_source(size):
+    """
+    Builds the source code of a long chain of sums of products.
+    """
+    terms = [f"x * {i} * 2" if i % 3 == 0 else ("x" if i % 3 == 1 else str(i)) for i in range(size)]
+    return " + ".join(terms)
+
+
+def try_compile(exp):
+    try:
+        return timed(compile_exp, exp, {"x": 1}, repeat=1)
+    except RecursionError:
+        return None, None
+
+
+@benchmark
+def reassociation():
+    print("Reassociation of long operator chains")
+    print(f"{'terms':>7} {'depth':>7} {'after':>6} {'pass':>8} {'gen':>9} {'gen after':>10} {'insts':>7} {'after':>7}")
+    for size in [100, 1000, 10000, 100000]:
+        exp = Parser(Lexer(chain_source(size)).tokens()).parse()
+        balanced, t_pass = timed(Reassociator.reassociate, exp, repeat=1)
+        before, t_gen = try_compile(exp)
+        after, t_gen_after = try_compile(balanced)
+        after[0].eval()
+        if before:
+            before[0].eval()
+            assert before[0].get_val(before[1]) == after[0].get_val(after[1])
+        gen = f"{t_gen:.4f}" if before else "overflow"
+        n0 = len(before[0].get_insts()) if before else "-"
+        n1 = len(after[0].get_insts())
+        d0 = Reassociator.depth(exp)
+        d1 = Reassociator.depth(balanced)
+        print(f"{size:>7} {d0:>7} {d1:>6} {t_pass:>8.4f} {gen:>9} {t_gen_after:>10.4f} {n0:>7} {n1:>7}")
+
+
+def arith_exp(depth, shape):
+    """
+    Builds an arithmetic expression with 2^depth leaves (when the shape is
+    "random" or "balanced") or depth leaves (when the shape is "right").
+    """
+    if shape == "right":
+        exp = Num(depth)
+        for i in range(depth - 1, 0, -1):
+            exp = random.choice([Add, Sub, Mul])(Num(i), exp)
+        return exp
+    if depth == 0:
+        return random.choice([Var("x"), Num(random.randint(1, 9))])
+    op = random.choice([Add, Sub, Mul, Eql, Lth])
+    if shape == "balanced":
+        return op(arith_exp(depth - 1, shape), arith_exp(depth - 1, shape))
+    left = arith_exp(random.randint(0, depth - 1), shape)
+    right = arith_exp(depth - 1, shape)
+    return op(left, right) if random.random() < 0.5 else op(right, left)
+
+
+@benchmark
+def registers():
+    print("Sethi-Ullman evaluation order and register reuse")
+    print(f"{'shape':>9} {'depth':>6} {'insts':>7} {'live':>6} {'SU live':>8} {'env':>7} {'SU env':>7}")
+    for shape, depth in [("right", 50), ("right", 200), ("random", 12), ("random", 16), ("balanced", 10)]:
+        exp = arith_exp(depth, shape)
+        prog, reg = compile_exp(exp, {"x": 3})
+        su_prog, su_reg = compile_exp(exp, {"x": 3}, gen_class=SethiUllmanGenVisitor)
+        prog.eval()
+        su_prog.eval()
+        assert prog.get_val(reg) == su_prog.get_val(su_reg)
+        live = Optimizer.max_live(prog)
+        su_live = Optimizer.max_live(su_prog)
+        env = len(prog.get_env())
+        su_env = len(su_prog.get_env())
+        insts = len(prog.get_insts())
+        print(f"{shape:>9} {depth:>6} {insts:>7} {live:>6} {su_live:>8} {env:>7} {su_env:>7}")
+
+
+def loop_program(n):
+    """
+    Builds a program that sums (i * i) div 3, xor i, for i from n down to 1.
+    """
+    p = AsmModule.Program({"n": n}, [])
+    p.add_inst(AsmModule.Addi("s", "x0", 0))
+    p.add_inst(AsmModule.Addi("three", "x0", 3))
+    p.add_label("loop")
+    p.add_inst(AsmModule.Mul("t0", "n", "n"))
+    p.add_inst(AsmModule.Div("t0", "t0", "three"))
+    p.add_inst(AsmModule.Xor("t1", "t0", "n"))
+    p.add_inst(AsmModule.Add("s", "s", "t1"))
+    p.add_inst(AsmModule.Slti("t2", "s", 0))
+    p.add_inst(AsmModule.Addi("n", "n", -1))
+    p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+    return p
+
+
+def engine_workloads():
+    """
+    The programs on which the execution engines are compared: a loop, and
+    straight-line code produced by GenVisitor.
+    """
+    random.seed(1)
+    arith, arith_reg = compile_exp(arith_exp(14, "random"), {"x": 3})
+    branchy, branchy_reg = compile_exp(branchy_exp(64, 16), {"x": 64, "y": 0})
+    return [
+        ("loop", loop_program(20000), "s"),
+        ("arith", arith, arith_reg),
+        ("branchy", branchy, branchy_reg),
+    ]
+
+
+def counting_run(prog):
+    counting = CountingProgram(dict(prog.get_env()), prog.get_insts())
+    for label, pc in prog.get_labels().items():
+        counting.get_labels()[label] = pc
+    counting.eval()
+    return counting
+
+
+def count_executed(prog):
+    return counting_run(prog).executed
+
+
+def fresh(prog):
+    """
+    A copy of the program, with a copy of its environment, ready to run.
+    """
+    copy = AsmModule.Program(dict(prog.get_env()), prog.get_insts())
+    copy.get_labels().update(prog.get_labels())
+    return copy
+
+
+def run_fresh(prog, times):
+    for _ in range(times):
+        fresh(prog).eval()
+
+
+def run_linked(linked, initial, times):
+    for _ in range(times):
+        linked.regs[:] = initial
+        linked.eval()
+
+
+@benchmark
+def linking():
+    print("Throughput of Program.eval against linked programs (instructions/s)")
+    print(f"{'program':>8} {'executed':>9} {'eval':>11} {'linked':>11} {'speedup':>8} {'link time':>10}")
+    for name, prog, reg in engine_workloads():
+        executed = count_executed(prog)
+        runs = max(1, 100000 // executed)
+        _, t_eval = timed(run_fresh, prog, runs)
+        linked, t_link = timed(Linker.link, prog)
+        _, t_linked = timed(run_linked, linked, list(linked.regs), runs)
+        reference = fresh(prog)
+        reference.eval()
+        assert reference.get_env() == linked.get_env()
+        total = executed * runs
+        print(f"{name:>8} {executed:>9} {total / t_eval:>11.0f} {total / t_linked:>11.0f} "
+              f"{t_eval / t_linked:>7.2f}x {t_link:>10.4f}")
+
+
+def example_program(example, args):
+    """
+    Returns the program that the example in Asm.py builds for the arguments.
+    """
+    progs = []
+    example(*args, lambda p: progs.append(p) or p.eval())
+    return progs[0]
+
+
+def run_example(example, args, evaluate, times):
+    for _ in range(times):
+        example(*args, evaluate)
+
+
+def run_threaded(threaded, initial, times):
+    for _ in range(times):
+        threaded.regs[:] = initial
+        threaded.eval()
+
+
+@benchmark
+def threading():
+    print("Examples of Asm.py, including the time to link (calls/s), and reruns")
+    print("of the threaded program, already linked, over the same inputs (runs/s)")
+    print(f"{'example':>26} {'eval':>9} {'linked':>9} {'threaded':>9} {'rerun':>9}")
+    examples = [
+        ("max", AsmModule.max, (-3, 7)),
+        ("distance_with_acceleration", AsmModule.distance_with_acceleration, (3, 4, 5)),
+    ]
+    calls = 5000
+    for name, example, args in examples:
+        rates = []
+        for evaluate in [AsmModule.Program.eval, Linker.run, Threaded.run]:
+            assert example(*args, evaluate) == example(*args)
+            _, t = timed(run_example, example, args, evaluate, calls)
+            rates.append(calls / t)
+        threaded = Threaded.ThreadedProgram(fresh(example_program(example, args)))
+        _, t = timed(run_threaded, threaded, list(threaded.regs), calls)
+        rates.append(calls / t)
+        print(f"{name:>26} {rates[0]:>9.0f} {rates[1]:>9.0f} {rates[2]:>9.0f} {rates[3]:>9.0f}")
+    print()
+    print("Throughput of the engines on generated programs (instructions/s)")
+    print(f"{'program':>9} {'executed':>9} {'eval':>10} {'linked':>10} {'threaded':>10} {'speedup':>8}")
+    random.seed(2)
+    big, _ = compile_exp(arith_exp(12, "balanced"), {"x": 1})
+    workloads = engine_workloads() + [("balanced", big, None)]
+    for name, prog, _ in workloads:
+        executed = count_executed(prog)
+        runs = max(1, 100000 // executed)
+        _, t_eval = timed(run_fresh, prog, runs)
+        linked = Linker.link(prog)
+        _, t_linked = timed(run_linked, linked, list(linked.regs), runs)
+        threaded = Threaded.ThreadedProgram(prog)
+        _, t_threaded = timed(run_threaded, threaded, list(threaded.regs), runs)
+        reference = fresh(prog)
+        reference.eval()
+        assert reference.get_env() == threaded.get_env()
+        total = executed * runs
+        print(f"{name:>9} {executed:>9} {total / t_eval:>10.0f} {total / t_linked:>10.0f} "
+              f"{total / t_threaded:>10.0f} {t_eval / t_threaded:>7.2f}x")
+
+
+def run_jitted(function, prog, times):
+    for _ in range(times):
+        function(fresh(prog))
+
+
+def run_jit(prog, times):
+    for _ in range(times):
+        Jit.run(fresh(prog))
+
+
+@benchmark
+def jit():
+    print("Straight-line programs compiled into Python functions (runs/s)")
+    print(f"{'program':>26} {'insts':>6} {'eval':>9} {'threaded':>9} {'jit':>9} "
+          f"{'speedup':>8} {'Jit.run':>9} {'speedup':>8} {'compile':>8} {'lookup':>8}")
+    random.seed(2)
+    workloads = []
+    for name, example, args in [
+        ("max", AsmModule.max, (-3, 7)),
+        ("distance_with_acceleration", AsmModule.distance_with_acceleration, (3, 4, 5)),
+    ]:
+        prog = example_program(example, args)
+        workloads.append((name, prog))
+    for name, depth in [("random", 14), ("balanced", 12)]:
+        prog, _ = compile_exp(arith_exp(depth, name), {"x": 1})
+        workloads.append((name, prog))
+    for name, prog in workloads:
+        runs = max(1, 200000 // len(prog.get_insts()))
+        _, t_eval = timed(run_fresh, prog, runs)
+        threaded = Threaded.ThreadedProgram(prog)
+        _, t_threaded = timed(run_threaded, threaded, list(threaded.regs), runs)
+        Jit.cache.clear()
+        function, t_compile = timed(Jit.compile_program, prog, repeat=1)
+        _, t_lookup = timed(Jit.compile_program, prog)
+        _, t_jit = timed(run_jitted, function, prog, runs)
+        _, t_run = timed(run_jit, prog, runs)
+        reference = fresh(prog)
+        reference.eval()
+        jitted = fresh(prog)
+        function(jitted)
+        assert reference.get_env() == jitted.get_env()
+        print(f"{name:>26} {len(prog.get_insts()):>6} {runs / t_eval:>9.0f} "
+              f"{runs / t_threaded:>9.0f} {runs / t_jit:>9.0f} {t_eval / t_jit:>7.2f}x "
+              f"{runs / t_run:>9.0f} {t_eval / t_run:>7.2f}x {t_compile:>8.4f} {t_lookup:>8.4f}")
+
+
+def mixed_workload(cold, hot_runs):
+    """
+    Builds a list of programs to run: 'cold' distinct programs, that run
+    once each, interleaved with 'hot_runs' runs of each of a few hot
+    programs.
+    """
+    random.seed(3)
+    runs = []
+    for _ in range(cold):
+        prog, _ = compile_exp(arith_exp(5, "random"), {"x": 2})
+        runs.append(prog)
+    hot = [prog for _, prog, _ in engine_workloads()[1:]]
+    hot.append(loop_program(200))
+    for prog in hot:
+        runs.extend([prog] * hot_runs)
+    random.shuffle(runs)
+    return runs
+
+
+def run_tiered(runner, runs):
+    latencies = []
+    for prog in runs:
+        copy = fresh(prog)
+        start = time.perf_counter()
+        runner.run(copy)
+        latencies.append(time.perf_counter() - start)
+    runner.shutdown()
+    return latencies
+
+
+@benchmark
+def tiered():
+    print("Latency of a mixed workload: cold programs that run once, and hot")
+    print("programs that run many times (microseconds per run)")
+    print(f"{'strategy':>12} {'total(ms)':>10} {'mean':>8} {'p50':>8} {'p99':>8} "
+          f"{'max':>9} {'promoted':>9} {'interp':>7}")
+    runs = mixed_workload(500, 1000)
+    strategies = [
+        ("interpreter", lambda: Tiered.TieredRunner(threshold=None)),
+        ("eager", lambda: Tiered.TieredRunner(threshold=1, background=False)),
+        ("tiered", lambda: Tiered.TieredRunner(threshold=8, background=False)),
+        ("background", lambda: Tiered.TieredRunner(threshold=8)),
+    ]
+    for name, make_runner in strategies:
+        Jit.cache.clear()
+        runner = make_runner()
+        latencies = sorted(run_tiered(runner, runs))
+        micro = [t * 1e6 for t in latencies]
+        total = sum(latencies) * 1000
+        p50 = micro[len(micro) // 2]
+        p99 = micro[len(micro) * 99 // 100]
+        print(f"{name:>12} {total:>10.1f} {total * 1000 / len(micro):>8.1f} {p50:>8.1f} "
+              f"{p99:>8.1f} {micro[-1]:>9.1f} {runner.metrics['promoted']:>9} "
+              f"{runner.metrics['interpreted']:>7}")
+
+
+def run_rows(prog, rows):
+    """
+    Evaluates the program once per environment in 'rows', returning the
+    final environments.
+    """
+    results = []
+    for row in rows:
+        copy = AsmModule.Program(dict(row), prog.get_insts())
+        copy.eval()
+        results.append(copy.get_env())
+    return results
+
+
+@benchmark
+def vector():
+    if Vector is None:
+        print("The vector benchmark needs NumPy")
+        return
+    print("Batched evaluation over NumPy vectors against a loop of Program.eval (rows/s)")
+    print(f"{'program':>26} {'insts':>6} {'rows':>8} {'loop':>10} {'vector':>12} {'speedup':>8}")
+    random.seed(4)
+    workloads = [
+        ("max", example_program(AsmModule.max, (1, 2)), ["rs1", "rs2"]),
+        ("distance_with_acceleration",
+         example_program(AsmModule.distance_with_acceleration, (1, 2, 3)),
+         ["rs1", "rs2", "rs3"]),
+    ]
+    for depth in [6, 10]:
+        prog, _ = compile_exp(arith_exp(depth, "random"), {})
+        workloads.append((f"random {depth}", prog, ["x"]))
+    for name, prog, inputs in workloads:
+        prog = AsmModule.Program({}, prog.get_insts())
+        for size in [1000, 100000]:
+            rows = [{i: random.randint(-100, 100) for i in inputs} for _ in range(size)]
+            sample = rows[:2000]
+            expected, t_loop = timed(run_rows, prog, sample, repeat=1)
+            regs, t_vector = timed(Vector.run_batch, prog, rows)
+            for lane, env in enumerate(expected):
+                assert all(regs[reg][lane] == value for reg, value in env.items())
+            loop_rate = len(sample) / t_loop
+            vector_rate = size / t_vector
+            print(f"{name:>26} {len(prog.get_insts()):>6} {size:>8} {loop_rate:>10.0f} "
+                  f"{vector_rate:>12.0f} {vector_rate / loop_rate:>7.1f}x")
+
+
+def equality_exp(size):
+    """
+    Builds a balanced sum of 'size' equality tests between x + i and y.
+    """
+    tests = [Eql(Add(Var("x"), Num(i)), Var("y")) for i in range(size)]
+    return Reassociator.build_balanced(Add, tests)
+
+
+@benchmark
+def fusion():
+    print("Superinstructions on code produced by GenVisitor (times in ms)")
+    print(f"{'program':>9} {'insts':>6} {'seq':>5} {'const':>6} {'dispatches':>11} "
+          f"{'fused':>9} {'saved':>7} {'threaded':>9} {'fused':>9} {'speedup':>8}")
+    random.seed(5)
+    workloads = [
+        ("equality", compile_exp(equality_exp(64), {"x": 3, "y": 4})[0]),
+        ("random", compile_exp(arith_exp(12, "random"), {"x": 3})[0]),
+        ("power", compile_exp(power_exp("x", 200), {"x": 12345})[0]),
+        ("branchy", compile_exp(branchy_exp(64, 16), {"x": 64, "y": 0})[0]),
+    ]
+    for name, prog in workloads:
+        counting = counting_run(prog)
+        fused = Fusion.fuse(prog)
+        dispatches = fused.dispatches(counting.hits)
+        runs = max(1, 500000 // counting.executed)
+        threaded = Threaded.ThreadedProgram(prog)
+        _, t_threaded = timed(run_threaded, threaded, list(threaded.regs), runs)
+        _, t_fused = timed(run_threaded, fused, list(fused.regs), runs)
+        assert threaded.get_env() == fused.get_env()
+        saved = 1 - dispatches / counting.executed
+        print(f"{name:>9} {len(prog.get_insts()):>6} {fused.fused['seq']:>5} "
+              f"{fused.fused['const']:>6} {counting.executed:>11} {dispatches:>9} "
+              f"{saved:>6.1%} {t_threaded * 1000:>9.2f} {t_fused * 1000:>9.2f} "
+              f"{t_threaded / t_fused:>7.2f}x")
+
+
+@benchmark
+def pgo():
+    print("Profile-guided fusion: profile, save, load, rebuild (times in ms)")
+    random.seed(6)
+    workloads = [
+        ("loop", loop_program(2000)),
+        ("random", compile_exp(arith_exp(12, "random"), {"x": 3})[0]),
+        ("power", compile_exp(power_exp("x", 200), {"x": 12345})[0]),
+        ("branchy", compile_exp(branchy_exp(64, 16), {"x": 64, "y": 0})[0]),
+    ]
+    profile = Fusion.Profile()
+    for _, prog in workloads:
+        profile.record(prog)
+    path = os.path.join(tempfile.mkdtemp(), "profile.json")
+    profile.save(path)
+    profile = Fusion.Profile.load(path)
+    sequences, specialize = profile.choose()
+    print("fused sequences:", ", ".join(" ".join(ops) for ops in sequences))
+    print("specialized opcodes:", ", ".join(specialize))
+    print(f"{'program':>9} {'dispatches':>11} {'static':>9} {'profile':>9} "
+          f"{'threaded':>9} {'static':>9} {'profile':>9} {'speedup':>8}")
+    for name, prog in workloads:
+        counting = counting_run(prog)
+        runs = max(1, 500000 // counting.executed)
+        engines = [
+            Threaded.ThreadedProgram(prog),
+            Fusion.fuse(prog),
+            Fusion.fuse_with_profile(prog, profile),
+        ]
+        times = []
+        for engine in engines:
+            _, t = timed(run_threaded, engine, list(engine.regs), runs)
+            times.append(t * 1000)
+            assert engine.get_env() == engines[0].get_env()
+        static = engines[1].dispatches(counting.hits)
+        guided = engines[2].dispatches(counting.hits)
+        print(f"{name:>9} {counting.executed:>11} {static:>9} {guided:>9} {times[0]:>9.2f} "
+              f"{times[1]:>9.2f} {times[2]:>9.2f} {times[0] / times[2]:>7.2f}x")
+
+
+def run_plain_loop(prog, times):
+    """
+    Runs the program like Program.eval did before it accepted a profiler.
+    """
+    for _ in range(times):
+        copy = fresh(prog)
+        inst = copy.get_inst()
+        while inst:
+            inst.eval(copy)
+            inst = copy.get_inst()
+
+
+def run_profiled(prog, times):
+    profiler = Profiler.Profiler()
+    for _ in range(times):
+        fresh(prog).eval(profiler)
+    return profiler
+
+
+@benchmark
+def profiler():
+    print("Cost of the profiler of Program.eval (times in ms)")
+    print(f"{'program':>9} {'executed':>9} {'plain loop':>11} {'disabled':>9} "
+          f"{'overhead':>9} {'enabled':>9} {'slowdown':>9}")
+    for name, prog, _ in engine_workloads():
+        executed = count_executed(prog)
+        runs = max(1, 100000 // executed)
+        _, t_plain = timed(run_plain_loop, prog, runs)
+        _, t_disabled = timed(run_fresh, prog, runs)
+        _, t_enabled = timed(run_profiled, prog, runs)
+        print(f"{name:>9} {executed:>9} {t_plain * 1000:>11.2f} {t_disabled * 1000:>9.2f} "
+              f"{t_disabled / t_plain - 1:>8.1%} {t_enabled * 1000:>9.2f} "
+              f"{t_enabled / t_disabled:>8.2f}x")
+    print()
+    report = run_profiled(loop_program(1000), 1)
+    report.print_report(top=5)
+    print(f"JSON: {len(report.to_json())} bytes")
+
+
+def run_traced(prog, times, size):
+    tracer = Tracer.Tracer(size)
+    for _ in range(times):
+        fresh(prog).eval(tracer=tracer)
+    return tracer
+
+
+@benchmark
+def tracing():
+    print("Cost of the ring-buffer tracer of Program.eval (times in ms)")
+    print(f"{'program':>9} {'executed':>9} {'plain loop':>11} {'disabled':>9} "
+          f"{'N=64':>9} {'N=65536':>9} {'slowdown':>9}")
+    for name, prog, _ in engine_workloads():
+        executed = count_executed(prog)
+        runs = max(1, 100000 // executed)
+        _, t_plain = timed(run_plain_loop, prog, runs)
+        _, t_disabled = timed(run_fresh, prog, runs)
+        _, t_small = timed(run_traced, prog, runs, 64)
+        _, t_large = timed(run_traced, prog, runs, 65536)
+        print(f"{name:>9} {executed:>9} {t_plain * 1000:>11.2f} {t_disabled * 1000:>9.2f} "
+              f"{t_small * 1000:>9.2f} {t_large * 1000:>9.2f} {t_large / t_disabled:>8.2f}x")
+
+
+def allocated(function, *args):
+    """
+    Returns the result of function(*args), plus the bytes that it allocated
+    and that are still alive.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def run_encoded(encoded, env, times):
+    for _ in range(times):
+        encoded.eval(env)
+
+
+def save_and_load(encoded, path):
+    with open(path, "wb") as file:
+        encoded.tofile(file)
+    with open(path, "rb") as file:
+        return Encoding.EncodedProgram.fromfile(file)
+
+
+@benchmark
+def encoding():
+    print("Memory of programs as Inst objects and as 32-bit words (bytes/instruction),")
+    print("throughput of the interpreter of words (instructions/s), and save/load (ms)")
+    print(f"{'program':>9} {'insts':>7} {'objects':>8} {'words':>6} {'eval':>11} "
+          f"{'linked':>11} {'encoded':>11} {'save/load':>10}")
+    random.seed(1)
+    arith, arith_reg = compile_exp(arith_exp(16, "random"), {"x": 3})
+    balanced, balanced_reg = compile_exp(arith_exp(13, "balanced"), {"x": 3})
+    branchy, branchy_reg = compile_exp(branchy_exp(200, 4), {"x": 200, "y": 0})
+    workloads = [("loop", loop_program(20000)), ("arith", arith), ("balanced", balanced),
+                 ("branchy", branchy)]
+    path = os.path.join(tempfile.mkdtemp(), "program.bin")
+    for name, prog in workloads:
+        insts = len(prog.get_insts())
+        encoded, word_bytes = allocated(Encoding.encode, prog)
+        decoded, object_bytes = allocated(encoded.decode)
+        executed = count_executed(prog)
+        runs = max(1, 100000 // executed)
+        env = dict(prog.get_env())
+        _, t_eval = timed(run_fresh, prog, runs)
+        linked = Linker.link(prog)
+        _, t_linked = timed(run_linked, linked, list(linked.regs), runs)
+        _, t_encoded = timed(run_encoded, encoded, env, runs)
+        loaded, t_file = timed(save_and_load, encoded, path)
+        reference = fresh(prog)
+        reference.eval()
+        assert loaded.eval(env) == reference.get_env()
+        total = executed * runs
+        print(f"{name:>9} {insts:>7} {object_bytes / insts:>8.1f} {word_bytes / insts:>6.1f} "
+              f"{total / t_eval:>11.0f} {total / t_linked:>11.0f} {total / t_encoded:>11.0f} "
+              f"{t_file * 1000:>10.2f}")
+    os.remove(path)
+
+
+def run_unchecked(code, prog, times):
+    for _ in range(times):
+        code.eval(fresh(prog))
+
+
+@benchmark
+def verifier():
+    print("Program.eval against the unchecked interpreter of verified programs")
+    print(f"{'program':>9} {'executed':>9} {'verify(ms)':>11} {'eval':>11} {'unchecked':>11} {'speedup':>8}")
+    for name, prog, _ in engine_workloads():
+        executed = count_executed(prog)
+        runs = max(1, 100000 // executed)
+        code, t_verify = timed(Verifier.UncheckedProgram, prog)
+        assert code.verified
+        _, t_eval = timed(run_fresh, prog, runs)
+        _, t_unchecked = timed(run_unchecked, code, prog, runs)
+        reference, unchecked = fresh(prog), fresh(prog)
+        reference.eval()
+        code.eval(unchecked)
+        assert reference.get_env() == unchecked.get_env()
+        total = executed * runs
+        print(f"{name:>9} {executed:>9} {t_verify * 1000:>11.2f} {total / t_eval:>11.0f} "
+              f"{total / t_unchecked:>11.0f} {t_eval / t_unchecked:>7.2f}x")
+
+
+def run_rebuilt(prog, envs):
+    for env in envs:
+        copy = AsmModule.Program(dict(env), list(prog.get_insts()))
+        copy.get_labels().update(prog.get_labels())
+        copy.eval()
+
+
+def run_compiled(code, envs, workers):
+    if workers == 1:
+        for env in envs:
+            code.run(env)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(code.run, envs))
+
+
+@benchmark
+def shared_code():
+    print("Many inputs over one program: rebuilding Programs against one shared")
+    print("CompiledCode, with 1 and 4 threads (runs/s)")
+    print(f"{'program':>9} {'runs':>6} {'rebuilt':>9} {'compiled':>9} {'4 threads':>10} {'registers':>10}")
+    for name, prog, _ in engine_workloads():
+        runs = max(10, 20000 // count_executed(prog))
+        inputs = {name: value for name, value in prog.get_env().items() if name != "x0"}
+        envs = [dict(inputs) for _ in range(runs)]
+        code = Code.CompiledCode(prog)
+        _, t_rebuilt = timed(run_rebuilt, prog, envs)
+        _, t_compiled = timed(run_compiled, code, envs, 1)
+        _, t_threads = timed(run_compiled, code, envs, 4)
+        reference = fresh(prog)
+        reference.eval()
+        assert code.run(envs[0]) == reference.get_env()
+        print(f"{name:>9} {runs:>6} {runs / t_rebuilt:>9.0f} {runs / t_compiled:>9.0f} "
+              f"{runs / t_threads:>10.0f} {code.pool.created:>10}")
+
+
+def prefix_and_suffix(depth):
+    """
+    Builds a program whose long prefix computes an expression of x, and
+    whose short suffix combines its value with the input n.
+    """
+    prog, reg = compile_exp(arith_exp(depth, "balanced"), {"x": 3})
+    prefix = len(prog.get_insts())
+    prog.add_inst(AsmModule.Mul("t", reg, "n"))
+    prog.add_inst(AsmModule.Add("r", "t", "n"))
+    prog.add_inst(AsmModule.Slti("r", "r", 0))
+    return prog, prefix
+
+
+def run_full(prog, inputs):
+    for n in inputs:
+        env = dict(prog.get_env())
+        env["n"] = n
+        AsmModule.Program(env, prog.get_insts()).eval()
+
+
+def run_copied(snapshot, inputs):
+    for n in inputs:
+        env = dict(snapshot.env)
+        env["n"] = n
+        copy = AsmModule.Program(env, snapshot.insts)
+        copy.set_pc(snapshot.pc)
+        copy.eval()
+
+
+def run_forks(snapshot, inputs):
+    for n in inputs:
+        snapshot.fork({"n": n}).eval()
+
+
+@benchmark
+def forks():
+    print("10000 runs that share a prefix: full runs, copies of the environment")
+    print("after the prefix, and copy-on-write forks of a snapshot (us/run)")
+    print(f"{'prefix':>7} {'registers':>10} {'full':>9} {'copied':>9} {'forked':>9} {'speedup':>8}")
+    inputs = list(range(10000))
+    for depth in [6, 9, 12]:
+        prog, prefix = prefix_and_suffix(depth)
+        start = AsmModule.Program(dict(prog.get_env()), prog.get_insts())
+        for _ in range(prefix):
+            start.get_inst().eval(start)
+        snapshot = start.snapshot()
+        sample = inputs[:max(10, 100000 // prefix)]
+        _, t_full = timed(run_full, prog, sample)
+        _, t_copied = timed(run_copied, snapshot, inputs)
+        _, t_forked = timed(run_forks, snapshot, inputs)
+        fork = snapshot.fork({"n": 7})
+        fork.eval()
+        full = AsmModule.Program(dict(prog.get_env(), n=7), prog.get_insts())
+        full.eval()
+        assert dict(fork.get_env()) == full.get_env()
+        full_us = t_full / len(sample) * 1e6
+        forked_us = t_forked / len(inputs) * 1e6
+        print(f"{prefix:>7} {len(snapshot.env):>10} {full_us:>9.1f} "
+              f"{t_copied / len(inputs) * 1e6:>9.1f} {forked_us:>9.1f} {full_us / forked_us:>7.1f}x")
+
+
+def unrolled_sum(values):
+    """
+    Sums the values with one register per element, as programs without a
+    data memory must do.
+    """
+    env = {f"a{i}": value for i, value in enumerate(values)}
+    prog = AsmModule.Program(env, [AsmModule.Addi("s", "x0", 0)])
+    for i in range(len(values)):
+        prog.add_inst(AsmModule.Add("s", "s", f"a{i}"))
+    return prog
+
+
+def memory_sum(values):
+    """
+    Sums the words in the data memory, in a loop, and stores the sum after
+    them.
+    """
+    data = bytearray(array("i", values).tobytes() + bytes(4))
+    prog = AsmModule.Program({"end": 4 * len(values)}, [AsmModule.Addi("s", "x0", 0),
+                                                        AsmModule.Addi("p", "x0", 0)])
+    prog.add_label("loop")
+    prog.add_inst(AsmModule.Lw("w", "p", 0))
+    prog.add_inst(AsmModule.Add("s", "s", "w"))
+    prog.add_inst(AsmModule.Addi("p", "p", 4))
+    prog.add_inst(AsmModule.Blt("p", "end", "loop"))
+    prog.add_inst(AsmModule.Sw("end", "s", 0))
+    prog.set_memory(AsmModule.Memory(data))
+    return prog, data
+
+
+@benchmark
+def memory():
+    print("Sum of an array: one register per element against a loop over the data")
+    print("memory (build and run times in ms, memory of the inputs in bytes)")
+    print(f"{'elements':>9} {'registers':>10} {'env bytes':>10} {'memory':>8} {'buffer':>8}")
+    random.seed(2)
+    for size in [100, 1000, 10000]:
+        values = [random.randrange(-1000, 1000) for _ in range(size)]
+        _, t_unrolled = timed(lambda: unrolled_sum(values).eval())
+        _, t_memory = timed(lambda: memory_sum(values)[0].eval())
+        prog, data = memory_sum(values)
+        prog.eval()
+        assert prog.get_val("s") == sum(values)
+        assert int.from_bytes(data[-4:], "little", signed=True) == sum(values)
+        env = unrolled_sum(values).get_env()
+        env_bytes = sys.getsizeof(env) + sum(sys.getsizeof(name) + sys.getsizeof(value)
+                                             for name, value in env.items())
+        print(f"{size:>9} {t_unrolled * 1000:>10.2f} {env_bytes:>10} "
+              f"{t_memory * 1000:>8.2f} {len(data):>8}")
+
+
+def config_source(terms):
+    """
+    Builds an expression whose terms combine the configuration inputs a and
+    b, which are known per deployment, with the request input x.
+    """
+    parts = [f"(a * {i} + b * b - {i}) * x" if i % 2 else f"(if a < {i} then b * {i} else a - b)"
+             for i in range(1, terms + 1)]
+    return " + ".join(parts)
+
+
+def run_requests(prog, requests):
+    for x in requests:
+        run = AsmModule.Program(dict(prog.get_env(), x=x), prog.get_insts())
+        run.get_labels().update(prog.get_labels())
+        run.eval()
+
+
+def run_specialized(specializer, known, requests):
+    for x in requests:
+        specializer.run(known, {"x": x})
+
+
+@benchmark
+def specialize():
+    print("Requests over a program with known configuration inputs: the original")
+    print("program against its cached residual program (requests/s)")
+    print(f"{'terms':>6} {'insts':>6} {'residual':>9} {'specialize(ms)':>15} "
+          f"{'original':>9} {'residual':>9} {'speedup':>8}")
+    requests = list(range(2000))
+    known = {"a": 5, "b": 3}
+    for terms in [4, 16, 64]:
+        exp = Parser(Lexer(config_source(terms)).tokens()).parse()
+        prog, reg = compile_exp(exp, {"a": 0, "b": 0, "x": 0})
+        residual, t_specialize = timed(Specializer.specialize, prog, known, [reg])
+        specializer = Specializer.Specializer(prog, [reg])
+        _, t_original = timed(run_requests, Specializer.copy_program(prog, dict(known)), requests)
+        _, t_residual = timed(run_specialized, specializer, known, requests)
+        full = Specializer.copy_program(prog, dict(known, x=7))
+        full.eval()
+        assert specializer.run(known, {"x": 7}).get_val(reg) == full.get_val(reg)
+        print(f"{terms:>6} {len(prog.get_insts()):>6} {len(residual.get_insts()):>9} "
+              f"{t_specialize * 1000:>15.2f} {len(requests) / t_original:>9.0f} "
+              f"{len(requests) / t_residual:>9.0f} {t_original / t_residual:>7.2f}x")
+
+
+def request_programs(prog, name, values):
+    """
+    Builds one program per request, over the instructions of 'prog', with
+    the input 'name' taken from the list of values.
+    """
+    programs = []
+    for value in values:
+        env = dict(prog.get_env())
+        env[name] = value
+        run = AsmModule.Program(env, prog.get_insts())
+        run.get_labels().update(prog.get_labels())
+        programs.append(run)
+    return programs
+
+
+def run_uncached(programs):
+    for prog in programs:
+        prog.eval()
+
+
+def run_cached(cache, programs, outputs):
+    for prog in programs:
+        cache.run(prog, outputs)
+
+
+@benchmark
+def memo():
+    print("Requests that repeat their inputs, without and with the result cache")
+    print("(requests/s), with a large budget, and with a budget for 8 entries")
+    print(f"{'program':>9} {'distinct':>9} {'uncached':>10} {'cached':>10} {'hit rate':>9} "
+          f"{'small':>10} {'hit rate':>9} {'evictions':>10}")
+    rng = random.Random(4)
+    inputs = {"loop": "n", "arith": "x", "branchy": "x"}
+    for name, prog, reg in engine_workloads():
+        distinct = 32
+        values = [rng.randrange(1, distinct + 1) for _ in range(max(200, 200000 // count_executed(prog)))]
+        if name == "loop":
+            values = [value * 50 for value in values]
+        requests = len(values)
+        programs = request_programs(prog, inputs[name], values)
+        _, t_uncached = timed(run_uncached, programs, repeat=1)
+        large = Memo.ResultCache()
+        programs = request_programs(prog, inputs[name], values)
+        size = Memo.entry_size(large.key(programs[0], [reg]), {reg: 0})
+        _, t_cached = timed(run_cached, large, programs, [reg], repeat=1)
+        small = Memo.ResultCache(max_bytes=8 * size)
+        programs = request_programs(prog, inputs[name], values)
+        _, t_small = timed(run_cached, small, programs, [reg], repeat=1)
+        print(f"{name:>9} {distinct:>9} {requests / t_uncached:>10.0f} {requests / t_cached:>10.0f} "
+              f"{large.hits / requests:>9.1%} {requests / t_small:>10.0f} "
+              f"{small.hits / requests:>9.1%} {small.evictions:>10}")
+
+
+def peak_allocated(function, *args):
+    """
+    Returns the result of function(*args), plus the largest number of bytes
+    that it had allocated at any moment.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak - before
+
+
+def labeled_visitor(exp):
+    """
+    Returns a SethiUllmanGenVisitor that already labeled the expression, so
+    that the memory of the labels, which grows with the expression, is not
+    counted as memory of code generation.
+    """
+    gen = SethiUllmanGenVisitor()
+    gen.needs.label(exp)
+    return gen
+
+
+def emit(exp, gen, sink):
+    exp.accept(gen, sink)
+    return sink.close() if isinstance(sink, Sink.Sink) else sink
+
+
+def emit_into_file(exp, gen, path, sink_class, mode):
+    with open(path, mode) as file:
+        emit(exp, gen, sink_class(file))
+
+
+@benchmark
+def sink():
+    print("Code generation into a Program and into sinks: peak memory of code")
+    print("generation, beyond the expression (bytes/instruction), and time (ms)")
+    print(f"{'program':>12} {'gen':>4} {'insts':>8} {'program':>8} {'packed':>8} {'text':>8} "
+          f"{'binary':>8} {'peephole':>9} {'t prog':>8} {'t text':>8} {'t binary':>9}")
+    random.seed(2)
+    workloads = []
+    for depth in [10, 13, 16]:
+        exp = arith_exp(depth, "balanced")
+        workloads.append((f"balanced {depth}", "gen", exp, lambda exp: GenVisitor()))
+        workloads.append((f"balanced {depth}", "su", exp, labeled_visitor))
+    workloads.append(("branchy", "gen", branchy_exp(200, 16), lambda exp: GenVisitor()))
+    path = os.path.join(tempfile.mkdtemp(), "program")
+    for name, gen_name, exp, make_visitor in workloads:
+        env = {"x": 3, "y": 0}
+        prog, m_prog = peak_allocated(emit, exp, make_visitor(exp), AsmModule.Program(dict(env), []))
+        insts = len(prog.get_insts())
+        encoded, m_packed = peak_allocated(emit, exp, make_visitor(exp), Sink.PackedSink())
+        _, m_text = peak_allocated(emit_into_file, exp, make_visitor(exp), path, Sink.TextSink, "w")
+        _, m_binary = peak_allocated(emit_into_file, exp, make_visitor(exp), path,
+                                     Sink.BinarySink, "wb")
+        _, m_peephole = peak_allocated(emit_into_file, exp, make_visitor(exp), path,
+                                       lambda file: Sink.PeepholeSink(Sink.TextSink(file)), "w")
+        start = time.perf_counter()
+        emit(exp, make_visitor(exp), AsmModule.Program(dict(env), []))
+        t_prog = time.perf_counter() - start
+        start = time.perf_counter()
+        emit_into_file(exp, make_visitor(exp), path, Sink.TextSink, "w")
+        t_text = time.perf_counter() - start
+        start = time.perf_counter()
+        emit_into_file(exp, make_visitor(exp), path, Sink.BinarySink, "wb")
+        t_binary = time.perf_counter() - start
+        with open(path, "rb") as file:
+            loaded = Sink.load(file)
+        prog.eval()
+        assert loaded.eval(env) == encoded.eval(env) == prog.get_env()
+        print(f"{name:>12} {gen_name:>4} {insts:>8} {m_prog / insts:>8.1f} {m_packed / insts:>8.1f} "
+              f"{m_text / insts:>8.1f} {m_binary / insts:>8.1f} {m_peephole / insts:>9.1f} "
+              f"{t_prog * 1000:>8.1f} {t_text * 1000:>8.1f} {t_binary * 1000:>9.1f}")
+    os.remove(path)
+
+
+def compile_text(source):
+    exp = Parser(Lexer(source).tokens()).parse()
+    return compile_exp(exp, {})
+
+
+def load_text(path):
+    with open(path) as file:
+        return Assembler.read(file)
+
+
+@benchmark
+def assembler():
+    print("Loading a saved program against compiling its source code again (ms)")
+    print(f"{'terms':>6} {'insts':>7} {'bytes':>8} {'compile':>9} {'write':>7} "
+          f"{'load':>7} {'speedup':>8}")
+    path = os.path.join(tempfile.mkdtemp(), "program.s")
+    for terms in [16, 64, 256]:
+        source = config_source(terms)
+        (prog, reg), t_compile = timed(compile_text, source)
+        with open(path, "w") as file:
+            _, t_write = timed(Assembler.write, prog, file, repeat=1)
+        loaded, t_load = timed(load_text, path)
+        assert Assembler.dumps(loaded) == Assembler.dumps(prog)
+        print(f"{terms:>6} {len(prog.get_insts()):>7} {os.path.getsize(path):>8} "
+              f"{t_compile * 1000:>9.2f} {t_write * 1000:>7.2f} {t_load * 1000:>7.2f} "
+              f"{t_compile / t_load:>7.1f}x")
+    os.remove(path)
+
+
+def random_constraints(size, rng):
+    """
+    Builds 'size' constraints between type variables, in long chains and
+    random merges, where one variable in a thousand is an integer.
+    """
+    constraints = []
+    for i in range(1, size):
+        other = i - 1 if i % 3 else rng.randrange(i)
+        constraints.append((f"TV_{i}", f"TV_{other}"))
+        if i % 1000 == 0:
+            constraints.append((f"TV_{i}", type(1)))
+    return constraints
+
+
+@benchmark
+def unifier():
+    print("Unification of constraints with union-find: time per constraint (ns)")
+    print(f"{'constraints':>12} {'unify':>8} {'name_sets':>10} {'total(s)':>9}")
+    rng = random.Random(5)
+    for size in [10000, 100000, 1000000]:
+        constraints = random_constraints(size, rng)
+        sets, t_unify = timed(Unifier.unify, constraints, {}, repeat=1)
+        type_names, t_names = timed(Unifier.name_sets, sets, repeat=1)
+        assert len(type_names) == size + 1
+        print(f"{len(constraints):>12} {t_unify * 1e9 / len(constraints):>8.0f} "
+              f"{t_names * 1e9 / len(constraints):>10.0f} {t_unify + t_names:>9.2f}")
+
+
+def typed_exp(depth, names, counter):
+    """
+    Builds a well-typed expression with about 2^depth leaves, made of
+    arithmetic, conditionals and let bindings of fresh names, which the
+    leaves below them may read.
+    """
+    if depth == 0:
+        if names and random.random() < 0.5:
+            return Var(random.choice(names))
+        return Num(random.randint(1, 9))
+    choice = random.random()
+    if choice < 0.2:
+        counter[0] += 1
+        name = f"n{counter[0]}"
+        return Let(name, typed_exp(depth - 1, names, counter),
+                   typed_exp(depth - 1, names + [name], counter))
+    if choice < 0.3:
+        cond = Lth(typed_exp(depth - 1, names, counter), Num(0))
+        return IfThenElse(cond, typed_exp(depth - 1, names, counter), Num(1))
+    op = random.choice([Add, Sub, Mul])
+    return op(typed_exp(depth - 1, names, counter), typed_exp(depth - 1, names, counter))
+
+
+def infer_from_list(exp):
+    ev = CtrGenVisitor()
+    constraints = list(exp.accept(ev, ev.fresh_type_var()))
+    return Unifier.name_sets(Unifier.unify(constraints, {}))
+
+
+@benchmark
+def inference():
+    print("Type inference that collects the constraints in a list against")
+    print("inference that unifies them as they are generated: peak memory (KB)")
+    print("and time (ms)")
+    print(f"{'depth':>6} {'constraints':>12} {'names':>8} {'list':>9} {'stream':>9} "
+          f"{'t list':>8} {'t stream':>9}")
+    random.seed(3)
+    for depth in [8, 11, 14]:
+        exp = typed_exp(depth, [], [0])
+        ev = CtrGenVisitor()
+        constraints = sum(1 for _ in exp.accept(ev, ev.fresh_type_var()))
+        expected, m_list = peak_allocated(infer_from_list, exp)
+        types, m_stream = peak_allocated(Unifier.infer_types, exp)
+        assert types == expected
+        _, t_list = timed(infer_from_list, exp)
+        _, t_stream = timed(Unifier.infer_types, exp)
+        print(f"{depth:>6} {constraints:>12} {len(types):>8} {m_list / 1024:>9.0f} "
+              f"{m_stream / 1024:>9.0f} {t_list * 1000:>8.1f} {t_stream * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(benchmarks)
+    random.seed(0)
+    for name in names:
+        benchmarks[name]()
+        print()
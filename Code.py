@@ -0,0 +1,195 @@
+"""
+This file separates the code of a program from the state of its executions.
+A Program holds its instructions, its environment and its program counter
+in one mutable object; thus, running the same instructions over many inputs
+means building many programs, and two threads cannot run one program at the
+same time. Here, CompiledCode is the linked form of the instructions (see
+Linker.py), stored in tuples that no execution modifies, so any number of
+threads, or asyncio tasks, can run it at the same time, without copying it.
+Each execution keeps its own ExecutionState: a list of registers and a
+program counter.
+
+Lists of registers are reused: each CompiledCode has a RegisterPool, from
+which executions take a preallocated list, and to which they give it back
+when they finish. Thus, running a program does not allocate its registers,
+except for the first executions, or when many executions run at once.
+
+This file uses doctests. To test it, run "python3 -m doctest Code.py".
+"""
+
+import asyncio
+import sys
+import threading
+from types import MappingProxyType
+
+import Asm as AsmModule
+import Linker
+from Linker import execute
+
+
+class RegisterPool:
+    """
+    A thread-safe pool of lists of registers, all of the same size.
+
+    Example:
+        >>> pool = RegisterPool(3)
+        >>> regs = pool.acquire()
+        >>> regs
+        [None, None, None]
+        >>> regs[1] = 7
+        >>> pool.release(regs)
+        >>> pool.acquire() is regs, regs
+        (True, [None, None, None])
+    """
+
+    def __init__(self, size, capacity=64):
+        self.size = size
+        self.capacity = capacity
+        self.free = []
+        self.lock = threading.Lock()
+        self.created = 0
+
+    def acquire(self):
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+            self.created += 1
+        return [None] * self.size
+
+    def release(self, regs):
+        regs[:] = [None] * self.size
+        with self.lock:
+            if len(self.free) < self.capacity:
+                self.free.append(regs)
+
+
+class ExecutionState:
+    """
+    The state of one execution of a CompiledCode: its registers, which come
+    from the pool of the code, and its program counter. An execution can run
+    in slices, of a given number of instructions each. Once it is over,
+    release gives its registers back to the pool; the state is then empty.
+
+    Example:
+        >>> p = AsmModule.Program({}, [AsmModule.Addi("a", "x0", 1),
+        ...                            AsmModule.Addi("b", "a", 1)])
+        >>> state = ExecutionState(CompiledCode(p), {})
+        >>> state.run(1), state.get_env()
+        (False, {'x0': 0, 'a': 1})
+        >>> state.run(1), state.get_env()
+        (True, {'x0': 0, 'a': 1, 'b': 2})
+        >>> state.release()
+    """
+
+    def __init__(self, code, env):
+        self.code = code
+        self.regs = code.pool.acquire()
+        self.pc = 0
+        self.env = env
+        slots = code.slots
+        for name, value in env.items():
+            if name in slots:
+                self.regs[slots[name]] = value
+        self.regs[0] = 0
+
+    def run(self, budget=-1):
+        """
+        Runs up to 'budget' instructions, or until the end of the code, if
+        the budget is negative. Tells if the execution is over.
+        """
+        self.pc = execute(self.code.code, self.regs, self.pc, budget)
+        return self.pc >= len(self.code.code)
+
+    def get_val(self, name):
+        value = self.regs[self.code.slots[name]] if name in self.code.slots else None
+        if value is None:
+            sys.exit("Def error")
+        return value
+
+    def get_env(self):
+        """
+        Returns the environment of the execution: the environment that it
+        started from, updated with the registers that have values.
+        """
+        env = dict(self.env)
+        env["x0"] = 0
+        for name, value in zip(self.code.names, self.regs):
+            if value is not None:
+                env[name] = value
+        return env
+
+    def release(self):
+        if self.regs is not None:
+            self.code.pool.release(self.regs)
+            self.regs = None
+
+
+class CompiledCode:
+    """
+    The linked instructions of a program, which do not change after they are
+    compiled: 'code' is a tuple of tuples (opcode, a, b, c), 'names' is a
+    tuple with the name of each register, and 'slots' is a read-only mapping
+    from names to registers. Only the environment of the program at compile
+    time matters to the numbering of the registers; the inputs of each run
+    are passed to 'run'.
+
+    Example:
+        >>> p = AsmModule.Program({"n": 0}, [AsmModule.Addi("s", "x0", 0)])
+        >>> p.add_label("loop")
+        >>> p.add_inst(AsmModule.Add("s", "s", "n"))
+        >>> p.add_inst(AsmModule.Addi("n", "n", -1))
+        >>> p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+        >>> code = CompiledCode(p)
+        >>> code.names, code.code[1]
+        (('x0', 'n', 's'), (0, 2, 2, 1))
+        >>> [code.run({"n": n})["s"] for n in range(1, 5)]
+        [1, 3, 6, 10]
+    """
+
+    def __init__(self, prog, pool_capacity=64):
+        linked = Linker.LinkedProgram(prog)
+        self.code = tuple(linked.code)
+        self.slots = MappingProxyType(dict(linked.slots))
+        self.names = tuple(linked.slots)
+        self.pool = RegisterPool(len(self.names), pool_capacity)
+
+    def state(self, env):
+        return ExecutionState(self, env)
+
+    def run(self, env):
+        """
+        Runs the code over the environment, which is not modified, and
+        returns the final environment, like the environment of a Program
+        after Program.eval. Many threads can call this method at the same
+        time.
+        """
+        state = ExecutionState(self, env)
+        try:
+            state.run()
+            return state.get_env()
+        finally:
+            state.release()
+
+    async def run_async(self, env, budget=10000):
+        """
+        Runs the code like 'run', but gives control back to the event loop
+        after each slice of 'budget' instructions, so that long executions
+        do not block other tasks:
+
+        >>> code = CompiledCode(AsmModule.Program({}, [AsmModule.Mul("b", "a", "a")]))
+        >>> async def main():
+        ...     return await asyncio.gather(*[code.run_async({"a": a}) for a in range(3)])
+        >>> [env["b"] for env in asyncio.run(main())]
+        [0, 1, 4]
+        """
+        state = ExecutionState(self, env)
+        try:
+            while not state.run(budget):
+                await asyncio.sleep(0)
+            return state.get_env()
+        finally:
+            state.release()
+
+
+def compile_program(prog):
+    return CompiledCode(prog)
@@ -0,0 +1,460 @@
+"""
+This file implements a compact binary encoding of Asm programs. Each
+instruction becomes one 32-bit word, in the style of RV32, stored in an
+array('I'), so that a program takes about four bytes per instruction,
+instead of a Python object with three strings. Registers are numbered, in
+the order in which the program mentions them, with x0 as register 0. The
+fields of the words are:
+
+     31        23 22        14 13         5 4      0
+    |  rs2/imm   |    rs1     |     rd     | opcode |   (R and I types)
+    |   target   |    rs2     |    rs1     | opcode |   (branches)
+    |     0      |   target   |     rd     | opcode |   (jumps)
+    |   high c   |   high b   |   high a   |  EXT   |   (extension words)
+
+Opcodes are the numbers in Linker.OPCODES. Fields have 9 bits. Immediates
+have 9 bits, with sign; larger constants go into a side pool, and their
+instructions use a "pooled" opcode, whose immediate field is an index in
+the pool. Branch and jump targets are indices in a table of positions, one
+per label. Register numbers, pool indices and label numbers that do not fit
+into 9 bits take extension words: each EXT word before an instruction holds
+the next 9 bits of each of its three fields, starting with bits 9 to 17.
+Thus, the first 512 registers, constants and labels take one word per
+instruction, and programs of any size can be encoded, with one more word
+for each 9 bits of their largest field. Positions in the table of targets
+count instructions, not words; the interpreter keeps a small table of their
+positions in words, with one entry per label.
+
+An encoded program can run directly from its words (see
+EncodedProgram.eval), can be decoded back into a Program, and can be saved
+into a file and loaded from it. The file has a short JSON header, with the
+names of the registers and labels, the pool of constants and the table of
+targets, followed by the words, which are written with a single
+array.tofile call and read with a single array.fromfile call.
+
+This file uses doctests. To test it, run "python3 -m doctest Encoding.py".
+"""
+
+import json
+import sys
+from array import array
+
+import Asm as AsmModule
+import Linker
+from Linker import ADD, ADDI, MUL, SUB, XOR, XORI, DIV, SLT, SLTI
+from Linker import SLL, SLLI, SRAI, AND, ANDI, BEQ, BNE, BLT, JAL, JMP
+
+
+OP_BITS = 5
+FIELD_BITS = 9
+FIELD_MASK = (1 << FIELD_BITS) - 1
+MIN_IMM = -(1 << (FIELD_BITS - 1))
+MAX_IMM = (1 << (FIELD_BITS - 1)) - 1
+
+POOLED = 19
+IMMEDIATE_OPS = [ADDI, XORI, SLTI, SLLI, SRAI, ANDI]
+POOLED_OPS = {op: POOLED + i for i, op in enumerate(IMMEDIATE_OPS)}
+UNPOOLED_OPS = {pooled: op for op, pooled in POOLED_OPS.items()}
+EXT = POOLED + len(IMMEDIATE_OPS)
+
+NAMES = {op: name for name, op in Linker.OPCODES.items()}
+CLASSES = {
+    "add": AsmModule.Add, "mul": AsmModule.Mul, "sub": AsmModule.Sub,
+    "xor": AsmModule.Xor, "div": AsmModule.Div, "slt": AsmModule.Slt,
+    "sll": AsmModule.Sll, "and": AsmModule.And, "addi": AsmModule.Addi,
+    "xori": AsmModule.Xori, "slti": AsmModule.Slti, "slli": AsmModule.Slli,
+    "srai": AsmModule.Srai, "andi": AsmModule.Andi, "beq": AsmModule.Beq,
+    "bne": AsmModule.Bne, "blt": AsmModule.Blt,
+}
+
+
+def pack(op, a, b, c):
+    """
+    Packs an opcode and the low bits of three fields into a word. The last
+    field may be a negative immediate:
+
+    >>> hex(pack(ADDI, 1, 2, -1))
+    '0xff808021'
+    """
+    return op | ((a & FIELD_MASK) << OP_BITS) | ((b & FIELD_MASK) << (OP_BITS + FIELD_BITS)) | \
+        ((c & FIELD_MASK) << (OP_BITS + 2 * FIELD_BITS))
+
+
+def pack_all(op, a, b, c):
+    """
+    Returns the words of an instruction: the extension words that its
+    fields need, if any, followed by the instruction word. Fields must not
+    be negative; immediates go in with pack.
+
+    >>> [hex(word) for word in pack_all(ADDI, 1, 1000, 0)]
+    ['0x4019', '0x7a0021']
+    """
+    words = []
+    high_a, high_b, high_c = a >> FIELD_BITS, b >> FIELD_BITS, c >> FIELD_BITS
+    while high_a or high_b or high_c:
+        words.append(pack(EXT, high_a, high_b, high_c))
+        high_a, high_b, high_c = high_a >> FIELD_BITS, high_b >> FIELD_BITS, high_c >> FIELD_BITS
+    words.append(pack(op, a, b, c))
+    return words
+
+
+class EncodedProgram:
+    """
+    The binary form of a program. The attribute 'words' holds the
+    instructions; 'names' maps register numbers to names; 'pool' holds the
+    constants that do not fit into immediates; 'targets' maps label numbers
+    to positions, and 'labels' maps them to names.
+
+    Example:
+        >>> p = AsmModule.Program({}, [AsmModule.Addi("a", "x0", 1000),
+        ...                            AsmModule.Slli("b", "a", 2)])
+        >>> ep = EncodedProgram(p)
+        >>> ep.names, ep.pool, ep.words.itemsize, len(ep.words)
+        (['x0', 'a', 'b'], [1000], 4, 2)
+        >>> ep.eval({})
+        {'x0': 0, 'a': 1000, 'b': 4000}
+    """
+
+    def __init__(self, prog=None):
+        self.words = array("I")
+        self.names = []
+        self.numbers = {}
+        self.pool = []
+        self.constants = {}
+        self.targets = []
+        self.labels = []
+        self.cached_layout = None
+        if prog is not None:
+            self.encode(prog)
+
+    def reg(self, name):
+        if name not in self.numbers:
+            self.numbers[name] = len(self.names)
+            self.names.append(name)
+        return self.numbers[name]
+
+    def constant(self, value):
+        if value not in self.constants:
+            self.constants[value] = len(self.pool)
+            self.pool.append(value)
+        return self.constants[value]
+
+    def encode(self, prog):
+        self.reg("x0")
+        label_numbers = {}
+        for label, pc in prog.get_labels().items():
+            label_numbers[label] = len(self.labels)
+            self.labels.append(label)
+            self.targets.append(pc)
+        for inst in prog.get_insts():
+            self.encode_inst(inst, label_numbers)
+
+    def encode_inst(self, inst, label_numbers):
+        """
+        Appends the words of the instruction to the program. Loads and
+        stores have no encoding.
+        """
+        if inst.get_opcode() not in Linker.OPCODES:
+            sys.exit(f"Encoding error: cannot encode '{inst.get_opcode()}'")
+        op = Linker.OPCODES[inst.get_opcode()]
+        if op == JAL:
+            if inst.lab not in label_numbers:
+                sys.exit("Label error")
+            if inst.rd == "x0":
+                self.words.extend(pack_all(JMP, 0, label_numbers[inst.lab], 0))
+            else:
+                self.words.extend(pack_all(JAL, self.reg(inst.rd), label_numbers[inst.lab], 0))
+        elif op in (BEQ, BNE, BLT):
+            if inst.lab not in label_numbers:
+                sys.exit("Label error")
+            self.words.extend(pack_all(op, self.reg(inst.rs1), self.reg(inst.rs2),
+                                       label_numbers[inst.lab]))
+        elif op not in POOLED_OPS:
+            self.words.extend(pack_all(op, self.reg(inst.rd), self.reg(inst.rs1),
+                                       self.reg(inst.rs2)))
+        elif MIN_IMM <= inst.imm <= MAX_IMM:
+            self.words.extend(pack_all(op, self.reg(inst.rd), self.reg(inst.rs1),
+                                       inst.imm & FIELD_MASK))
+        else:
+            self.words.extend(pack_all(POOLED_OPS[op], self.reg(inst.rd), self.reg(inst.rs1),
+                                       self.constant(inst.imm)))
+
+    def instructions(self):
+        """
+        Yields the instructions of the program, as tuples (opcode, a, b, c),
+        with their extension words applied. Immediates come out with their
+        sign, and pooled constants come out of the pool.
+
+        Example:
+            >>> p = AsmModule.Program({}, [AsmModule.Addi(f"r{i}", "x0", -i) for i in range(600)])
+            >>> ep = EncodedProgram(p)
+            >>> len(ep.words), list(ep.instructions())[-1]
+            (689, (1, 600, 0, -599))
+        """
+        pool = self.pool
+        a = b = c = 0
+        shift = FIELD_BITS
+        for word in self.words:
+            op = word & ((1 << OP_BITS) - 1)
+            if op == EXT:
+                a |= ((word >> OP_BITS) & FIELD_MASK) << shift
+                b |= ((word >> (OP_BITS + FIELD_BITS)) & FIELD_MASK) << shift
+                c |= (word >> (OP_BITS + 2 * FIELD_BITS)) << shift
+                shift += FIELD_BITS
+                continue
+            a |= (word >> OP_BITS) & FIELD_MASK
+            b |= (word >> (OP_BITS + FIELD_BITS)) & FIELD_MASK
+            c |= word >> (OP_BITS + 2 * FIELD_BITS)
+            if op in UNPOOLED_OPS:
+                op, c = UNPOOLED_OPS[op], pool[c]
+            elif op in POOLED_OPS:
+                c = (c ^ (1 << (FIELD_BITS - 1))) - (1 << (FIELD_BITS - 1))
+            yield op, a, b, c
+            a = b = c = 0
+            shift = FIELD_BITS
+
+    def decode(self, env=None):
+        """
+        Rebuilds the program, with the given environment.
+
+        Example:
+            >>> p = AsmModule.Program({}, [AsmModule.Beq("x0", "x0", "L1"),
+            ...                            AsmModule.Addi("a", "x0", -5000)])
+            >>> p.add_label("L1")
+            >>> p.add_inst(AsmModule.Jal("x0", "L1"))
+            >>> EncodedProgram(p).decode().print_insts()
+            beq x0 x0 L1
+            a = addi x0 -5000
+            L1:
+            x0 = jal L1
+        """
+        prog = AsmModule.Program(dict(env or {}), [])
+        starts = {}
+        for number, pc in enumerate(self.targets):
+            starts.setdefault(pc, []).append(self.labels[number])
+        names = self.names
+        pc = 0
+        for op, a, b, c in self.instructions():
+            for label in starts.get(pc, []):
+                prog.add_label(label)
+            pc += 1
+            if op == JMP:
+                prog.add_inst(AsmModule.Jal("x0", self.labels[b]))
+            elif op == JAL:
+                prog.add_inst(AsmModule.Jal(names[a], self.labels[b]))
+            elif op in (BEQ, BNE, BLT):
+                prog.add_inst(CLASSES[NAMES[op]](names[a], names[b], self.labels[c]))
+            elif op in POOLED_OPS:
+                prog.add_inst(CLASSES[NAMES[op]](names[a], names[b], c))
+            else:
+                prog.add_inst(CLASSES[NAMES[op]](names[a], names[b], names[c]))
+        for label in starts.get(pc, []):
+            prog.add_label(label)
+        return prog
+
+    def extended(self, pc):
+        """
+        Reads the extension words from position pc, and the instruction
+        word that follows them. Returns the opcode and the three fields of
+        the instruction, not yet sign-extended nor out of the pool, plus the
+        position of the next word.
+        """
+        words = self.words
+        a = b = c = 0
+        shift = FIELD_BITS
+        word = words[pc]
+        while word & ((1 << OP_BITS) - 1) == EXT:
+            a |= ((word >> OP_BITS) & FIELD_MASK) << shift
+            b |= ((word >> (OP_BITS + FIELD_BITS)) & FIELD_MASK) << shift
+            c |= (word >> (OP_BITS + 2 * FIELD_BITS)) << shift
+            shift += FIELD_BITS
+            pc += 1
+            word = words[pc]
+        a |= (word >> OP_BITS) & FIELD_MASK
+        b |= (word >> (OP_BITS + FIELD_BITS)) & FIELD_MASK
+        c |= word >> (OP_BITS + 2 * FIELD_BITS)
+        return word & ((1 << OP_BITS) - 1), a, b, c, pc + 1
+
+    def layout(self):
+        """
+        Returns the positions of the targets of the labels in the words,
+        which differ from their positions in instructions when the program
+        has extension words, plus the values that "jal" writes, by the
+        position of the word that follows it. The layout takes one entry per
+        label and per "jal"; it is computed on the first run, and again only
+        if words were added since.
+
+        Example:
+            >>> p = AsmModule.Program({}, [AsmModule.Addi(f"r{i}", "x0", 1) for i in range(512)])
+            >>> p.add_inst(AsmModule.Jal("ra", "end"))
+            >>> p.add_label("end")
+            >>> EncodedProgram(p).layout()
+            ([515], {515: 513})
+        """
+        if self.cached_layout is not None and self.cached_layout[0] == len(self.words):
+            return self.cached_layout[1:]
+        wanted = set(self.targets)
+        positions = {}
+        returns = {}
+        inst = 0
+        for pos, word in enumerate(self.words):
+            if inst in wanted and inst not in positions:
+                positions[inst] = pos
+            op = word & ((1 << OP_BITS) - 1)
+            if op != EXT:
+                inst += 1
+                if op == JAL:
+                    returns[pos + 1] = inst
+        positions.setdefault(inst, len(self.words))
+        word_targets = [positions[pc] for pc in self.targets]
+        self.cached_layout = (len(self.words), word_targets, returns)
+        return word_targets, returns
+
+    def eval(self, env):
+        """
+        Runs the program directly from its words, over a copy of the
+        environment, and returns the final environment, like the environment
+        of a Program after Program.eval. Reading a register without a value
+        exits with "Def error".
+
+        Example:
+            >>> p = AsmModule.Program({}, [AsmModule.Addi("s", "x0", 0)])
+            >>> p.add_label("loop")
+            >>> p.add_inst(AsmModule.Add("s", "s", "n"))
+            >>> p.add_inst(AsmModule.Addi("n", "n", -1))
+            >>> p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+            >>> EncodedProgram(p).eval({"n": 4})["s"]
+            10
+        """
+        regs = [None] * len(self.names)
+        for name, value in env.items():
+            if name in self.numbers:
+                regs[self.numbers[name]] = value
+        regs[0] = 0
+        targets, returns = self.layout()
+        words = self.words
+        pool = self.pool
+        size = len(words)
+        pc = 0
+        try:
+            while pc < size:
+                word = words[pc]
+                pc += 1
+                op = word & 31
+                if op == EXT:
+                    op, a, b, c, pc = self.extended(pc - 1)
+                else:
+                    a = (word >> 5) & 511
+                    b = (word >> 14) & 511
+                    c = word >> 23
+                if op == ADD:
+                    regs[a] = regs[b] + regs[c]
+                elif op == ADDI:
+                    regs[a] = regs[b] + ((c ^ 256) - 256)
+                elif op == SUB:
+                    regs[a] = regs[b] - regs[c]
+                elif op == MUL:
+                    regs[a] = regs[b] * regs[c]
+                elif op == SLTI:
+                    regs[a] = 1 if regs[b] < ((c ^ 256) - 256) else 0
+                elif op == XOR:
+                    regs[a] = regs[b] ^ regs[c]
+                elif op == SLT:
+                    regs[a] = 1 if regs[b] < regs[c] else 0
+                elif op == DIV:
+                    regs[a] = regs[b] // regs[c]
+                elif op == BEQ:
+                    if regs[a] is None or regs[b] is None:
+                        sys.exit("Def error")
+                    if regs[a] == regs[b]:
+                        pc = targets[c]
+                elif op == BNE:
+                    if regs[a] is None or regs[b] is None:
+                        sys.exit("Def error")
+                    if regs[a] != regs[b]:
+                        pc = targets[c]
+                elif op == BLT:
+                    if regs[a] < regs[b]:
+                        pc = targets[c]
+                elif op == JMP:
+                    pc = targets[b]
+                elif op == JAL:
+                    regs[a] = returns[pc]
+                    pc = targets[b]
+                elif op == XORI:
+                    regs[a] = regs[b] ^ ((c ^ 256) - 256)
+                elif op == SLLI:
+                    regs[a] = regs[b] << ((c ^ 256) - 256)
+                elif op == SRAI:
+                    regs[a] = regs[b] >> ((c ^ 256) - 256)
+                elif op == ANDI:
+                    regs[a] = regs[b] & ((c ^ 256) - 256)
+                elif op == SLL:
+                    regs[a] = regs[b] << regs[c]
+                elif op == AND:
+                    regs[a] = regs[b] & regs[c]
+                else:
+                    op, imm = UNPOOLED_OPS[op], pool[c]
+                    if op == ADDI:
+                        regs[a] = regs[b] + imm
+                    elif op == XORI:
+                        regs[a] = regs[b] ^ imm
+                    elif op == SLTI:
+                        regs[a] = 1 if regs[b] < imm else 0
+                    elif op == SLLI:
+                        regs[a] = regs[b] << imm
+                    elif op == SRAI:
+                        regs[a] = regs[b] >> imm
+                    else:
+                        regs[a] = regs[b] & imm
+        except TypeError:
+            sys.exit("Def error")
+        result = dict(env)
+        result["x0"] = 0
+        for number, value in enumerate(regs):
+            if value is not None:
+                result[self.names[number]] = value
+        return result
+
+    def tofile(self, file):
+        """
+        Writes the program into a binary file.
+
+        Example:
+            >>> import io
+            >>> p = AsmModule.Program({}, [AsmModule.Mul("b", "a", "a")])
+            >>> buffer = io.BytesIO()
+            >>> EncodedProgram(p).tofile(buffer)
+            >>> _ = buffer.seek(0)
+            >>> EncodedProgram.fromfile(buffer).eval({"a": 7})["b"]
+            49
+        """
+        header = json.dumps({
+            "size": len(self.words), "names": self.names, "pool": self.pool,
+            "targets": self.targets, "labels": self.labels,
+        }).encode()
+        file.write(len(header).to_bytes(4, "little"))
+        file.write(header)
+        self.words.tofile(file)
+
+    @staticmethod
+    def fromfile(file):
+        header_size = int.from_bytes(file.read(4), "little")
+        header = json.loads(file.read(header_size))
+        encoded = EncodedProgram()
+        encoded.names = header["names"]
+        encoded.numbers = {name: number for number, name in enumerate(encoded.names)}
+        encoded.pool = header["pool"]
+        encoded.constants = {value: index for index, value in enumerate(encoded.pool)}
+        encoded.targets = header["targets"]
+        encoded.labels = header["labels"]
+        encoded.words.fromfile(file, header["size"])
+        return encoded
+
+
+def encode(prog):
+    return EncodedProgram(prog)
+
+
+def decode(encoded, env=None):
+    return encoded.decode(env)
@@ -178,6 +178,17 @@ class Div(BinaryExpression):
         return visitor.visit_div(self, arg)
 
 
+class Mod(BinaryExpression):
+    """
+    This class represents the remainder of the integer division of two
+    expressions. The remainder has the sign of the divisor, so that
+    left = (left div right) * right + (left mod right).
+    """
+
+    def accept(self, visitor, arg):
+        return visitor.visit_mod(self, arg)
+
+
 class Leq(BinaryExpression):
     """
     This class represents comparison of two expressions using the
@@ -277,4 +288,98 @@ class Let(Expression):
         We don't have bindings at this point. So, nothing to be done here, for
         this exercise.
         """
-        return visitor.visit_let(self, arg)
\ No newline at end of file
+        return visitor.visit_let(self, arg)
+
+
+class And(BinaryExpression):
+    """
+    This class represents the logical conjunction of two boolean expressions.
+    The right operand is only evaluated if the left operand is true.
+    """
+
+    def accept(self, visitor, arg):
+        return visitor.visit_and(self, arg)
+
+
+class Or(BinaryExpression):
+    """
+    This class represents the logical disjunction of two boolean expressions.
+    The right operand is only evaluated if the left operand is false.
+    """
+
+    def accept(self, visitor, arg):
+        return visitor.visit_or(self, arg)
+
+
+class IfThenElse(Expression):
+    """
+    This class represents a conditional expression. The semantics of an expression
+    such as 'if B then E0 else E1' is as follows:
+    1. Evaluate B. Call the result ValueB.
+    2. If ValueB is True, then evaluate E0 and return the result.
+    3. If ValueB is False, then evaluate E1 and return the result.
+    Notice that we only evaluate one of the two sub-expressions, not both.
+    """
+
+    def __init__(self, cond, e0, e1):
+        self.cond = cond
+        self.e0 = e0
+        self.e1 = e1
+
+    def accept(self, visitor, arg):
+        return visitor.visit_ifThenElse(self, arg)
+
+
+class Fn(Expression):
+    """
+    This class represents an anonymous function, such as 'fn x: int => x + 1'.
+    The function has a formal parameter, the type of that parameter, and a
+    body. Its value is the function itself; the body is only evaluated when the
+    function is applied.
+    """
+
+    def __init__(self, formal, tp_var, body):
+        self.formal = formal
+        self.tp_var = tp_var
+        self.body = body
+
+    def accept(self, visitor, arg):
+        return visitor.visit_fn(self, arg)
+
+
+class App(Expression):
+    """
+    This class represents the application of a function to an actual
+    parameter. The semantics of an expression such as 'e0 e1' is as follows:
+    1. Evaluate e0, yielding a function fn x => body
+    2. Evaluate e1, yielding a value v
+    3. Evaluate body in the environment env' = env + {x:v}
+    """
+
+    def __init__(self, function, actual):
+        self.function = function
+        self.actual = actual
+
+    def accept(self, visitor, arg):
+        return visitor.visit_app(self, arg)
+
+
+class ArrowType:
+    """
+    This class represents the type of functions, such as 'int -> bool'. It is
+    not an expression: it only appears in the type annotations of functions.
+    """
+
+    def __init__(self, domain, image):
+        self.domain = domain
+        self.image = image
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ArrowType)
+            and self.domain == other.domain
+            and self.image == other.image
+        )
+
+    def __hash__(self):
+        return hash((self.domain, self.image))
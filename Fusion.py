@@ -0,0 +1,521 @@
+"""
+This file implements superinstructions: linked instructions that do the work
+of a fixed sequence of instructions, in a single dispatch of the
+interpreter. GenVisitor produces two idioms very often:
+
+    * The equality test of compute_equality, which becomes "seq":
+        d = sub x y; c1 = slti d 1; c2 = slti d 0; e = xor c1 c2
+    * The load of a constant followed by its use, which becomes "addk",
+      "subk" or "mulk", e.g.:
+        t = addi x0 k; r = add a t
+
+The fused programs are threaded programs (see Threaded.py) where the closure
+of the first instruction of each idiom is replaced with the closure of a
+superinstruction. The superinstruction writes every register that the idiom
+writes, so the final environment is the same, and then continues after the
+idiom. The other instructions of the idiom stay in the code, but never run.
+Superinstructions cost nothing to the instructions that are not fused,
+because the threaded interpreter has no dispatch on opcodes. Sequences that
+contain the target of a branch, other than in their first instruction, are
+not fused, because a jump into their middle would run only part of them.
+
+Static fusion only catches the idioms above. The class Profile records, in
+a profiling run of the interpreter, how often each pair and each triple of
+opcodes runs in sequence, and how often each position runs. The profile can
+be saved to a file, and the fused program can be rebuilt from it: the most
+frequent sequences are fused into superinstructions that are generated on
+demand, and the most frequent opcodes that have faster variants for common
+operands get specialized closures.
+
+This file uses doctests. To test it, run "python3 -m doctest Fusion.py".
+"""
+
+import json
+import sys
+from collections import Counter
+
+import Asm as AsmModule
+import Jit
+import Linker
+import Threaded
+
+
+SEQ, ADDK, SUBK, MULK, SEQUENCE = range(19, 24)
+
+
+def thread_seq(regs, a, b, c, nxt):
+    x, y = b
+    d, c1, c0 = c
+    def seq():
+        delta = regs[x] - regs[y]
+        lt1 = 1 if delta < 1 else 0
+        lt0 = 1 if delta < 0 else 0
+        regs[d] = delta
+        regs[c1] = lt1
+        regs[c0] = lt0
+        regs[a] = lt1 ^ lt0
+        return nxt
+    return seq
+
+
+def thread_addk(regs, a, b, c, nxt):
+    x, t = b
+    def addk():
+        k = regs[0] + c
+        regs[t] = k
+        regs[a] = regs[x] + k
+        return nxt
+    return addk
+
+
+def thread_subk(regs, a, b, c, nxt):
+    x, t = b
+    def subk():
+        k = regs[0] + c
+        regs[t] = k
+        regs[a] = regs[x] - k
+        return nxt
+    return subk
+
+
+def thread_mulk(regs, a, b, c, nxt):
+    x, t = b
+    def mulk():
+        k = regs[0] + c
+        regs[t] = k
+        regs[a] = regs[x] * k
+        return nxt
+    return mulk
+
+
+factories = {}
+
+
+def sequence_factory(opcodes):
+    """
+    Returns a function that creates superinstructions for sequences of
+    instructions with the given opcodes. The function is generated from the
+    templates of Jit.py, and compiled only once for each sequence. Its
+    arguments are the list of registers, the three linked operands of each
+    instruction, and the position of the next instruction.
+
+    Example:
+        >>> regs = [0, 5, None, None]
+        >>> superinst = sequence_factory(("addi", "mul"))(regs, 2, 1, 1, 3, 2, 2, 9)
+        >>> superinst(), regs
+        (9, [0, 5, 6, 36])
+    """
+    if opcodes not in factories:
+        params = []
+        lines = []
+        for i, opcode in enumerate(opcodes):
+            params += [f"a{i}", f"b{i}", f"c{i}"]
+            lines.append(Jit.TEMPLATES[opcode].format(
+                rd=f"regs[a{i}]", rs1=f"regs[b{i}]", rs2=f"regs[c{i}]", imm=f"c{i}"))
+        text = (
+            f"def factory(regs, {', '.join(params)}, nxt):\n"
+            "    def superinstruction():\n"
+            + "".join(f"        {line}\n" for line in lines)
+            + "        return nxt\n"
+            "    return superinstruction\n"
+        )
+        namespace = {}
+        exec(compile(text, f"<fused {' '.join(opcodes)}>", "exec"), namespace)
+        factories[opcodes] = namespace["factory"]
+    return factories[opcodes]
+
+
+def thread_sequence(regs, a, b, c, nxt):
+    operands = [operand for inst in b for operand in inst[1:]]
+    return sequence_factory(a)(regs, *operands, nxt)
+
+
+THREADERS = {
+    SEQ: thread_seq, ADDK: thread_addk, SUBK: thread_subk, MULK: thread_mulk,
+    SEQUENCE: thread_sequence,
+}
+
+
+def specialize_addi(regs, a, b, c, nxt):
+    """
+    "addi rd x0 k" loads a constant, if the program never writes x0.
+    """
+    if b != 0:
+        return None
+    def li():
+        regs[a] = c
+        return nxt
+    return li
+
+
+def specialize_beq(regs, a, b, c, nxt):
+    """
+    "beq rs x0 lab" tests rs against zero, if the program never writes x0.
+    """
+    if a != 0 and b != 0:
+        return None
+    rs = a if b == 0 else b
+    def beqz():
+        value = regs[rs]
+        if value is None:
+            sys.exit("Def error")
+        return c if value == 0 else nxt
+    return beqz
+
+
+def specialize_bne(regs, a, b, c, nxt):
+    if a != 0 and b != 0:
+        return None
+    rs = a if b == 0 else b
+    def bnez():
+        value = regs[rs]
+        if value is None:
+            sys.exit("Def error")
+        return c if value != 0 else nxt
+    return bnez
+
+
+SPECIALIZERS = {"addi": specialize_addi, "beq": specialize_beq, "bne": specialize_bne}
+
+NAMES = {op: name for name, op in Linker.OPCODES.items()}
+
+
+def match_seq(insts, pc, slots):
+    """
+    Recognizes the equality idiom of GenVisitor.compute_equality at position
+    pc. The temporaries d, c1 and c2 must be different registers.
+
+    Example:
+        >>> insts = [AsmModule.Sub("d", "x", "y"), AsmModule.Slti("c1", "d", 1),
+        ...          AsmModule.Slti("c2", "d", 0), AsmModule.Xor("e", "c1", "c2")]
+        >>> slots = {"x0": 0, "x": 1, "y": 2, "d": 3, "c1": 4, "c2": 5, "e": 6}
+        >>> match_seq(insts, 0, slots)
+        (19, 6, (1, 2), (3, 4, 5))
+    """
+    if pc + 4 > len(insts):
+        return None
+    sub, lt1, lt0, xor = insts[pc:pc + 4]
+    if not (
+        isinstance(sub, AsmModule.Sub)
+        and isinstance(lt1, AsmModule.Slti) and lt1.rs1 == sub.rd and lt1.imm == 1
+        and isinstance(lt0, AsmModule.Slti) and lt0.rs1 == sub.rd and lt0.imm == 0
+        and isinstance(xor, AsmModule.Xor)
+        and {xor.rs1, xor.rs2} == {lt1.rd, lt0.rd}
+        and len({sub.rd, lt1.rd, lt0.rd}) == 3
+    ):
+        return None
+    temps = (slots[sub.rd], slots[lt1.rd], slots[lt0.rd])
+    return (SEQ, slots[xor.rd], (slots[sub.rs1], slots[sub.rs2]), temps)
+
+
+def match_constant(insts, pc, slots):
+    """
+    Recognizes the load of a constant, "t = addi x0 k", followed by an
+    instruction that uses t: an add or a mul, where t is any of the operands,
+    or a sub, where t is the second operand. A sub that starts an equality
+    idiom is left to "seq", which saves more dispatches.
+
+    Example:
+        >>> insts = [AsmModule.Addi("t", "x0", 7), AsmModule.Mul("r", "t", "a")]
+        >>> match_constant(insts, 0, {"x0": 0, "a": 1, "t": 2, "r": 3})
+        (22, 3, (1, 2), 7)
+    """
+    if pc + 2 > len(insts):
+        return None
+    load, use = insts[pc:pc + 2]
+    if not (isinstance(load, AsmModule.Addi) and load.rs1 == "x0"):
+        return None
+    fused = {AsmModule.Add: ADDK, AsmModule.Sub: SUBK, AsmModule.Mul: MULK}.get(type(use))
+    if fused is None or match_seq(insts, pc + 1, slots) is not None:
+        return None
+    if use.rs2 == load.rd:
+        other = use.rs1
+    elif use.rs1 == load.rd and fused != SUBK:
+        other = use.rs2
+    else:
+        return None
+    return (fused, slots[use.rd], (slots[other], slots[load.rd]), load.imm)
+
+
+def link_operands(inst, slots):
+    """
+    Links an instruction that is not a branch nor a jump.
+    """
+    last = inst.imm if isinstance(inst, AsmModule.BinOpImm) else slots[inst.rs2]
+    return (Linker.OPCODES[inst.get_opcode()], slots[inst.rd], slots[inst.rs1], last)
+
+
+def match_opcodes(opcodes):
+    """
+    Creates a matcher that recognizes any sequence of instructions with the
+    given opcodes, which must have templates in Jit.py.
+
+    Example:
+        >>> insts = [AsmModule.Addi("t", "x0", 7), AsmModule.Mul("r", "t", "a")]
+        >>> match_opcodes(("addi", "mul"))(insts, 0, {"x0": 0, "a": 1, "t": 2, "r": 3})
+        (23, ('addi', 'mul'), ((1, 2, 0, 7), (2, 3, 2, 1)), None)
+    """
+    def match(insts, pc, slots):
+        window = insts[pc:pc + len(opcodes)]
+        if tuple(inst.get_opcode() for inst in window) != opcodes:
+            return None
+        return (SEQUENCE, opcodes, tuple(link_operands(inst, slots) for inst in window), None)
+    return match
+
+
+PATTERNS = [("seq", 4, match_seq), ("const", 2, match_constant)]
+
+
+class FusedProgram(Threaded.ThreadedProgram):
+    """
+    A threaded program with superinstructions. The attribute 'sites' maps the
+    position of each superinstruction to the length of the idiom that it
+    replaces, and 'fused' counts the superinstructions of each kind.
+
+    Example:
+        >>> insts = [AsmModule.Addi("t", "x0", 2), AsmModule.Add("s", "a", "t"),
+        ...          AsmModule.Sub("d", "s", "b"), AsmModule.Slti("c1", "d", 1),
+        ...          AsmModule.Slti("c2", "d", 0), AsmModule.Xor("e", "c1", "c2")]
+        >>> fp = FusedProgram(AsmModule.Program({"a": 1, "b": 3}, insts))
+        >>> fp.sites, sorted(fp.fused.items())
+        ({0: 2, 2: 4}, [('const', 1), ('seq', 1)])
+        >>> fp.eval()
+        >>> fp.print_env()
+        a: 1
+        b: 3
+        c1: 1
+        c2: 0
+        d: 0
+        e: 1
+        s: 3
+        t: 2
+        x0: 0
+
+        >>> insts = [AsmModule.Addi("k", "x0", 3), AsmModule.Sub("r", "a", "k")]
+        >>> fp = FusedProgram(AsmModule.Program({"a": 10}, insts))
+        >>> fp.eval()
+        >>> fp.get_val("r"), fp.get_val("k")
+        (7, 3)
+    """
+
+    def __init__(self, prog, patterns=PATTERNS, specialize=()):
+        super().__init__(prog)
+        writes_x0 = any(op < Linker.BEQ and a == 0 for op, a, _, _ in self.code)
+        self.sites = {}
+        self.fused = Counter()
+        insts = prog.get_insts()
+        targets = set(prog.get_labels().values())
+        pc = 0
+        while pc < len(insts):
+            for name, length, match in patterns:
+                if targets.intersection(range(pc + 1, pc + length)):
+                    continue
+                fused = match(insts, pc, self.slots)
+                if fused is not None:
+                    self.install(pc, length, fused)
+                    self.fused[name] += 1
+                    pc += length - 1
+                    break
+            pc += 1
+        skipped = self.skipped()
+        if not writes_x0:
+            self.specialize(specialize, skipped)
+        self.line = [
+            closure for pc, closure in enumerate(self.closures) if pc not in skipped
+        ]
+
+    def specialize(self, opcodes, skipped):
+        """
+        Replaces the closures of the instructions with the given opcodes with
+        specialized closures, where possible. Specializations assume that x0
+        holds zero; thus, they only apply to programs that never write x0,
+        which is checked on the linked code before fusion, as
+        superinstructions hide the registers that they write.
+        """
+        for pc, (op, a, b, c) in enumerate(self.code):
+            name = NAMES.get(op)
+            if pc in skipped or pc in self.sites or name not in opcodes:
+                continue
+            closure = SPECIALIZERS[name](self.regs, a, b, c, pc + 1)
+            if closure is not None:
+                self.closures[pc] = closure
+                self.fused[name] += 1
+
+    def install(self, pc, length, fused):
+        """
+        Replaces the instruction at position pc with a superinstruction that
+        does the work of the next 'length' instructions.
+        """
+        op, a, b, c = fused
+        self.code[pc] = fused
+        self.closures[pc] = THREADERS[op](self.regs, a, b, c, pc + length)
+        self.sites[pc] = length
+
+    def skipped(self):
+        """
+        Returns the positions of the instructions that never run, because
+        they are part of a superinstruction.
+        """
+        skipped = set()
+        for pc, length in self.sites.items():
+            skipped.update(range(pc + 1, pc + length))
+        return skipped
+
+    def dispatches(self, hits):
+        """
+        Counts the instructions that the fused program dispatches, given how
+        many times each position of the original program has run.
+        """
+        skipped = self.skipped()
+        return sum(count for pc, count in hits.items() if pc not in skipped)
+
+
+def fuse(prog):
+    """
+    Links the program, fusing the idioms of GenVisitor.
+    """
+    return FusedProgram(prog)
+
+
+class ProfilingProgram(AsmModule.Program):
+    """
+    A program that records its execution into a profile. Only instructions
+    that run one after the other, without a jump between them, and that can
+    be fused (see Jit.TEMPLATES), form pairs and triples.
+    """
+
+    def __init__(self, prog, profile):
+        super().__init__(dict(prog.get_env()), prog.get_insts())
+        self.get_labels().update(prog.get_labels())
+        self.profile = profile
+        self.window = []
+
+    def get_inst(self):
+        inst = super().get_inst()
+        if inst:
+            pc = self.pc - 1
+            opcode = inst.get_opcode()
+            profile = self.profile
+            profile.hits[pc] += 1
+            profile.opcodes[opcode] += 1
+            if opcode not in Jit.TEMPLATES:
+                self.window = []
+            else:
+                if self.window and self.window[-1][0] != pc - 1:
+                    self.window = []
+                self.window = self.window[-2:] + [(pc, opcode)]
+                opcodes = tuple(op for _, op in self.window)
+                if len(opcodes) >= 2:
+                    profile.pairs[opcodes[-2:]] += 1
+                if len(opcodes) == 3:
+                    profile.triples[opcodes] += 1
+        return inst
+
+
+class Profile:
+    """
+    The execution profile of one or more runs of programs: how many times
+    each opcode ran, how many times each pair and each triple of opcodes ran
+    in sequence, and how many times each position ran.
+
+    Example:
+        >>> p = AsmModule.Program({"n": 3}, [AsmModule.Addi("s", "x0", 0)])
+        >>> p.add_label("loop")
+        >>> p.add_inst(AsmModule.Add("s", "s", "n"))
+        >>> p.add_inst(AsmModule.Addi("n", "n", -1))
+        >>> p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+        >>> profile = Profile()
+        >>> profile.record(p)
+        >>> profile.pairs.most_common(1), profile.triples.most_common(1)
+        ([(('add', 'addi'), 3)], [(('addi', 'add', 'addi'), 1)])
+        >>> sorted(profile.hits.items())
+        [(0, 1), (1, 3), (2, 3), (3, 3)]
+    """
+
+    def __init__(self):
+        self.opcodes = Counter()
+        self.pairs = Counter()
+        self.triples = Counter()
+        self.hits = Counter()
+
+    def record(self, prog):
+        """
+        Runs a copy of the program in the interpreter, adding its execution
+        to the profile. The program itself does not change.
+        """
+        ProfilingProgram(prog, self).eval()
+
+    def choose(self, max_sequences=8, min_share=0.02):
+        """
+        Returns the sequences of opcodes that are worth fusing, and the
+        opcodes that are worth specializing. A sequence, or an opcode, is
+        worth it if it accounts for at least 'min_share' of the executed
+        instructions. Sequences are ranked by the dispatches that they would
+        save, i.e., their count times their length minus one.
+        """
+        total = sum(self.opcodes.values()) or 1
+        candidates = [
+            (count * (len(opcodes) - 1), opcodes)
+            for counter in (self.triples, self.pairs)
+            for opcodes, count in counter.items()
+            if count / total >= min_share
+        ]
+        candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+        sequences = [opcodes for _, opcodes in candidates[:max_sequences]]
+        specialize = sorted(
+            opcode for opcode in SPECIALIZERS
+            if self.opcodes[opcode] / total >= min_share
+        )
+        return sequences, specialize
+
+    def save(self, path):
+        """
+        Writes the profile into a JSON file. Sequences of opcodes are written
+        as strings, with the opcodes separated by spaces.
+        """
+        data = {
+            "opcodes": dict(self.opcodes),
+            "pairs": {" ".join(ops): count for ops, count in self.pairs.items()},
+            "triples": {" ".join(ops): count for ops, count in self.triples.items()},
+            "hits": {str(pc): count for pc, count in self.hits.items()},
+        }
+        with open(path, "w") as file:
+            json.dump(data, file, indent=1, sort_keys=True)
+
+    @staticmethod
+    def load(path):
+        with open(path) as file:
+            data = json.load(file)
+        profile = Profile()
+        profile.opcodes.update(data["opcodes"])
+        profile.pairs.update({tuple(k.split()): v for k, v in data["pairs"].items()})
+        profile.triples.update({tuple(k.split()): v for k, v in data["triples"].items()})
+        profile.hits.update({int(k): v for k, v in data["hits"].items()})
+        return profile
+
+
+def fuse_with_profile(prog, profile, max_sequences=8, min_share=0.02):
+    """
+    Links the program, fusing the idioms of GenVisitor first, then the
+    sequences that the profile chooses, and specializing the opcodes that
+    the profile chooses. Longer sequences are tried first.
+
+    Example:
+        >>> insts = [AsmModule.Mul("a", "x", "x"), AsmModule.Addi("b", "a", 1),
+        ...          AsmModule.Mul("c", "b", "b"), AsmModule.Addi("d", "c", 1)]
+        >>> p = AsmModule.Program({"x": 2}, insts)
+        >>> profile = Profile()
+        >>> profile.record(p)
+        >>> fp = fuse_with_profile(p, profile)
+        >>> fp.sites, dict(fp.fused)
+        ({0: 3}, {'mul+addi+mul': 1})
+        >>> fp.eval()
+        >>> fp.get_val("d")
+        26
+    """
+    sequences, specialize = profile.choose(max_sequences, min_share)
+    sequences.sort(key=len, reverse=True)
+    patterns = PATTERNS + [
+        ("+".join(opcodes), len(opcodes), match_opcodes(opcodes)) for opcodes in sequences
+    ]
+    return FusedProgram(prog, patterns, specialize)
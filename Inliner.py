@@ -0,0 +1,311 @@
+"""
+This file implements beta-reduction of anonymous functions that are applied
+directly, such as '(fn x: int => x + 1) 41'. Code generation does not support
+functions, so every application that the inliner removes is also an
+expression that GenVisitor can compile.
+
+An application '(fn x => body) arg' is rewritten as follows:
+    * If arg is a variable or a constant, it replaces x in body.
+    * If arg is a function, and copying it into every use of x fits in the
+      size budget, it replaces x in body.
+    * Otherwise, it becomes 'let x' <- arg in body[x:=x'] end', where x' is
+      a fresh name.
+Let expressions that bind functions are treated like applications, i.e.,
+'let f <- fn x => e in body end' is '(fn f => body) (fn x => e)'.
+
+Substitution is capture-avoiding: binders that would capture a free variable
+of the substituted expression are renamed. Fresh names contain an
+underscore, which the lexer does not accept in identifiers; thus, they never
+clash with names in the source program.
+
+This file uses doctests. To test it, run "python3 -m doctest Inliner.py".
+"""
+
+from collections import Counter
+
+from Expression import *
+from Visitor import *
+
+
+class FreeVarsVisitor(Visitor):
+    """
+    This visitor counts the free occurrences of each variable in an
+    expression.
+
+    Example:
+        >>> e = Let('y', Var('x'), Fn('z', type(1), Add(Var('y'), Var('x'))))
+        >>> sorted(e.accept(FreeVarsVisitor(), None).items())
+        [('x', 2)]
+    """
+
+    def visit_var(self, exp, arg):
+        return Counter([exp.identifier])
+
+    def visit_bln(self, exp, arg):
+        return Counter()
+
+    def visit_num(self, exp, arg):
+        return Counter()
+
+    def visit_binary(self, exp, arg):
+        return exp.left.accept(self, arg) + exp.right.accept(self, arg)
+
+    def visit_eql(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_add(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_sub(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_mul(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_div(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_mod(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_leq(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_lth(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_and(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_or(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_neg(self, exp, arg):
+        return exp.exp.accept(self, arg)
+
+    def visit_not(self, exp, arg):
+        return exp.exp.accept(self, arg)
+
+    def visit_let(self, exp, arg):
+        body_vars = exp.exp_body.accept(self, arg)
+        del body_vars[exp.identifier]
+        return exp.exp_def.accept(self, arg) + body_vars
+
+    def visit_ifThenElse(self, exp, arg):
+        cond_vars = exp.cond.accept(self, arg)
+        return cond_vars + exp.e0.accept(self, arg) + exp.e1.accept(self, arg)
+
+    def visit_fn(self, exp, arg):
+        body_vars = exp.body.accept(self, arg)
+        del body_vars[exp.formal]
+        return body_vars
+
+    def visit_app(self, exp, arg):
+        return exp.function.accept(self, arg) + exp.actual.accept(self, arg)
+
+
+class SizeVisitor(Visitor):
+    """
+    This visitor counts the nodes of an expression.
+
+    Example:
+        >>> Fn('x', type(1), Add(Var('x'), Num(1))).accept(SizeVisitor(), None)
+        4
+    """
+
+    def visit_var(self, exp, arg):
+        return 1
+
+    def visit_bln(self, exp, arg):
+        return 1
+
+    def visit_num(self, exp, arg):
+        return 1
+
+    def visit_binary(self, exp, arg):
+        return 1 + exp.left.accept(self, arg) + exp.right.accept(self, arg)
+
+    def visit_eql(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_add(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_sub(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_mul(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_div(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_mod(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_leq(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_lth(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_and(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_or(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_neg(self, exp, arg):
+        return 1 + exp.exp.accept(self, arg)
+
+    def visit_not(self, exp, arg):
+        return 1 + exp.exp.accept(self, arg)
+
+    def visit_let(self, exp, arg):
+        return 1 + exp.exp_def.accept(self, arg) + exp.exp_body.accept(self, arg)
+
+    def visit_ifThenElse(self, exp, arg):
+        cond_size = exp.cond.accept(self, arg)
+        return 1 + cond_size + exp.e0.accept(self, arg) + exp.e1.accept(self, arg)
+
+    def visit_fn(self, exp, arg):
+        return 1 + exp.body.accept(self, arg)
+
+    def visit_app(self, exp, arg):
+        return 1 + exp.function.accept(self, arg) + exp.actual.accept(self, arg)
+
+
+class FreshNames:
+    """
+    A generator of names that do not occur in source programs.
+    """
+
+    def __init__(self):
+        self.counter = 0
+
+    def new_name(self, name):
+        self.counter += 1
+        return f"{name.split('_')[0]}_{self.counter}"
+
+
+class SubstitutionVisitor(TransformVisitor):
+    """
+    This visitor replaces the free occurrences of a variable with an
+    expression, renaming the binders that would capture the free variables of
+    that expression.
+
+    Example:
+        >>> e = Fn('y', type(1), Add(Var('x'), Var('y')))
+        >>> s = e.accept(SubstitutionVisitor('x', Var('y'), FreshNames()), None)
+        >>> s.formal, s.body.left.identifier, s.body.right.identifier
+        ('y_1', 'y', 'y_1')
+    """
+
+    def __init__(self, name, value, names):
+        self.name = name
+        self.value = value
+        self.value_vars = value.accept(FreeVarsVisitor(), None)
+        self.names = names
+
+    def visit_var(self, exp, arg):
+        return self.value if exp.identifier == self.name else exp
+
+    def rename(self, binder, body):
+        """
+        Returns the binder and the body that the substitution must traverse,
+        renaming the binder if it would capture a free variable of the value.
+        """
+        if binder in self.value_vars and self.name in body.accept(FreeVarsVisitor(), None):
+            new_binder = self.names.new_name(binder)
+            renaming = SubstitutionVisitor(binder, Var(new_binder), self.names)
+            return new_binder, body.accept(renaming, None)
+        return binder, body
+
+    def visit_let(self, exp, arg):
+        exp_def = exp.exp_def.accept(self, arg)
+        if exp.identifier == self.name:
+            return Let(exp.identifier, exp_def, exp.exp_body)
+        identifier, body = self.rename(exp.identifier, exp.exp_body)
+        return Let(identifier, exp_def, body.accept(self, arg))
+
+    def visit_fn(self, exp, arg):
+        if exp.formal == self.name:
+            return exp
+        formal, body = self.rename(exp.formal, exp.body)
+        return Fn(formal, exp.tp_var, body.accept(self, arg))
+
+
+class InlineVisitor(TransformVisitor):
+    """
+    This visitor removes applications of anonymous functions. The attribute
+    'removed' counts the applications that it has removed, and 'budget' is
+    the number of nodes that the inliner may still add to the program by
+    copying functions into multiple uses.
+
+    Example:
+        >>> e = App(Fn('x', type(1), Add(Var('x'), Num(1))), Num(41))
+        >>> iv = InlineVisitor()
+        >>> r = e.accept(iv, None)
+        >>> type(r).__name__, r.left.num, r.right.num, iv.removed
+        ('Add', 41, 1, 1)
+
+        >>> e = App(Fn('x', type(1), Mul(Var('x'), Var('x'))), Sub(Var('a'), Num(1)))
+        >>> r = e.accept(InlineVisitor(), None)
+        >>> type(r).__name__, r.identifier, r.exp_body.left.identifier
+        ('Let', 'x_1', 'x_1')
+    """
+
+    def __init__(self, budget=64):
+        self.budget = budget
+        self.removed = 0
+        self.names = FreshNames()
+
+    def substitute(self, body, name, value):
+        return body.accept(SubstitutionVisitor(name, value, self.names), None)
+
+    def bind(self, name, value, body, arg):
+        """
+        Produces an inlined expression equivalent to
+        'let name <- value in body end', where value is already inlined.
+        """
+        duplicable = isinstance(value, (Var, Num, Bln))
+        if isinstance(value, Fn):
+            uses = body.accept(FreeVarsVisitor(), None)[name]
+            growth = value.accept(SizeVisitor(), None) * (uses - 1)
+            if growth <= self.budget:
+                self.budget -= max(growth, 0)
+                duplicable = True
+        if duplicable:
+            return self.substitute(body, name, value).accept(self, arg)
+        fresh = self.names.new_name(name)
+        body = self.substitute(body, name, Var(fresh)).accept(self, arg)
+        return Let(fresh, value, body)
+
+    def visit_let(self, exp, arg):
+        exp_def = exp.exp_def.accept(self, arg)
+        if isinstance(exp_def, Fn):
+            return self.bind(exp.identifier, exp_def, exp.exp_body, arg)
+        return Let(exp.identifier, exp_def, exp.exp_body.accept(self, arg))
+
+    def visit_app(self, exp, arg):
+        function = exp.function.accept(self, arg)
+        actual = exp.actual.accept(self, arg)
+        if isinstance(function, Fn):
+            self.removed += 1
+            return self.bind(function.formal, actual, function.body, arg)
+        return App(function, actual)
+
+
+def inline(exp, budget=64):
+    """
+    Returns the expression without the applications of anonymous functions
+    that fit in the size budget.
+
+    Example:
+        >>> e = Let('f', Fn('x', type(1), Add(Var('x'), Num(1))),
+        ...         Add(App(Var('f'), Num(1)), App(Var('f'), Num(2))))
+        >>> r = inline(e)
+        >>> type(r).__name__, r.left.left.num, r.right.left.num
+        ('Add', 1, 2)
+    """
+    return exp.accept(InlineVisitor(budget), None)
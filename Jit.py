@@ -0,0 +1,239 @@
+"""
+This file implements a compiler of straight-line Asm programs into Python
+functions. Every register becomes a local variable of the function, and
+every instruction becomes one assignment; e.g., "c = div a b" becomes
+"r2 = r0 // r1". The function reads the registers that the program uses
+before defining them from the environment of the program, and writes the
+registers that the program defines back into it, after the last
+instruction.
+
+Compiling a program costs much more than interpreting it once; hence, the
+compiled functions are cached by a hash of the text of the instructions, so
+that programs with the same instructions share the same function, no matter
+the environment in which they run. The cache keeps the MAX_FUNCTIONS most
+recently used functions. Hashing the text of a long program costs about as
+much as interpreting it; thus, the hash is remembered for each list of
+instructions, like in Tiered.py.
+
+If the function fails, e.g., because the environment does not define one of
+the registers that it reads, or because of a division by zero, it has not
+changed the environment yet. In this case, the program runs again, in the
+interpreter (Program.eval), which fails in the same way that it would have
+failed without the compiler, e.g., with a "Def error".
+
+This file uses doctests. To test it, run "python3 -m doctest Jit.py".
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import Asm as AsmModule
+
+
+TEMPLATES = {
+    "add": "{rd} = {rs1} + {rs2}",
+    "addi": "{rd} = {rs1} + {imm}",
+    "mul": "{rd} = {rs1} * {rs2}",
+    "sub": "{rd} = {rs1} - {rs2}",
+    "xor": "{rd} = {rs1} ^ {rs2}",
+    "xori": "{rd} = {rs1} ^ {imm}",
+    "div": "{rd} = {rs1} // {rs2}",
+    "slt": "{rd} = 1 if {rs1} < {rs2} else 0",
+    "slti": "{rd} = 1 if {rs1} < {imm} else 0",
+    "sll": "{rd} = {rs1} << {rs2}",
+    "slli": "{rd} = {rs1} << {imm}",
+    "srai": "{rd} = {rs1} >> {imm}",
+    "and": "{rd} = {rs1} & {rs2}",
+    "andi": "{rd} = {rs1} & {imm}",
+}
+
+MAX_FUNCTIONS = 256
+MAX_KEYS = 4096
+
+cache = OrderedDict()
+keys = {}
+lock = threading.Lock()
+
+
+def is_straight(prog):
+    """
+    Tells if the program can be compiled, i.e., if all its instructions
+    have templates, so that it has no branches nor jumps:
+
+    >>> is_straight(AsmModule.Program({}, [AsmModule.Addi("a", "x0", 1)]))
+    True
+    >>> is_straight(AsmModule.Program({}, [AsmModule.Jal("x0", "L1")]))
+    False
+    """
+    return all(inst.get_opcode() in TEMPLATES for inst in prog.get_insts())
+
+
+def cache_key(insts):
+    """
+    Computes the hash of the text of a list of instructions:
+
+    >>> k0 = cache_key([AsmModule.Addi("a", "x0", 1)])
+    >>> k1 = cache_key([AsmModule.Addi("a", "x0", 1)])
+    >>> k2 = cache_key([AsmModule.Addi("a", "x0", 2)])
+    >>> k0 == k1, k0 == k2
+    (True, False)
+    """
+    text = "\n".join(str(inst) for inst in insts)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def program_key(prog):
+    """
+    Returns the cache key of the instructions of the program, or None if the
+    program is not straight-line. The key is remembered for each list of
+    instructions, assuming that lists are not changed once their programs
+    start running, except by adding new instructions. The lists in the table
+    stay alive, so their ids are not reused.
+
+    Example:
+        >>> insts = [AsmModule.Addi("a", "x0", 1)]
+        >>> program_key(AsmModule.Program({}, insts)) == cache_key(insts)
+        True
+        >>> insts.append(AsmModule.Jal("x0", "L1"))
+        >>> program_key(AsmModule.Program({}, insts)) is None
+        True
+    """
+    insts = prog.get_insts()
+    entry = keys.get(id(insts))
+    if entry is None or entry[1] != len(insts):
+        if len(keys) >= MAX_KEYS:
+            keys.clear()
+        entry = (insts, len(insts), cache_key(insts) if is_straight(prog) else None)
+        keys[id(insts)] = entry
+    return entry[2]
+
+
+def source(insts):
+    """
+    Produces the text of the Python function that implements the list of
+    instructions, plus the names of the registers that it reads from the
+    environment.
+
+    Example:
+        >>> insts = [AsmModule.Add("c", "a", "b"), AsmModule.Slt("a", "a", "c")]
+        >>> text, inputs = source(insts)
+        >>> print(text)
+        def jitted(env):
+            r0 = env['a']
+            r1 = env['b']
+            r2 = r0 + r1
+            r0 = 1 if r0 < r2 else 0
+            env['c'] = r2
+            env['a'] = r0
+        >>> inputs
+        ['a', 'b']
+    """
+    local_names = {}
+    inputs = []
+    outputs = []
+    body = []
+
+    def local(name):
+        if name not in local_names:
+            local_names[name] = f"r{len(local_names)}"
+        return local_names[name]
+
+    for inst in insts:
+        operands = {}
+        for field in ("rs1", "rs2"):
+            name = getattr(inst, field, None)
+            if name is not None:
+                if name not in local_names:
+                    inputs.append(name)
+                operands[field] = local(name)
+        operands["rd"] = local(inst.rd)
+        if inst.rd not in outputs:
+            outputs.append(inst.rd)
+        operands["imm"] = getattr(inst, "imm", None)
+        body.append(TEMPLATES[inst.get_opcode()].format(**operands))
+    loads = [f"{local_names[name]} = env[{name!r}]" for name in inputs]
+    stores = [f"env[{name!r}] = {local_names[name]}" for name in outputs]
+    lines = loads + body + stores
+    text = "def jitted(env):\n" + "\n".join("    " + line for line in lines or ["pass"])
+    return text, inputs
+
+
+class JitFunction:
+    """
+    A straight-line program compiled into a Python function. Calling it on a
+    Program with the same instructions evaluates that program.
+
+    Example:
+        >>> insts = [AsmModule.Mul("t", "a", "a"), AsmModule.Div("q", "t", "b")]
+        >>> f = JitFunction(insts)
+        >>> p = AsmModule.Program({"a": 7, "b": 2}, insts)
+        >>> f(p)
+        >>> p.get_val("q")
+        24
+    """
+
+    def __init__(self, insts):
+        self.insts = list(insts)
+        self.key = cache_key(self.insts)
+        self.source, self.inputs = source(self.insts)
+        namespace = {}
+        exec(compile(self.source, f"<jit {self.key[:12]}>", "exec"), namespace)
+        self.function = namespace["jitted"]
+
+    def __call__(self, prog):
+        try:
+            self.function(prog.get_env())
+        except Exception:
+            prog.eval()
+            return
+        prog.set_pc(len(self.insts))
+
+
+def compile_program(prog):
+    """
+    Returns the function that implements the program, compiling it only if
+    the cache does not have a function for the same instructions. Returns
+    None if the program is not straight-line.
+
+    Example:
+        >>> p0 = AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", 1)])
+        >>> p1 = AsmModule.Program({"a": 5}, [AsmModule.Addi("b", "a", 1)])
+        >>> compile_program(p0) is compile_program(p1)
+        True
+    """
+    key = program_key(prog)
+    if key is None:
+        return None
+    with lock:
+        function = cache.get(key)
+        if function is not None:
+            cache.move_to_end(key)
+            return function
+    function = JitFunction(prog.get_insts())
+    with lock:
+        cache[key] = function
+        if len(cache) > MAX_FUNCTIONS:
+            cache.popitem(last=False)
+    return function
+
+
+def run(prog):
+    """
+    Evaluates the program with its compiled function, if it is straight-line
+    and has not started running yet; otherwise, uses the interpreter.
+
+    Example:
+        >>> AsmModule.max(-3, -2, run)
+        -2
+        >>> p = AsmModule.Program({}, [AsmModule.Add("a", "b", "x0")])
+        >>> run(p)
+        Traceback (most recent call last):
+        ...
+        SystemExit: Def error
+    """
+    function = compile_program(prog) if prog.pc == 0 else None
+    if function is None:
+        prog.eval()
+    else:
+        function(prog)
@@ -0,0 +1,300 @@
+"""
+This file implements the linker of Asm programs. Linking resolves, once, every
+register name of a program into an index in a list of registers, and every
+label into a position in the list of instructions. The linked program is a
+list of tuples (opcode, a, b, c), where the opcode is a small integer, and the
+meaning of the other three fields depends on it:
+
+    * binary instructions: (opcode, rd, rs1, rs2), all of them indices.
+    * instructions with an immediate: (opcode, rd, rs1, imm).
+    * branches: (opcode, rs1, rs2, target), where target is a position.
+    * jumps: (opcode, rd, target, 0). "jal x0, lab" becomes a JMP.
+
+The interpreter of linked programs, the function execute, reads operands
+with plain list indexing. Registers that have not been defined hold None.
+Arithmetic on None raises a TypeError, which the interpreter turns into the
+same "Def error" exit that Program.get_val produces; thus, reads need no
+existence checks. Equality branches are the only instructions that can read
+None without failing, so they check their operands explicitly. Code.py
+runs linked code with this same function; Verifier.py has a variant
+without these checks, for verified programs.
+
+This file uses doctests. To test it, run "python3 -m doctest Linker.py".
+"""
+
+import sys
+
+import Asm as AsmModule
+
+
+ADD, ADDI, MUL, SUB, XOR, XORI, DIV, SLT, SLTI = range(9)
+SLL, SLLI, SRAI, AND, ANDI = range(9, 14)
+BEQ, BNE, BLT, JAL, JMP = range(14, 19)
+
+OPCODES = {
+    "add": ADD, "addi": ADDI, "mul": MUL, "sub": SUB, "xor": XOR,
+    "xori": XORI, "div": DIV, "slt": SLT, "slti": SLTI, "sll": SLL,
+    "slli": SLLI, "srai": SRAI, "and": AND, "andi": ANDI, "beq": BEQ,
+    "bne": BNE, "blt": BLT, "jal": JAL,
+}
+
+
+def execute(code, regs, pc=0, budget=-1):
+    """
+    Runs the linked code over the list of registers, from position pc, until
+    the end of the code, or until 'budget' instructions have run, if the
+    budget is not negative. Returns the position of the next instruction.
+
+    Example:
+        >>> execute(((ADDI, 1, 0, 3), (ADD, 1, 1, 1)), [0, None])
+        2
+        >>> regs = [0, None]
+        >>> execute(((ADDI, 1, 0, 3), (ADD, 1, 1, 1)), regs, 0, 1), regs
+        (1, [0, 3])
+    """
+    size = len(code)
+    try:
+        while pc < size and budget:
+            budget -= 1
+            op, a, b, c = code[pc]
+            pc += 1
+            if op == ADD:
+                regs[a] = regs[b] + regs[c]
+            elif op == ADDI:
+                regs[a] = regs[b] + c
+            elif op == SUB:
+                regs[a] = regs[b] - regs[c]
+            elif op == MUL:
+                regs[a] = regs[b] * regs[c]
+            elif op == SLTI:
+                regs[a] = 1 if regs[b] < c else 0
+            elif op == XOR:
+                regs[a] = regs[b] ^ regs[c]
+            elif op == SLT:
+                regs[a] = 1 if regs[b] < regs[c] else 0
+            elif op == DIV:
+                regs[a] = regs[b] // regs[c]
+            elif op == XORI:
+                regs[a] = regs[b] ^ c
+            elif op == BEQ:
+                if regs[a] is None or regs[b] is None:
+                    sys.exit("Def error")
+                if regs[a] == regs[b]:
+                    pc = c
+            elif op == BNE:
+                if regs[a] is None or regs[b] is None:
+                    sys.exit("Def error")
+                if regs[a] != regs[b]:
+                    pc = c
+            elif op == BLT:
+                if regs[a] < regs[b]:
+                    pc = c
+            elif op == JMP:
+                pc = b
+            elif op == JAL:
+                regs[a] = pc
+                pc = b
+            elif op == SLLI:
+                regs[a] = regs[b] << c
+            elif op == SRAI:
+                regs[a] = regs[b] >> c
+            elif op == ANDI:
+                regs[a] = regs[b] & c
+            elif op == SLL:
+                regs[a] = regs[b] << regs[c]
+            elif op == AND:
+                regs[a] = regs[b] & regs[c]
+    except TypeError:
+        sys.exit("Def error")
+    return pc
+
+
+class LinkedProgram:
+    """
+    The executable form of a Program. It has a table that maps register names
+    to indices (slots), the linked instructions (code), and the list of
+    registers (regs), which starts with the values in the environment of the
+    program. Register x0 is always in slot 0.
+
+    Example:
+        >>> insts = [AsmModule.Add("x0", "b0", "b1"), AsmModule.Sub("x1", "x0", "b2")]
+        >>> lp = LinkedProgram(AsmModule.Program({"b0":2, "b1":3, "b2": 4}, insts))
+        >>> lp.eval()
+        >>> lp.print_env()
+        b0: 2
+        b1: 3
+        b2: 4
+        x0: 5
+        x1: 1
+    """
+
+    def __init__(self, prog):
+        self.slots = {"x0": 0}
+        env = prog.get_env()
+        for name in env:
+            self.slot(name)
+        self.code = [self.link_inst(inst, prog) for inst in prog.get_insts()]
+        self.regs = [None] * len(self.slots)
+        for name, value in env.items():
+            self.regs[self.slots[name]] = value
+        self.regs[0] = 0
+
+    def slot(self, name):
+        if name not in self.slots:
+            self.slots[name] = len(self.slots)
+        return self.slots[name]
+
+    def link_inst(self, inst, prog):
+        if inst.get_opcode() not in OPCODES:
+            sys.exit(f"Link error: cannot link '{inst.get_opcode()}'")
+        op = OPCODES[inst.get_opcode()]
+        if op == JAL:
+            target = prog.get_label(inst.lab)
+            if inst.rd == "x0":
+                return (JMP, 0, target, 0)
+            return (JAL, self.slot(inst.rd), target, 0)
+        if op in (BEQ, BNE, BLT):
+            target = prog.get_label(inst.lab)
+            return (op, self.slot(inst.rs1), self.slot(inst.rs2), target)
+        if isinstance(inst, AsmModule.BinOpImm):
+            return (op, self.slot(inst.rd), self.slot(inst.rs1), inst.imm)
+        return (op, self.slot(inst.rd), self.slot(inst.rs1), self.slot(inst.rs2))
+
+    def set_val(self, name, value):
+        self.regs[self.slot(name)] = value
+
+    def get_val(self, name):
+        """
+        Reads a register by name, failing like Program.get_val if it has no
+        value:
+
+        >>> lp = LinkedProgram(AsmModule.Program({}, []))
+        >>> lp.get_val("x0")
+        0
+        """
+        value = self.regs[self.slots[name]] if name in self.slots else None
+        if value is None:
+            sys.exit("Def error")
+        return value
+
+    def get_env(self):
+        """
+        Returns a dictionary with the registers that have values, like the
+        environment of a Program after its evaluation.
+        """
+        return {
+            name: self.regs[slot]
+            for name, slot in self.slots.items()
+            if self.regs[slot] is not None
+        }
+
+    def print_env(self):
+        for name, val in sorted(self.get_env().items()):
+            print(f"{name}: {val}")
+
+    def load(self, prog):
+        """
+        Replaces the values of the registers with the values in the
+        environment of a program that has the same instructions. The list of
+        registers is updated in place.
+        """
+        regs = self.regs
+        regs[:] = [None] * len(regs)
+        slots = self.slots
+        for name, value in prog.get_env().items():
+            if name in slots:
+                regs[slots[name]] = value
+
+    def store(self, prog):
+        """
+        Copies the registers that have values into the environment of the
+        program, and moves its program counter to the end, as if the
+        program had been evaluated.
+        """
+        prog.get_env().update(self.get_env())
+        prog.set_pc(len(prog.get_insts()))
+
+    def __call__(self, prog):
+        """
+        Evaluates a program with the same instructions as the linked program,
+        over the environment of that program. Registers that were defined
+        before a "Def error" are copied too, like Program.eval would do.
+
+        Example:
+            >>> p = AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", 2)])
+            >>> lp = LinkedProgram(p)
+            >>> q = AsmModule.Program({"a": 5}, p.get_insts())
+            >>> lp(q)
+            >>> q.get_val("b")
+            7
+        """
+        self.load(prog)
+        try:
+            self.eval()
+        finally:
+            self.store(prog)
+
+    def eval(self):
+        """
+        Runs the linked program from its first instruction until its end.
+
+        Example:
+            >>> p = AsmModule.Program({"n": 5}, [AsmModule.Addi("s", "x0", 0)])
+            >>> p.add_label("loop")
+            >>> p.add_inst(AsmModule.Add("s", "s", "n"))
+            >>> p.add_inst(AsmModule.Addi("n", "n", -1))
+            >>> p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+            >>> lp = LinkedProgram(p)
+            >>> lp.eval()
+            >>> lp.get_val("s")
+            15
+        """
+        execute(self.code, self.regs)
+
+
+def linkable(prog):
+    """
+    Tells if every instruction of the program has a linked form. Linked code
+    has no data memory; thus, loads and stores do not:
+
+    >>> linkable(AsmModule.Program({}, [AsmModule.Addi("a", "x0", 1)]))
+    True
+    >>> linkable(AsmModule.Program({}, [AsmModule.Sw("x0", "a", 0)]))
+    False
+    """
+    return all(inst.get_opcode() in OPCODES for inst in prog.get_insts())
+
+
+def link(prog):
+    """
+    Links the program, producing its executable form.
+
+    Example:
+        >>> p = AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", 2)])
+        >>> lp = link(p)
+        >>> lp.code, lp.slots
+        ([(1, 2, 1, 2)], {'x0': 0, 'a': 1, 'b': 2})
+    """
+    return LinkedProgram(prog)
+
+
+def run(prog, linked_class=LinkedProgram):
+    """
+    Evaluates the program in its linked form, and copies the registers back
+    into the environment of the program. Thus, this function can replace
+    Program.eval. Programs that cannot be linked, or that do not start from
+    their first instruction, such as forks of a snapshot, run in
+    Program.eval.
+
+    Example:
+        >>> p = AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", 2)])
+        >>> run(p)
+        >>> p.get_val("b")
+        3
+        >>> AsmModule.max(4, 7, run)
+        7
+    """
+    if prog.pc != 0 or not linkable(prog):
+        prog.eval()
+        return
+    linked_class(prog)(prog)
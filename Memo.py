@@ -0,0 +1,195 @@
+"""
+This file implements a cache of the results of programs. Programs are
+deterministic: the same instructions, run over the same environment, always
+produce the same registers. Thus, a run can be skipped if the cache has seen
+the same program run over the same inputs. The key of a run is the hash of
+the program, i.e., of its instructions and labels, plus the values in its
+environment before the run; the value is the set of output registers that
+the caller asks for, and nothing else.
+
+The cache is a bounded LRU: it evicts its least recently used entries when
+their estimated size, in bytes, exceeds a budget. It counts its hits, misses
+and evictions, and a lock protects it, so threads can share a cache. Runs
+happen outside of the lock; two threads that miss the same key at the same
+time both run the program.
+
+Caching is opt-in: runs that do not go through a ResultCache do not pay for
+it. A hit does not run the program: the environment of the program only
+receives the output registers. Programs with a data memory are never
+cached, as their results depend on the memory, and their stores must
+happen; programs without one cannot run loads or stores. Neither are
+programs whose program counter is not at their first instruction.
+
+This file uses doctests. To test it, run "python3 -m doctest Memo.py".
+"""
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import Asm as AsmModule
+
+
+MAX_KEYS = 4096
+
+
+def program_key(prog):
+    """
+    Computes the hash of the text of the instructions and of the labels of
+    a program:
+
+    >>> p = AsmModule.Program({}, [AsmModule.Jal("x0", "L1")])
+    >>> q = AsmModule.Program({}, [AsmModule.Jal("x0", "L1")])
+    >>> p.add_label("L1")
+    >>> q.add_label("L1")
+    >>> q.add_inst(AsmModule.Addi("a", "x0", 1))
+    >>> program_key(p) == program_key(q)
+    False
+    """
+    text = "\n".join(str(inst) for inst in prog.get_insts())
+    labels = ",".join(f"{label}:{pc}" for label, pc in sorted(prog.get_labels().items()))
+    return hashlib.sha256(f"{text}\n{labels}".encode()).hexdigest()
+
+
+def entry_size(key, outputs):
+    """
+    Estimates the bytes that a cache entry takes.
+    """
+    size = sys.getsizeof(key) + sys.getsizeof(outputs)
+    for name, value in key[1]:
+        size += sys.getsizeof(name) + sys.getsizeof(value)
+    for name, value in outputs.items():
+        size += sys.getsizeof(name) + sys.getsizeof(value)
+    return size
+
+
+class ResultCache:
+    """
+    A thread-safe LRU cache of the outputs of programs, which holds at most
+    'max_bytes' bytes of entries, by estimate.
+
+    Example:
+        >>> cache = ResultCache()
+        >>> [AsmModule.max(a, 7, cache.evaluator(["rd"])) for a in [3, 9, 3]]
+        [7, 9, 7]
+        >>> cache.hits, cache.misses
+        (1, 2)
+    """
+
+    def __init__(self, max_bytes=1 << 20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.keys = {}
+
+    def key(self, prog, outputs):
+        """
+        Returns the key of a run of the program. The hash of the program is
+        remembered for each list of instructions, with a tuple of the
+        instructions, so that replacing an instruction in the list, which
+        keeps the list and its length, also computes a new hash:
+
+        >>> cache = ResultCache()
+        >>> p = AsmModule.Program({"a": 3}, [AsmModule.Addi("r", "a", 1)])
+        >>> cache.run(p, ["r"])
+        {'r': 4}
+        >>> p.get_insts()[0] = AsmModule.Addi("r", "a", 100)
+        >>> p.set_pc(0)
+        >>> cache.run(p, ["r"])
+        {'r': 103}
+        """
+        insts = prog.get_insts()
+        labels = prog.get_labels()
+        snapshot = tuple(insts)
+        with self.lock:
+            entry = self.keys.get(id(insts))
+            if entry is None or entry[1] != snapshot or entry[2] != labels:
+                if len(self.keys) >= MAX_KEYS:
+                    self.keys.clear()
+                entry = (insts, snapshot, dict(labels), program_key(prog))
+                self.keys[id(insts)] = entry
+        env = prog.get_env()
+        inputs = tuple(sorted(env.items()))
+        return (entry[3], inputs, tuple(outputs))
+
+    def lookup(self, key):
+        with self.lock:
+            outputs = self.entries.get(key)
+            if outputs is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return outputs
+
+    def store(self, key, outputs):
+        size = entry_size(key, outputs)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = outputs
+            self.sizes[key] = size
+            self.size += size
+            while self.size > self.max_bytes:
+                old, _ = self.entries.popitem(last=False)
+                self.size -= self.sizes.pop(old)
+                self.evictions += 1
+
+    def run(self, prog, outputs, evaluate=AsmModule.Program.eval):
+        """
+        Evaluates the program with 'evaluate', unless the cache has the
+        outputs of the same program over the same environment. Either way,
+        the outputs go into the environment of the program, and are
+        returned as a dictionary. Programs with a data memory, and programs
+        that do not start from their first instruction, always run.
+
+        Example:
+            >>> cache = ResultCache()
+            >>> insts = [AsmModule.Mul("t", "a", "a"), AsmModule.Addi("r", "t", 1)]
+            >>> cache.run(AsmModule.Program({"a": 3}, insts), ["r"])
+            {'r': 10}
+            >>> p = AsmModule.Program({"a": 3}, insts)
+            >>> cache.run(p, ["r"])
+            {'r': 10}
+            >>> sorted(p.get_env())
+            ['a', 'r', 'x0']
+        """
+        if prog.has_memory() or prog.pc != 0:
+            evaluate(prog)
+            return {name: prog.get_val(name) for name in outputs}
+        key = self.key(prog, outputs)
+        cached = self.lookup(key)
+        if cached is None:
+            evaluate(prog)
+            cached = {name: prog.get_val(name) for name in outputs}
+            self.store(key, cached)
+            return dict(cached)
+        for name, value in cached.items():
+            prog.set_val(name, value)
+        prog.set_pc(len(prog.get_insts()))
+        return dict(cached)
+
+    def evaluator(self, outputs, evaluate=AsmModule.Program.eval):
+        """
+        Returns a function that runs programs through the cache, which can
+        replace Program.eval, e.g., in Asm.max.
+        """
+        def run(prog):
+            self.run(prog, outputs, evaluate)
+        return run
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": len(self.entries),
+                "bytes": self.size,
+            }
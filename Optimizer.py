@@ -0,0 +1,231 @@
+"""
+This file contains optimizations that work on Asm programs. Each optimization
+takes a program in, and produces an equivalent program that should run
+faster. The optimizations assume that the registers that the caller reads
+after running the program are not temporaries that only exist to implement
+an idiom (such as the quotient and the product that GenVisitor.visit_mod
+produces).
+
+This file uses doctests. To test it, run "python3 -m doctest Optimizer.py".
+"""
+
+import Asm as AsmModule
+
+
+def defined_reg(inst):
+    """
+    Returns the register that the instruction writes, or None if it writes no
+    register. "jal x0, lab" does not write x0:
+
+    >>> defined_reg(AsmModule.Add("a", "b", "c"))
+    'a'
+    >>> defined_reg(AsmModule.Jal("x0", "L1")) is None
+    True
+    """
+    if isinstance(inst, AsmModule.Jal) and inst.rd == "x0":
+        return None
+    return getattr(inst, "rd", None)
+
+
+def used_regs(inst):
+    """
+    Returns the registers that the instruction reads:
+
+    >>> used_regs(AsmModule.Add("a", "b", "c"))
+    ['b', 'c']
+    >>> used_regs(AsmModule.Addi("a", "b", 1))
+    ['b']
+    """
+    return [getattr(inst, name) for name in ("rs1", "rs2") if hasattr(inst, name)]
+
+
+def has_backward_jumps(prog):
+    """
+    Tells if the program contains a branch or a jump to an earlier position,
+    i.e., if it might contain loops.
+    """
+    for pc, inst in enumerate(prog.get_insts()):
+        if hasattr(inst, "lab") and prog.get_label(inst.lab) <= pc:
+            return True
+    return False
+
+
+def successors(prog, pc):
+    """
+    Returns the positions of the instructions that may run after the
+    instruction at position pc. The position after the last instruction
+    stands for the end of the program.
+    """
+    inst = prog.get_insts()[pc]
+    if isinstance(inst, AsmModule.Jal):
+        return [prog.get_label(inst.lab)]
+    if hasattr(inst, "lab"):
+        return [pc + 1, prog.get_label(inst.lab)]
+    return [pc + 1]
+
+
+def max_live(prog):
+    """
+    Returns the largest number of registers defined by the program that are
+    live at the same point. A register is live at a point if it might be read
+    later, before being written again. Inputs, which the program never
+    writes, are not counted.
+
+    Example:
+        >>> insts = [AsmModule.Addi("a", "x0", 1), AsmModule.Addi("b", "x0", 2),
+        ...          AsmModule.Add("c", "a", "b"), AsmModule.Add("d", "c", "i")]
+        >>> max_live(AsmModule.Program({"i": 0}, insts))
+        2
+    """
+    insts = prog.get_insts()
+    defined = {defined_reg(inst) for inst in insts} - {None, "x0"}
+    return max(len(live) for live in live_registers(prog, regs=defined))
+
+
+def live_registers(prog, live_at_end=frozenset(), regs=None):
+    """
+    Returns, for each position of the program, plus the end, the set of
+    registers that are live before the instruction at that position. The
+    registers in 'live_at_end' are live at the end of the program. If 'regs'
+    is given, only these registers are considered.
+
+    Example:
+        >>> insts = [AsmModule.Addi("a", "x0", 1), AsmModule.Add("b", "a", "i")]
+        >>> [sorted(live) for live in live_registers(AsmModule.Program({}, insts), {"b"})]
+        [['i'], ['a', 'i'], ['b']]
+    """
+    insts = prog.get_insts()
+    live_in = [frozenset()] * len(insts) + [frozenset(live_at_end)]
+    changed = True
+    while changed:
+        changed = False
+        for pc in reversed(range(len(insts))):
+            live = set()
+            for succ in successors(prog, pc):
+                live |= live_in[succ]
+            live.discard(defined_reg(insts[pc]))
+            live.update(reg for reg in used_regs(insts[pc]) if regs is None or reg in regs)
+            live.discard("x0")
+            if live != live_in[pc]:
+                live_in[pc] = frozenset(live)
+                changed = True
+    return live_in
+
+
+def rebuild(prog, insts):
+    """
+    Creates a new program over a copy of the environment of 'prog', with the
+    given list of instructions, and with the same data memory. The list must
+    have the same length as the instructions of 'prog', and entries that are
+    None are removed. Labels are moved so that they mark the same
+    instructions as before.
+    """
+    labels = {}
+    for label, pc in prog.get_labels().items():
+        labels.setdefault(pc, []).append(label)
+    new_prog = AsmModule.Program(dict(prog.get_env()), [])
+    if prog.has_memory():
+        new_prog.set_memory(prog.get_memory())
+    for pc in range(len(insts) + 1):
+        for label in labels.get(pc, []):
+            new_prog.add_label(label)
+        if pc < len(insts) and insts[pc] is not None:
+            new_prog.add_inst(insts[pc])
+    return new_prog
+
+
+def power_of_two(n):
+    """
+    Returns k if n is 2^k, or None otherwise:
+
+    >>> [power_of_two(n) for n in [1, 2, 8, 12, 0, -4, None]]
+    [0, 1, 3, None, None, None, None]
+    """
+    if isinstance(n, int) and n > 0 and n & (n - 1) == 0:
+        return n.bit_length() - 1
+    return None
+
+
+def strength_reduce(prog):
+    """
+    Replaces multiplications and divisions by constant powers of two with
+    shifts, and the remainder idiom that GenVisitor produces for 'mod' with a
+    mask. A register is a constant if it is defined only once in the program,
+    by an instruction 'addi rd, x0, imm', before the instruction that reads
+    it. The arithmetic right shift rounds towards negative infinity; hence, it
+    preserves the semantics of Div for negative dividends. Programs that write
+    x0, or that might contain loops, are returned unchanged.
+
+    Example:
+        >>> insts = [AsmModule.Addi("c", "x0", 8), AsmModule.Mul("m", "a", "c"),
+        ...          AsmModule.Div("d", "a", "c"), AsmModule.Div("q", "a", "c"),
+        ...          AsmModule.Mul("p", "q", "c"), AsmModule.Sub("r", "a", "p")]
+        >>> p = strength_reduce(AsmModule.Program({"a": -13}, insts))
+        >>> p.print_insts()
+        c = addi x0 8
+        m = slli a 3
+        d = srai a 3
+        r = andi a 7
+        >>> p.eval()
+        >>> [p.get_val(r) for r in ["m", "d", "r"]]
+        [-104, -2, 3]
+    """
+    insts = prog.get_insts()
+    if any(defined_reg(inst) == "x0" for inst in insts) or has_backward_jumps(prog):
+        return prog
+    num_defs = {}
+    num_uses = {}
+    for inst in insts:
+        num_defs[defined_reg(inst)] = num_defs.get(defined_reg(inst), 0) + 1
+        for reg in used_regs(inst):
+            num_uses[reg] = num_uses.get(reg, 0) + 1
+
+    def is_temporary(reg):
+        return num_defs.get(reg) == 1 and num_uses.get(reg) == 1
+
+    consts = {"x0": 0}
+    def_pc = {}
+    new_insts = list(insts)
+    for pc, inst in enumerate(insts):
+        new_inst = inst
+        if isinstance(inst, AsmModule.Mul):
+            k = power_of_two(consts.get(inst.rs2))
+            if k is not None:
+                new_inst = AsmModule.Slli(inst.rd, inst.rs1, k)
+            elif power_of_two(consts.get(inst.rs1)) is not None:
+                k = power_of_two(consts.get(inst.rs1))
+                new_inst = AsmModule.Slli(inst.rd, inst.rs2, k)
+        elif isinstance(inst, AsmModule.Div):
+            k = power_of_two(consts.get(inst.rs2))
+            if k is not None:
+                new_inst = AsmModule.Srai(inst.rd, inst.rs1, k)
+        elif isinstance(inst, AsmModule.Sub) and inst.rs2 in def_pc:
+            # a - ((a >> k) << k) == a & (2^k - 1), for any integer a.
+            scaled = new_insts[def_pc[inst.rs2]]
+            if (
+                isinstance(scaled, AsmModule.Slli)
+                and scaled.rs1 in def_pc
+                and is_temporary(inst.rs2)
+                and is_temporary(scaled.rs1)
+            ):
+                shifted = new_insts[def_pc[scaled.rs1]]
+                if (
+                    isinstance(shifted, AsmModule.Srai)
+                    and shifted.imm == scaled.imm
+                    and shifted.rs1 == inst.rs1
+                    and num_defs.get(inst.rs1, 0) <= 1
+                ):
+                    new_inst = AsmModule.Andi(inst.rd, inst.rs1, (1 << scaled.imm) - 1)
+                    new_insts[def_pc[inst.rs2]] = None
+                    new_insts[def_pc[scaled.rs1]] = None
+        new_insts[pc] = new_inst
+        rd = defined_reg(inst)
+        if rd is not None:
+            def_pc[rd] = pc
+            if (
+                isinstance(inst, AsmModule.Addi)
+                and inst.rs1 == "x0"
+                and num_defs[rd] == 1
+            ):
+                consts[rd] = inst.imm
+    return rebuild(prog, new_insts)
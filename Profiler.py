@@ -0,0 +1,178 @@
+"""
+This file implements an execution profiler for Program.eval. Profiling is
+opt-in: pass a profiler to Program.eval, as in "prog.eval(profiler)", and
+the profiler runs the program, recording, for every instruction that runs,
+its opcode and its position. It also measures the wall time of each
+instruction, and charges it a number of cycles, according to a cost model,
+which maps opcodes to cycles. Programs evaluated without a profiler run in
+the original loop of Program.eval, so they pay nothing for this feature.
+
+The wall time of an instruction includes the time to read the clock, which
+is about as long as running a simple instruction; thus, the times are
+better read as proportions than as absolute values.
+
+A profiler accumulates the executions of all the programs that it runs;
+counts per position only make sense if these programs have the same
+instructions. The results can be printed as a report, sorted by time, or
+exported as JSON.
+
+This file uses doctests. To test it, run "python3 -m doctest Profiler.py".
+"""
+
+import json
+import time
+from collections import Counter
+
+import Asm as AsmModule
+
+
+CLASSES = {
+    "add": "alu", "addi": "alu", "sub": "alu", "xor": "alu", "xori": "alu",
+    "and": "alu", "andi": "alu", "sll": "shift", "slli": "shift",
+    "srai": "shift", "slt": "compare", "slti": "compare", "mul": "mul",
+    "div": "div", "beq": "branch", "bne": "branch", "blt": "branch",
+    "jal": "jump", "lw": "memory", "lb": "memory", "sw": "memory",
+    "sb": "memory",
+}
+
+DEFAULT_COSTS = {"mul": 3, "div": 20, "beq": 2, "bne": 2, "blt": 2, "jal": 2}
+
+
+class Profiler:
+    """
+    Records the executions of the programs that it runs. The cost model maps
+    opcodes to cycles; opcodes that it does not mention cost one cycle.
+
+    Example:
+        >>> p = AsmModule.Program({"n": 3}, [AsmModule.Addi("s", "x0", 0)])
+        >>> p.add_label("loop")
+        >>> p.add_inst(AsmModule.Mul("t", "n", "n"))
+        >>> p.add_inst(AsmModule.Add("s", "s", "t"))
+        >>> p.add_inst(AsmModule.Addi("n", "n", -1))
+        >>> p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+        >>> profiler = Profiler()
+        >>> p.eval(profiler)
+        >>> p.get_val("s")
+        14
+        >>> sorted(profiler.counts.items())
+        [('add', 3), ('addi', 4), ('blt', 3), ('mul', 3)]
+        >>> sorted(profiler.hits.items())
+        [(0, 1), (1, 3), (2, 3), (3, 3), (4, 3)]
+        >>> profiler.cycles()
+        {'add': 3, 'addi': 4, 'blt': 6, 'mul': 9}
+    """
+
+    def __init__(self, costs=DEFAULT_COSTS):
+        self.costs = dict(costs)
+        self.counts = Counter()
+        self.hits = Counter()
+        self.times = Counter()
+        self.insts = {}
+
+    def run(self, prog):
+        """
+        Evaluates the program, like Program.eval, recording its execution.
+        """
+        clock = time.perf_counter
+        counts = self.counts
+        hits = self.hits
+        times = self.times
+        inst = prog.get_inst()
+        while inst:
+            pc = prog.pc - 1
+            opcode = inst.get_opcode()
+            start = clock()
+            inst.eval(prog)
+            times[opcode] += clock() - start
+            counts[opcode] += 1
+            hits[pc] += 1
+            self.insts[pc] = inst
+            inst = prog.get_inst()
+
+    def cycles(self):
+        """
+        Returns the cycles charged to each opcode, according to the cost
+        model.
+        """
+        return {
+            opcode: count * self.costs.get(opcode, 1)
+            for opcode, count in sorted(self.counts.items())
+        }
+
+    def classes(self):
+        """
+        Groups the counts, times and cycles by class of opcode:
+
+        >>> profiler = Profiler()
+        >>> AsmModule.Program({"a": 3}, [AsmModule.Mul("b", "a", "a"),
+        ...                              AsmModule.Sub("c", "b", "a")]).eval(profiler)
+        >>> {name: data["cycles"] for name, data in profiler.classes().items()}
+        {'alu': 1, 'mul': 3}
+        """
+        cycles = self.cycles()
+        classes = {}
+        for opcode, count in self.counts.items():
+            data = classes.setdefault(
+                CLASSES.get(opcode, opcode), {"count": 0, "seconds": 0.0, "cycles": 0})
+            data["count"] += count
+            data["seconds"] += self.times[opcode]
+            data["cycles"] += cycles[opcode]
+        return dict(sorted(classes.items()))
+
+    def to_dict(self):
+        cycles = self.cycles()
+        return {
+            "opcodes": {
+                opcode: {
+                    "class": CLASSES.get(opcode, opcode),
+                    "count": count,
+                    "seconds": self.times[opcode],
+                    "cycles": cycles[opcode],
+                }
+                for opcode, count in sorted(self.counts.items())
+            },
+            "classes": self.classes(),
+            "pcs": {str(pc): count for pc, count in sorted(self.hits.items())},
+            "total": {
+                "count": sum(self.counts.values()),
+                "seconds": sum(self.times.values()),
+                "cycles": sum(cycles.values()),
+            },
+            "costs": self.costs,
+        }
+
+    def to_json(self):
+        """
+        Returns the profile as a JSON document:
+
+        >>> profiler = Profiler({"add": 2})
+        >>> AsmModule.Program({"a": 1}, [AsmModule.Add("b", "a", "a")]).eval(profiler)
+        >>> data = json.loads(profiler.to_json())
+        >>> data["opcodes"]["add"]["cycles"], data["pcs"], data["total"]["count"]
+        (2, {'0': 1}, 1)
+        """
+        return json.dumps(self.to_dict(), indent=1, sort_keys=True)
+
+    def report(self, top=10):
+        """
+        Returns a textual report: one line per opcode, sorted by time, then
+        the 'top' positions that ran most often.
+        """
+        cycles = self.cycles()
+        total_time = sum(self.times.values()) or 1.0
+        total_cycles = sum(cycles.values()) or 1
+        lines = [f"{'opcode':>8} {'class':>8} {'count':>10} {'time(ms)':>10} "
+                 f"{'time%':>6} {'cycles':>10} {'cycles%':>8}"]
+        for opcode in sorted(self.counts, key=lambda op: (-self.times[op], op)):
+            seconds = self.times[opcode]
+            lines.append(
+                f"{opcode:>8} {CLASSES.get(opcode, opcode):>8} {self.counts[opcode]:>10} "
+                f"{seconds * 1000:>10.3f} {seconds / total_time:>6.1%} "
+                f"{cycles[opcode]:>10} {cycles[opcode] / total_cycles:>8.1%}")
+        lines.append(f"{'pc':>8} {'count':>10}  instruction")
+        for pc, count in sorted(self.hits.items(), key=lambda item: (-item[1], item[0]))[:top]:
+            lines.append(f"{pc:>8} {count:>10}  {self.insts[pc]}")
+        return "\n".join(lines)
+
+    def print_report(self, top=10):
+        print(self.report(top))
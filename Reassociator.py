@@ -0,0 +1,148 @@
+"""
+This file implements the reassociation of chains of associative operators.
+The parser builds left-deep trees: 'a + b + c + d' becomes
+Add(Add(Add(a, b), c), d). A long chain like that is as deep as it is long,
+and every recursive visitor that traverses it runs out of stack. This pass
+flattens chains of Add, Mul, And and Or into lists of operands, folds the
+constants in those lists, and rebuilds each chain as a balanced tree, whose
+depth is logarithmic on the number of operands.
+
+Integer addition and multiplication are associative and commutative, and
+evaluating an operand has no effect other than, possibly, stopping the
+program; thus, constants can be moved to the end of these chains. The
+boolean connectives short-circuit, so their operands keep their order:
+constants that do not change the result (true in a conjunction, false in a
+disjunction) are removed, and operands after a constant that decides the
+result are never evaluated, so they are removed too.
+
+This file uses doctests. To test it, run "python3 -m doctest Reassociator.py".
+"""
+
+from Expression import *
+from Visitor import *
+
+
+def build_balanced(op, operands):
+    """
+    Combines the operands with the binary operator 'op' into a balanced tree.
+
+    Example:
+        >>> e = build_balanced(Add, [Var('a'), Var('b'), Var('c'), Var('d')])
+        >>> type(e.left).__name__, type(e.right).__name__
+        ('Add', 'Add')
+    """
+    level = list(operands)
+    while len(level) > 1:
+        pairs = [op(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2 == 1:
+            pairs.append(level[-1])
+        level = pairs
+    return level[0]
+
+
+def depth(exp):
+    """
+    Computes the height of the expression tree, without recursion.
+
+    Example:
+        >>> depth(Add(Add(Var('a'), Num(1)), Num(2)))
+        3
+    """
+    height = 0
+    stack = [(exp, 1)]
+    while stack:
+        node, level = stack.pop()
+        height = max(height, level)
+        for attr in ("left", "right", "exp", "exp_def", "exp_body", "cond",
+                     "e0", "e1", "body", "function", "actual"):
+            child = getattr(node, attr, None)
+            if isinstance(child, Expression):
+                stack.append((child, level + 1))
+    return height
+
+
+class ReassociationVisitor(TransformVisitor):
+    """
+    This visitor rebuilds chains of associative operators as balanced trees,
+    folding their constants.
+
+    Example:
+        >>> e = Add(Add(Add(Add(Num(1), Var('a')), Num(2)), Var('b')), Num(3))
+        >>> r = e.accept(ReassociationVisitor(), None)
+        >>> r.left.left.identifier, r.left.right.identifier, r.right.num
+        ('a', 'b', 6)
+        >>> depth(e), depth(r)
+        (5, 3)
+
+        >>> e = And(And(And(Var('a'), Bln(True)), Var('b')), Bln(False))
+        >>> r = e.accept(ReassociationVisitor(), None)
+        >>> r.left.left.identifier, r.left.right.identifier, r.right.bln
+        ('a', 'b', False)
+    """
+
+    def flatten(self, exp, arg):
+        """
+        Returns the operands of the chain of operators of the same type as
+        'exp', from left to right, each of them already transformed.
+        """
+        operands = []
+        stack = [exp]
+        while stack:
+            node = stack.pop()
+            if type(node) is type(exp):
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                operands.append(node.accept(self, arg))
+        return operands
+
+    def visit_arithmetic(self, exp, arg, fold, neutral):
+        operands = self.flatten(exp, arg)
+        nums = [e.num for e in operands if isinstance(e, Num)]
+        operands = [e for e in operands if not isinstance(e, Num)]
+        if nums:
+            constant = nums[0]
+            for num in nums[1:]:
+                constant = fold(constant, num)
+            if constant != neutral or not operands:
+                operands.append(Num(constant))
+        return build_balanced(type(exp), operands)
+
+    def visit_logical(self, exp, arg, absorbing):
+        operands = []
+        for e in self.flatten(exp, arg):
+            if isinstance(e, Bln) and e.bln != absorbing:
+                continue
+            operands.append(e)
+            if isinstance(e, Bln):
+                break
+        if not operands:
+            return Bln(not absorbing)
+        return build_balanced(type(exp), operands)
+
+    def visit_add(self, exp, arg):
+        return self.visit_arithmetic(exp, arg, lambda a, b: a + b, 0)
+
+    def visit_mul(self, exp, arg):
+        return self.visit_arithmetic(exp, arg, lambda a, b: a * b, 1)
+
+    def visit_and(self, exp, arg):
+        return self.visit_logical(exp, arg, False)
+
+    def visit_or(self, exp, arg):
+        return self.visit_logical(exp, arg, True)
+
+
+def reassociate(exp):
+    """
+    Returns an expression equivalent to 'exp', where every chain of Add, Mul,
+    And and Or is a balanced tree.
+
+    Example:
+        >>> e = Var('x0')
+        >>> for i in range(1, 100000):
+        ...     e = Add(e, Var(f'x{i}'))
+        >>> depth(e), depth(reassociate(e))
+        (100000, 18)
+    """
+    return exp.accept(ReassociationVisitor(), None)
@@ -0,0 +1,323 @@
+"""
+This file implements sinks of instructions: objects that receive the code
+that a GenVisitor generates, one instruction or label at a time, in program
+order. The GenVisitor only calls two methods of the program that it
+receives, add_inst and add_label; thus, any object with these two methods
+can replace the program. A Program keeps every instruction, as an object,
+until it is done; a sink can, instead, write each instruction somewhere
+else as soon as it arrives:
+
+    * TextSink writes the instructions into a text file, in the format of
+      Program.print_insts, through a small buffer.
+    * PackedSink encodes the instructions into 32-bit words (see Encoding.py),
+      which take a few bytes each, instead of one object each.
+    * BinarySink encodes the instructions like PackedSink, but writes the
+      words into a binary file through a buffer of fixed size; the names of
+      the registers, the large constants and the labels go at the end.
+    * PeepholeSink is an optimizing pass that works on the stream: it
+      rewrites the instructions that it receives, and passes them to another
+      sink.
+
+With TextSink, the memory that code generation takes does not grow with
+the code: it is the memory of the expression, plus the buffer. BinarySink
+also keeps the names of the registers and labels until it is closed, so
+its memory grows with the number of registers: little with a visitor that
+reuses registers, such as SethiUllmanGenVisitor, and about one entry per
+instruction with GenVisitor, which takes a new register for each node.
+Encoded programs have no limit on the number of registers or labels.
+Sinks can be chained, e.g., PeepholeSink(TextSink(file)). The method close
+flushes the sink, and returns what it built, if anything.
+
+This file uses doctests. To test it, run "python3 -m doctest Sink.py".
+"""
+
+import json
+import sys
+
+import Asm as AsmModule
+import Encoding
+from Optimizer import defined_reg, used_regs
+from Specializer import with_immediate, fold
+
+
+class Sink:
+    """
+    The interface of sinks. 'size' is the number of instructions that the
+    sink received so far, i.e., the position of the next instruction, which
+    is where labels point to.
+    """
+
+    def __init__(self):
+        self.size = 0
+
+    def add_inst(self, inst):
+        raise NotImplementedError
+
+    def add_label(self, label):
+        raise NotImplementedError
+
+    def close(self):
+        return None
+
+
+class TextSink(Sink):
+    """
+    Writes the instructions into a text file, one per line, with labels
+    before the instruction that they mark, like Program.print_insts. Lines
+    are written 'buffer_lines' at a time.
+
+    Example:
+        >>> import io
+        >>> from Expression import Lth, Var, Num
+        >>> from Visitor import GenVisitor
+        >>> text = io.StringIO()
+        >>> sink = TextSink(text)
+        >>> Lth(Var("x"), Num(3)).accept(GenVisitor(), sink)
+        'v2'
+        >>> sink.close()
+        >>> print(text.getvalue(), end="")
+        v1 = addi x0 3
+        v2 = slt x v1
+    """
+
+    def __init__(self, file, buffer_lines=1024):
+        super().__init__()
+        self.file = file
+        self.buffer_lines = buffer_lines
+        self.lines = []
+
+    def add_inst(self, inst):
+        self.lines.append(f"{inst}\n")
+        self.size += 1
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def add_label(self, label):
+        self.lines.append(f"{label}:\n")
+
+    def flush(self):
+        self.file.writelines(self.lines)
+        self.lines.clear()
+
+    def close(self):
+        self.flush()
+
+
+class PackedSink(Sink):
+    """
+    Encodes the instructions into an EncodedProgram, as they arrive. Labels
+    get their numbers when they are first seen, by a branch or by add_label,
+    so branches can jump forward. The method close returns the encoded
+    program, and exits with "Label error" if a branch jumps to a label that
+    was never added.
+
+    Example:
+        >>> sink = PackedSink()
+        >>> sink.add_inst(AsmModule.Beq("a", "x0", "L1"))
+        >>> sink.add_inst(AsmModule.Addi("a", "x0", 1))
+        >>> sink.add_label("L1")
+        >>> sink.add_inst(AsmModule.Addi("b", "a", 1))
+        >>> encoded = sink.close()
+        >>> len(encoded.words), encoded.targets
+        (3, [2])
+        >>> encoded.eval({"a": 0})["b"], encoded.eval({"a": 5})["b"]
+        (1, 2)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.encoded = Encoding.EncodedProgram()
+        self.encoded.reg("x0")
+        self.label_numbers = {}
+
+    def label(self, name):
+        if name not in self.label_numbers:
+            self.label_numbers[name] = len(self.encoded.labels)
+            self.encoded.labels.append(name)
+            self.encoded.targets.append(None)
+        return self.label_numbers[name]
+
+    def add_inst(self, inst):
+        if hasattr(inst, "lab"):
+            self.label(inst.lab)
+        self.encoded.encode_inst(inst, self.label_numbers)
+        self.size += 1
+
+    def add_label(self, label):
+        self.encoded.targets[self.label(label)] = self.size
+
+    def close(self):
+        if None in self.encoded.targets:
+            sys.exit("Label error")
+        return self.encoded
+
+
+class BinarySink(PackedSink):
+    """
+    Encodes the instructions like PackedSink, and writes the words into a
+    binary file, 'buffer_words' at a time. The method close writes a
+    trailer with the names of the registers, the pool of constants and the
+    labels, plus the size of the trailer in its last four bytes. The
+    function 'load' reads such a file back into an EncodedProgram.
+
+    Example:
+        >>> import io
+        >>> from Expression import Mul, Var, Num
+        >>> from Visitor import GenVisitor
+        >>> data = io.BytesIO()
+        >>> sink = BinarySink(data, buffer_words=1)
+        >>> Mul(Var("x"), Num(1000)).accept(GenVisitor(), sink)
+        'v2'
+        >>> sink.close()
+        >>> len(data.getvalue()) > 8, len(sink.encoded.words)
+        (True, 0)
+        >>> load(data).eval({"x": 3})["v2"]
+        3000
+    """
+
+    def __init__(self, file, buffer_words=4096):
+        super().__init__()
+        self.file = file
+        self.buffer_words = buffer_words
+        self.written = 0
+
+    def add_inst(self, inst):
+        super().add_inst(inst)
+        if len(self.encoded.words) >= self.buffer_words:
+            self.flush()
+
+    def flush(self):
+        self.encoded.words.tofile(self.file)
+        self.written += len(self.encoded.words)
+        del self.encoded.words[:]
+
+    def close(self):
+        super().close()
+        self.flush()
+        trailer = json.dumps({
+            "size": self.written, "names": self.encoded.names, "pool": self.encoded.pool,
+            "targets": self.encoded.targets, "labels": self.encoded.labels,
+        }).encode()
+        self.file.write(trailer)
+        self.file.write(len(trailer).to_bytes(4, "little"))
+
+
+def load(file):
+    """
+    Reads the file that a BinarySink wrote, which must be seekable, and
+    returns its EncodedProgram.
+    """
+    file.seek(-4, 2)
+    trailer_size = int.from_bytes(file.read(4), "little")
+    file.seek(-4 - trailer_size, 2)
+    trailer = json.loads(file.read(trailer_size))
+    file.seek(0)
+    encoded = Encoding.EncodedProgram()
+    encoded.names = trailer["names"]
+    encoded.numbers = {name: number for number, name in enumerate(encoded.names)}
+    encoded.pool = trailer["pool"]
+    encoded.constants = {value: index for index, value in enumerate(encoded.pool)}
+    encoded.targets = trailer["targets"]
+    encoded.labels = trailer["labels"]
+    encoded.words.fromfile(file, trailer["size"])
+    return encoded
+
+
+class PeepholeSink(Sink):
+    """
+    An optimizing pass over the stream of instructions, which passes the
+    instructions that it produces to the sink 'downstream'. Like the
+    Specializer, it propagates the constants of instructions such as "addi
+    rd, x0, k" along straight-line code:
+
+        * instructions whose operands are constants become "addi rd, x0, k".
+        * instructions with one constant operand use an immediate, when the
+          instruction set has one; multiplications and divisions by powers
+          of two become shifts.
+
+    A constant only reaches the downstream sink when an instruction reads
+    its register, before branches and labels, and when the sink is closed,
+    so constants that are only used as immediates take no instruction,
+    unless the end of the stream or a branch needs them in registers. If
+    'outputs' is given, closing the sink only materializes the constants in
+    these registers. The sink sees neither the past nor the future of the
+    stream: constants do not cross labels.
+
+    Example:
+        >>> from Expression import Add, Mul, Var, Num
+        >>> from Visitor import GenVisitor
+        >>> prog = AsmModule.Program({"x": 5}, [])
+        >>> sink = PeepholeSink(prog, outputs=["v6"])
+        >>> Add(Mul(Var("x"), Num(8)), Add(Num(2), Num(3))).accept(GenVisitor(), sink)
+        'v6'
+        >>> sink.close()
+        >>> prog.print_insts()
+        v2 = slli x 3
+        v6 = addi v2 5
+        >>> prog.eval()
+        >>> prog.get_val("v6")
+        45
+    """
+
+    def __init__(self, downstream, outputs=None):
+        super().__init__()
+        self.downstream = downstream
+        self.outputs = outputs
+        self.invariant = {"x0": 0}
+        self.consts = dict(self.invariant)
+        self.pending = {}
+
+    def materialize(self, reg):
+        self.downstream.add_inst(AsmModule.Addi(reg, "x0", self.pending.pop(reg)))
+
+    def flush(self, regs=None):
+        for reg in sorted(self.pending):
+            if regs is None or reg in regs:
+                self.materialize(reg)
+        self.pending.clear()
+
+    def rewrite(self, inst):
+        """
+        Returns the instruction that replaces 'inst', given the constants.
+        """
+        op = inst.get_opcode()
+        if op in ("mul", "div") and inst.rs2 in self.consts:
+            k = self.consts[inst.rs2]
+            if k > 0 and k & (k - 1) == 0:
+                shift = AsmModule.Slli if op == "mul" else AsmModule.Srai
+                return shift(inst.rd, inst.rs1, k.bit_length() - 1)
+        if op == "mul" and inst.rs1 in self.consts:
+            k = self.consts[inst.rs1]
+            if k > 0 and k & (k - 1) == 0:
+                return AsmModule.Slli(inst.rd, inst.rs2, k.bit_length() - 1)
+        return with_immediate(inst, self.consts) or inst
+
+    def add_inst(self, inst):
+        self.size += 1
+        rd = defined_reg(inst)
+        value = fold(inst, self.consts) if rd != "x0" else None
+        if value is not None:
+            self.consts[rd] = value
+            self.pending[rd] = value
+            return
+        new_inst = self.rewrite(inst) if isinstance(inst, AsmModule.BinOp) else inst
+        for reg in used_regs(new_inst):
+            if reg in self.pending:
+                self.materialize(reg)
+        if hasattr(inst, "lab"):
+            self.flush()
+        self.downstream.add_inst(new_inst)
+        if rd == "x0":
+            self.invariant = {}
+        if rd is not None:
+            self.consts.pop(rd, None)
+            self.pending.pop(rd, None)
+
+    def add_label(self, label):
+        self.flush()
+        self.consts = dict(self.invariant)
+        self.downstream.add_label(label)
+
+    def close(self):
+        self.flush(self.outputs)
+        return self.downstream.close() if isinstance(self.downstream, Sink) else None
@@ -0,0 +1,293 @@
+"""
+This file implements a specializer of Asm programs: given a program and the
+values of some of its inputs, it produces a residual program, which only
+depends on the other inputs. The specializer propagates constants, from the
+known inputs and from instructions such as "addi rd, x0, imm", through the
+instructions of the program, in order:
+
+    * instructions whose operands are all constants are folded: they do not
+      appear in the residual program; their results become constants.
+    * instructions with one constant operand use an immediate, when the
+      instruction set has one: "add rd, a, k" becomes "addi rd, a, k", and
+      "slt rd, a, k" becomes "slti rd, a, k", for instance.
+    * branches whose operands are constants are decided: they become jumps,
+      or disappear. Code after jumps, up to the next label, is dropped.
+
+A constant only becomes an instruction, "addi rd, x0, k", when the
+residual program needs it in a register, e.g., as an operand of "mul", or
+when a branch or a label leaves the straight-line code where it is known.
+Constants that the code before the first branch or label needs in
+registers go into the initial environment of the residual program instead,
+when no residual instruction touched their registers before, as every
+execution runs that code exactly once.
+Constants do not cross labels, except for the known inputs that the
+program never writes; thus, constants that loops modify are not propagated.
+Jumps to the next instruction of the residual program are removed.
+
+Programs that write x0, or that jump with "jal" to a register other than
+x0 (whose value would be a position in the residual program), are not
+specialized: their residual program is a copy of them.
+
+This file uses doctests. To test it, run "python3 -m doctest Specializer.py".
+"""
+
+from collections import OrderedDict
+
+import Asm as AsmModule
+from Optimizer import defined_reg, used_regs, rebuild, live_registers
+
+
+FOLDERS = {
+    "add": lambda a, b: a + b, "sub": lambda a, b: a - b,
+    "mul": lambda a, b: a * b, "xor": lambda a, b: a ^ b,
+    "div": lambda a, b: a // b, "slt": lambda a, b: 1 if a < b else 0,
+    "sll": lambda a, b: a << b, "and": lambda a, b: a & b,
+    "addi": lambda a, b: a + b, "xori": lambda a, b: a ^ b,
+    "slti": lambda a, b: 1 if a < b else 0, "slli": lambda a, b: a << b,
+    "srai": lambda a, b: a >> b, "andi": lambda a, b: a & b,
+}
+
+DECIDERS = {
+    "beq": lambda a, b: a == b, "bne": lambda a, b: a != b,
+    "blt": lambda a, b: a < b,
+}
+
+
+def with_immediate(inst, consts):
+    """
+    Rewrites a binary instruction with one constant operand into its form
+    with an immediate, if there is one. Returns None otherwise:
+
+    >>> str(with_immediate(AsmModule.Sub("a", "b", "k"), {"k": 3}))
+    'a = addi b -3'
+    >>> str(with_immediate(AsmModule.Add("a", "k", "b"), {"k": 3}))
+    'a = addi b 3'
+    >>> with_immediate(AsmModule.Mul("a", "b", "k"), {"k": 3}) is None
+    True
+    """
+    op = inst.get_opcode()
+    if not isinstance(inst, AsmModule.BinOp):
+        return None
+    if inst.rs2 in consts:
+        k, reg = consts[inst.rs2], inst.rs1
+    elif inst.rs1 in consts and op in ("add", "xor", "and"):
+        k, reg = consts[inst.rs1], inst.rs2
+    else:
+        return None
+    if op == "add":
+        return AsmModule.Addi(inst.rd, reg, k)
+    if op == "sub":
+        return AsmModule.Addi(inst.rd, reg, -k)
+    if op == "xor":
+        return AsmModule.Xori(inst.rd, reg, k)
+    if op == "and":
+        return AsmModule.Andi(inst.rd, reg, k)
+    if op == "slt":
+        return AsmModule.Slti(inst.rd, reg, k)
+    return None
+
+
+def fold(inst, consts):
+    """
+    Computes the result of an instruction whose operands are constants.
+    Returns None if the instruction cannot be folded, e.g., a division by
+    zero, which must fail when the residual program runs.
+    """
+    folder = FOLDERS.get(inst.get_opcode())
+    if folder is None or any(reg not in consts for reg in used_regs(inst)):
+        return None
+    b = inst.imm if isinstance(inst, AsmModule.BinOpImm) else consts[inst.rs2]
+    try:
+        return folder(consts[inst.rs1], b)
+    except (ZeroDivisionError, ValueError):
+        return None
+
+
+def copy_memory(source, prog):
+    if source.has_memory():
+        prog.set_memory(source.get_memory())
+    return prog
+
+
+def copy_program(prog, env):
+    residual = AsmModule.Program(env, list(prog.get_insts()))
+    residual.get_labels().update(prog.get_labels())
+    return copy_memory(prog, residual)
+
+
+def specialize(prog, known, outputs=None):
+    """
+    Returns the residual program of 'prog' for the known inputs, over the
+    same data memory. To run it, add the other inputs to its environment.
+    By default, the residual program ends with the same environment as
+    'prog'. If the registers that the caller reads are given as 'outputs',
+    constants in other registers are only materialized where they are live.
+
+    Example:
+        >>> insts = [AsmModule.Addi("two", "x0", 2), AsmModule.Mul("t", "w", "two"),
+        ...          AsmModule.Add("t", "t", "b"), AsmModule.Mul("r", "t", "x"),
+        ...          AsmModule.Slt("big", "r", "w")]
+        >>> p = specialize(AsmModule.Program({}, insts), {"w": 10, "b": 1})
+        >>> p.print_insts()
+        r = mul t x
+        big = slti r 10
+        >>> p.set_val("x", 3)
+        >>> p.eval()
+        >>> p.get_val("r"), p.get_val("big"), p.get_val("t")
+        (63, 0, 21)
+        >>> specialize(AsmModule.Program({}, insts), {"w": 10, "b": 1}, ["big"]).get_env()
+        {'w': 10, 'b': 1, 'x0': 0, 't': 21}
+    """
+    insts = prog.get_insts()
+    env = dict(known)
+    if any(defined_reg(inst) == "x0" for inst in insts) or any(
+            isinstance(inst, AsmModule.Jal) and inst.rd != "x0" for inst in insts):
+        return copy_program(prog, env)
+    unknown = set(prog.get_env()) - set(known) - {"x0"}
+    written = {defined_reg(inst) for inst in insts}
+    invariant = {"x0": 0, **{reg: value for reg, value in known.items() if reg not in written}}
+    consts = {"x0": 0, **known}
+    live = None if outputs is None else live_registers(prog, frozenset(outputs))
+    pending = set()
+    touched = set(unknown)
+    entry = True
+    reachable = True
+    residual = copy_memory(prog, AsmModule.Program(env, []))
+    labels = {}
+    for label, pc in prog.get_labels().items():
+        labels.setdefault(pc, []).append(label)
+
+    def materialize(reg):
+        if reg in touched or not entry:
+            residual.add_inst(AsmModule.Addi(reg, "x0", consts[reg]))
+        else:
+            env[reg] = consts[reg]
+        pending.discard(reg)
+
+    def flush(pc):
+        for reg in sorted(pending):
+            if live is None or reg in live[pc]:
+                materialize(reg)
+            else:
+                pending.discard(reg)
+                consts.pop(reg)
+
+    for pc in range(len(insts) + 1):
+        if pc in labels:
+            flush(pc)
+            entry = False
+            reachable = True
+            consts = dict(invariant)
+            for label in labels[pc]:
+                residual.add_label(label)
+        if pc == len(insts):
+            break
+        inst = insts[pc]
+        if not reachable:
+            continue
+        rd = defined_reg(inst)
+        value = fold(inst, consts)
+        if value is not None:
+            consts[rd] = value
+            pending.add(rd)
+            continue
+        if inst.get_opcode() in DECIDERS and inst.rs1 in consts and inst.rs2 in consts:
+            if DECIDERS[inst.get_opcode()](consts[inst.rs1], consts[inst.rs2]):
+                flush(pc)
+                residual.add_inst(AsmModule.Jal("x0", inst.lab))
+                entry = reachable = False
+            continue
+        new_inst = with_immediate(inst, consts) or inst
+        for reg in used_regs(new_inst):
+            if reg in pending:
+                materialize(reg)
+        if hasattr(inst, "lab"):
+            flush(pc)
+            entry = False
+        residual.add_inst(new_inst)
+        reachable = not isinstance(inst, AsmModule.Jal)
+        touched.update(used_regs(new_inst))
+        if rd is not None:
+            touched.add(rd)
+            consts.pop(rd, None)
+            pending.discard(rd)
+    flush(len(insts))
+    return remove_jumps_to_next(residual)
+
+
+def remove_jumps_to_next(prog):
+    """
+    Removes the jumps whose label marks the instruction that follows them:
+
+    >>> p = AsmModule.Program({}, [AsmModule.Jal("x0", "L1")])
+    >>> p.add_label("L1")
+    >>> p.add_inst(AsmModule.Addi("a", "x0", 1))
+    >>> remove_jumps_to_next(p).print_insts()
+    L1:
+    a = addi x0 1
+    """
+    insts = prog.get_insts()
+    labels = prog.get_labels()
+    new_insts = [
+        None if isinstance(inst, AsmModule.Jal) and inst.rd == "x0"
+        and labels.get(inst.lab) == pc + 1 else inst
+        for pc, inst in enumerate(insts)
+    ]
+    if None not in new_insts:
+        return prog
+    return rebuild(prog, new_insts)
+
+
+class Specializer:
+    """
+    Specializes one program for many values of its known inputs, keeping
+    the last 'max_entries' residual programs, by the values of the known
+    inputs. The outputs are passed to 'specialize'.
+
+    Example:
+        >>> insts = [AsmModule.Mul("t", "w", "w"), AsmModule.Add("r", "t", "x")]
+        >>> s = Specializer(AsmModule.Program({}, insts))
+        >>> [s.run({"w": 3}, {"x": x}).get_val("r") for x in range(3)]
+        [9, 10, 11]
+        >>> s.hits, s.misses, len(s.residual({"w": 3}).get_insts())
+        (2, 1, 1)
+    """
+
+    def __init__(self, prog, outputs=None, max_entries=128):
+        self.prog = prog
+        self.outputs = outputs
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def residual(self, known):
+        """
+        Returns the residual program for the known inputs. Callers must not
+        modify it; see 'run'.
+        """
+        key = tuple(sorted(known.items()))
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        residual = specialize(self.prog, known, self.outputs)
+        self.cache[key] = residual
+        if len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return residual
+
+    def run(self, known, inputs):
+        """
+        Runs the residual program for the known inputs over the other
+        inputs, in a new program that shares its instructions, and the data
+        memory of the original program, and returns this program, evaluated.
+        """
+        residual = self.residual(known)
+        env = dict(residual.get_env())
+        env.update(inputs)
+        prog = copy_memory(self.prog, AsmModule.Program(env, residual.get_insts()))
+        prog.get_labels().update(residual.get_labels())
+        prog.eval()
+        return prog
@@ -0,0 +1,233 @@
+"""
+This file implements a closure-threaded interpreter of Asm programs. The
+program is linked first (see Linker.py); then, each linked instruction
+becomes a Python closure that has its register slots, its immediate and the
+position of the next instruction bound in. Running an instruction is a call
+to its closure, which returns the position of the next instruction to run.
+Thus, the interpreter does not dispatch on opcodes, and does not read the
+attributes of instructions: its loop is just "pc = closures[pc]()".
+
+The closures share the list of registers of the linked program. To run the
+program again from other inputs, update that list in place; do not replace
+it with another list.
+
+This file uses doctests. To test it, run "python3 -m doctest Threaded.py".
+"""
+
+import sys
+
+import Asm as AsmModule
+import Linker
+from Linker import ADD, ADDI, MUL, SUB, XOR, XORI, DIV, SLT, SLTI
+from Linker import SLL, SLLI, SRAI, AND, ANDI, BEQ, BNE, BLT, JAL, JMP
+
+
+def thread_add(regs, a, b, c, nxt):
+    def add():
+        regs[a] = regs[b] + regs[c]
+        return nxt
+    return add
+
+
+def thread_addi(regs, a, b, c, nxt):
+    def addi():
+        regs[a] = regs[b] + c
+        return nxt
+    return addi
+
+
+def thread_mul(regs, a, b, c, nxt):
+    def mul():
+        regs[a] = regs[b] * regs[c]
+        return nxt
+    return mul
+
+
+def thread_sub(regs, a, b, c, nxt):
+    def sub():
+        regs[a] = regs[b] - regs[c]
+        return nxt
+    return sub
+
+
+def thread_xor(regs, a, b, c, nxt):
+    def xor():
+        regs[a] = regs[b] ^ regs[c]
+        return nxt
+    return xor
+
+
+def thread_xori(regs, a, b, c, nxt):
+    def xori():
+        regs[a] = regs[b] ^ c
+        return nxt
+    return xori
+
+
+def thread_div(regs, a, b, c, nxt):
+    def div():
+        regs[a] = regs[b] // regs[c]
+        return nxt
+    return div
+
+
+def thread_slt(regs, a, b, c, nxt):
+    def slt():
+        regs[a] = 1 if regs[b] < regs[c] else 0
+        return nxt
+    return slt
+
+
+def thread_slti(regs, a, b, c, nxt):
+    def slti():
+        regs[a] = 1 if regs[b] < c else 0
+        return nxt
+    return slti
+
+
+def thread_sll(regs, a, b, c, nxt):
+    def sll():
+        regs[a] = regs[b] << regs[c]
+        return nxt
+    return sll
+
+
+def thread_slli(regs, a, b, c, nxt):
+    def slli():
+        regs[a] = regs[b] << c
+        return nxt
+    return slli
+
+
+def thread_srai(regs, a, b, c, nxt):
+    def srai():
+        regs[a] = regs[b] >> c
+        return nxt
+    return srai
+
+
+def thread_and(regs, a, b, c, nxt):
+    def and_():
+        regs[a] = regs[b] & regs[c]
+        return nxt
+    return and_
+
+
+def thread_andi(regs, a, b, c, nxt):
+    def andi():
+        regs[a] = regs[b] & c
+        return nxt
+    return andi
+
+
+def thread_beq(regs, a, b, c, nxt):
+    def beq():
+        if regs[a] is None or regs[b] is None:
+            sys.exit("Def error")
+        return c if regs[a] == regs[b] else nxt
+    return beq
+
+
+def thread_bne(regs, a, b, c, nxt):
+    def bne():
+        if regs[a] is None or regs[b] is None:
+            sys.exit("Def error")
+        return c if regs[a] != regs[b] else nxt
+    return bne
+
+
+def thread_blt(regs, a, b, c, nxt):
+    def blt():
+        return c if regs[a] < regs[b] else nxt
+    return blt
+
+
+def thread_jal(regs, a, b, c, nxt):
+    def jal():
+        regs[a] = nxt
+        return b
+    return jal
+
+
+def thread_jmp(regs, a, b, c, nxt):
+    def jmp():
+        return b
+    return jmp
+
+
+THREADERS = {
+    ADD: thread_add, ADDI: thread_addi, MUL: thread_mul, SUB: thread_sub,
+    XOR: thread_xor, XORI: thread_xori, DIV: thread_div, SLT: thread_slt,
+    SLTI: thread_slti, SLL: thread_sll, SLLI: thread_slli, SRAI: thread_srai,
+    AND: thread_and, ANDI: thread_andi, BEQ: thread_beq, BNE: thread_bne,
+    BLT: thread_blt, JAL: thread_jal, JMP: thread_jmp,
+}
+
+
+class ThreadedProgram(Linker.LinkedProgram):
+    """
+    A linked program whose instructions are closures. Programs without
+    branches and jumps run the closures in the list 'line' in sequence,
+    without even tracking the program counter.
+
+    Example:
+        >>> insts = [AsmModule.Add("x0", "b0", "b1"), AsmModule.Sub("x1", "x0", "b2")]
+        >>> tp = ThreadedProgram(AsmModule.Program({"b0":2, "b1":3, "b2": 4}, insts))
+        >>> tp.eval()
+        >>> tp.print_env()
+        b0: 2
+        b1: 3
+        b2: 4
+        x0: 5
+        x1: 1
+    """
+
+    def __init__(self, prog):
+        super().__init__(prog)
+        self.closures = [
+            THREADERS[op](self.regs, a, b, c, pc + 1)
+            for pc, (op, a, b, c) in enumerate(self.code)
+        ]
+        self.straight = all(op < BEQ for op, _, _, _ in self.code)
+        self.line = list(self.closures)
+
+    def eval(self):
+        """
+        Runs the closures from the first instruction until the end of the
+        program.
+
+        Example:
+            >>> p = AsmModule.Program({"n": 5}, [AsmModule.Addi("s", "x0", 0)])
+            >>> p.add_label("loop")
+            >>> p.add_inst(AsmModule.Add("s", "s", "n"))
+            >>> p.add_inst(AsmModule.Addi("n", "n", -1))
+            >>> p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+            >>> tp = ThreadedProgram(p)
+            >>> tp.eval()
+            >>> tp.get_val("s")
+            15
+        """
+        closures = self.closures
+        try:
+            if self.straight:
+                for closure in self.line:
+                    closure()
+                return
+            size = len(closures)
+            pc = 0
+            while pc < size:
+                pc = closures[pc]()
+        except TypeError:
+            sys.exit("Def error")
+
+
+def run(prog):
+    """
+    Evaluates the program with the threaded interpreter, and copies the
+    registers back into its environment, like Program.eval.
+
+    Example:
+        >>> AsmModule.distance_with_acceleration(3, 4, 5, run)
+        65
+    """
+    Linker.run(prog, ThreadedProgram)
@@ -0,0 +1,178 @@
+"""
+This file implements a tiered runner of Asm programs. Compiling a program
+into a faster form (see Threaded.py and Jit.py) costs more than interpreting
+it a few times; thus, programs that run only once or twice should never be
+compiled. The runner interprets programs with Program.eval, and counts how
+many times it has seen the instructions of each program. When that count
+reaches a threshold, the program is promoted: a background thread compiles
+it, and the next runs of programs with the same instructions use the
+compiled form once it is ready. Straight-line programs are compiled into
+Python functions; the others are linked into threaded programs.
+
+The runner records what it does in its metrics: how many runs each tier
+performed, how many promotions started and finished, and how long the
+promotions took.
+
+This file uses doctests. To test it, run "python3 -m doctest Tiered.py".
+"""
+
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import Asm as AsmModule
+import Jit
+import Linker
+import Threaded
+
+
+MAX_KEYS = 4096
+
+
+def optimize(prog):
+    """
+    Produces the fastest executable form available for the program, plus the
+    name of its tier. The executable form is a callable that evaluates
+    programs with the same instructions and labels.
+
+    Example:
+        >>> p = AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", 1)])
+        >>> optimize(p)[1]
+        'jit'
+    """
+    function = Jit.compile_program(prog)
+    if function is not None:
+        return function, "jit"
+    return Threaded.ThreadedProgram(prog), "threaded"
+
+
+def timed_optimize(prog):
+    start = time.perf_counter()
+    code, tier = optimize(prog)
+    return code, tier, time.perf_counter() - start
+
+
+class TieredRunner:
+    """
+    Runs programs, promoting the programs that run at least 'threshold'
+    times. If 'background' is False, promotions happen synchronously, in the
+    run that reaches the threshold. A threshold of None disables promotions.
+
+    Example:
+        >>> runner = TieredRunner(threshold=2, background=False)
+        >>> for a in range(4):
+        ...     p = AsmModule.Program({"a": a}, [AsmModule.Mul("b", "a", "a")])
+        ...     runner.run(p)
+        ...     print(p.get_val("b"), runner.tier(p))
+        0 interpreter
+        1 jit
+        4 jit
+        9 jit
+        >>> sorted(runner.metrics.items())
+        [('interpreted', 2), ('jit', 2), ('promoted', 1), ('runs', 4)]
+    """
+
+    def __init__(self, threshold=10, background=True):
+        self.threshold = threshold
+        self.background = background
+        self.counts = Counter()
+        self.compiled = {}
+        self.tiers = {}
+        self.pending = {}
+        self.metrics = Counter()
+        self.promotion_time = 0.0
+        self.keys = {}
+        self.executor = ThreadPoolExecutor(max_workers=1) if background else None
+
+    def key(self, prog):
+        """
+        Returns the hash of the instructions of the program, plus the
+        positions of its labels, as programs with the same instructions but
+        different labels behave differently. Hashing a long list of
+        instructions costs more than interpreting a short program; thus, the
+        hash is remembered for each list of instructions, assuming that lists
+        are not changed once their programs start running, except by adding
+        new instructions. The lists in the table stay alive, so their ids are
+        not reused.
+        """
+        insts = prog.get_insts()
+        labels = prog.get_labels()
+        entry = self.keys.get(id(insts))
+        if entry is None or entry[1] != len(insts) or entry[2] != labels:
+            if len(self.keys) >= MAX_KEYS:
+                self.keys.clear()
+            key = (Jit.cache_key(insts), tuple(sorted(labels.items())))
+            entry = (insts, len(insts), dict(labels), key)
+            self.keys[id(insts)] = entry
+        return entry[3]
+
+    def tier(self, prog):
+        """
+        Returns the name of the tier that runs the program now.
+        """
+        return self.tiers.get(self.key(prog), "interpreter")
+
+    def install(self, key, code, tier, elapsed):
+        self.compiled[key] = code
+        self.tiers[key] = tier
+        self.metrics["promoted"] += 1
+        self.promotion_time += elapsed
+
+    def promote(self, key, prog):
+        """
+        Starts the promotion of the program, in the background if possible.
+        The program is copied, so that the caller can keep changing it.
+        Programs with loads and stores, which have no compiled form, stay in
+        the interpreter.
+        """
+        if not Linker.linkable(prog):
+            return
+        copy = AsmModule.Program({}, list(prog.get_insts()))
+        copy.get_labels().update(prog.get_labels())
+        if self.background:
+            self.pending[key] = self.executor.submit(timed_optimize, copy)
+            self.metrics["started"] += 1
+        else:
+            self.install(key, *timed_optimize(copy))
+
+    def lookup(self, key):
+        """
+        Returns the compiled form of the instructions with the given key, if
+        it is ready, or None otherwise.
+        """
+        code = self.compiled.get(key)
+        if code is None and key in self.pending and self.pending[key].done():
+            self.install(key, *self.pending.pop(key).result())
+            code = self.compiled[key]
+        return code
+
+    def run(self, prog):
+        """
+        Evaluates the program, like Program.eval.
+        """
+        key = self.key(prog)
+        self.metrics["runs"] += 1
+        code = self.lookup(key)
+        if code is None:
+            self.counts[key] += 1
+            if self.counts[key] == self.threshold:
+                self.promote(key, prog)
+        if code is None or prog.pc != 0:
+            self.metrics["interpreted"] += 1
+            prog.eval()
+        else:
+            self.metrics[self.tiers[key]] += 1
+            code(prog)
+
+    def wait(self):
+        """
+        Waits for the promotions that are still running, and installs them.
+        """
+        for key in list(self.pending):
+            self.pending[key].result()
+            self.lookup(key)
+
+    def shutdown(self):
+        self.wait()
+        if self.executor is not None:
+            self.executor.shutdown()
@@ -0,0 +1,176 @@
+"""
+This file implements an execution tracer for Program.eval. Tracing is opt-in:
+pass a tracer to Program.eval, as in "prog.eval(tracer=tracer)", and the
+tracer runs the program, recording, for every instruction that runs, a
+tuple (pc, opcode, rd, value), where value is the value that the
+instruction wrote into rd. Branches and jumps that do not write registers
+record rd as -1, and the position of the next instruction as their value.
+
+Only the last 'size' tuples are kept, in a ring buffer made of four
+preallocated arrays of machine integers, so that the memory of the tracer
+does not grow with the length of the execution, and recording does not
+allocate Python objects. Opcodes are stored as their numbers in
+Linker.OPCODES, or in OPCODES, which also numbers loads and stores, and
+registers as indices in the table 'names' of the tracer. Stores, like
+branches, record rd as -1. Values that do not fit in 64 bits are kept
+aside, in a dictionary.
+
+If the program fails, e.g., with the "Def error" exit of Program.get_val,
+the tracer dumps the buffer, plus the instruction that failed, and lets the
+error go on. Programs evaluated without a tracer do not pay for it.
+
+This file uses doctests. To test it, run "python3 -m doctest Tracer.py".
+"""
+
+import sys
+from array import array
+
+import Asm as AsmModule
+import Linker
+
+
+OPCODES = dict(Linker.OPCODES, lw=19, lb=20, sw=21, sb=22)
+OPCODE_NAMES = {number: name for name, number in OPCODES.items()}
+
+MIN_VALUE = -(1 << 63)
+MAX_VALUE = (1 << 63) - 1
+
+
+class Tracer:
+    """
+    Records the last 'size' instructions that ran. Failures are dumped into
+    'file', which is the standard error by default.
+
+    Example:
+        >>> p = AsmModule.Program({"n": 3}, [AsmModule.Addi("s", "x0", 0)])
+        >>> p.add_label("loop")
+        >>> p.add_inst(AsmModule.Add("s", "s", "n"))
+        >>> p.add_inst(AsmModule.Addi("n", "n", -1))
+        >>> p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+        >>> tracer = Tracer(4)
+        >>> p.eval(tracer=tracer)
+        >>> p.get_val("s")
+        6
+        >>> for entry in tracer.entries():
+        ...     print(entry)
+        (3, 'blt', None, 1)
+        (1, 'add', 's', 6)
+        (2, 'addi', 'n', 0)
+        (3, 'blt', None, 4)
+    """
+
+    def __init__(self, size=1024, file=None):
+        self.size = size
+        self.file = file
+        self.pcs = array("i", [0]) * size
+        self.opcodes = array("b", [0]) * size
+        self.regs = array("i", [0]) * size
+        self.values = array("q", [0]) * size
+        self.big = {}
+        self.names = []
+        self.ids = {}
+        self.tables = {}
+        self.count = 0
+
+    def reg_id(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def decode(self, prog):
+        """
+        Resolves the opcode and the destination register of each instruction
+        of the program before running it. The result is remembered for each
+        list of instructions, so that programs that share their instructions
+        are decoded only once.
+        """
+        insts = prog.get_insts()
+        cached = self.tables.get(id(insts))
+        if cached is not None and cached[0] is insts and len(cached[1]) == len(insts):
+            return cached[1]
+        table = []
+        for inst in insts:
+            rd = getattr(inst, "rd", None)
+            if isinstance(inst, AsmModule.Jal) and rd == "x0":
+                rd = None
+            rd_id = -1 if rd is None else self.reg_id(rd)
+            table.append((OPCODES[inst.get_opcode()], rd_id, rd))
+        self.tables[id(insts)] = (insts, table)
+        return table
+
+    def run(self, prog):
+        """
+        Evaluates the program, like Program.eval, recording its execution.
+        """
+        table = self.decode(prog)
+        env = prog.get_env()
+        pcs, opcodes, regs, values = self.pcs, self.opcodes, self.regs, self.values
+        size = self.size
+        count = self.count
+        inst = prog.get_inst()
+        try:
+            while inst:
+                pc = prog.pc - 1
+                inst.eval(prog)
+                opcode, rd_id, rd = table[pc]
+                value = prog.pc if rd is None else env[rd]
+                slot = count % size
+                pcs[slot] = pc
+                opcodes[slot] = opcode
+                regs[slot] = rd_id
+                if MIN_VALUE <= value <= MAX_VALUE:
+                    values[slot] = value
+                    if self.big:
+                        self.big.pop(slot, None)
+                else:
+                    values[slot] = 0
+                    self.big[slot] = value
+                count += 1
+                inst = prog.get_inst()
+        except BaseException as error:
+            self.count = count
+            self.dump(prog, error)
+            raise
+        self.count = count
+
+    def entries(self):
+        """
+        Returns the tuples in the buffer, from the oldest to the newest.
+        """
+        first = max(0, self.count - self.size)
+        result = []
+        for i in range(first, self.count):
+            slot = i % self.size
+            rd = self.names[self.regs[slot]] if self.regs[slot] >= 0 else None
+            value = self.big.get(slot, self.values[slot])
+            result.append((self.pcs[slot], OPCODE_NAMES[self.opcodes[slot]], rd, value))
+        return result
+
+    def dump(self, prog, error):
+        """
+        Prints the buffer, then the instruction that was running when the
+        error happened, and the error.
+
+        Example:
+            >>> p = AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", 1),
+            ...                                  AsmModule.Add("c", "b", "d")])
+            >>> try:
+            ...     p.eval(tracer=Tracer(8, sys.stdout))
+            ... except SystemExit as error:
+            ...     print(error)
+            Trace of the last 1 instructions:
+                   0   addi        b 2
+                   1 failed: c = add b d
+            Error: SystemExit('Def error')
+            Def error
+        """
+        file = self.file or sys.stderr
+        print(f"Trace of the last {min(self.count, self.size)} instructions:", file=file)
+        for pc, opcode, rd, value in self.entries():
+            print(f"{pc:>8} {opcode:>6} {rd if rd is not None else '-':>8} {value}", file=file)
+        failed = prog.pc - 1
+        insts = prog.get_insts()
+        if 0 <= failed < len(insts):
+            print(f"{failed:>8} failed: {insts[failed]}", file=file)
+        print(f"Error: {error!r}", file=file)
@@ -41,19 +41,82 @@ def unify(constraints, sets):
         >>> len(sets['b'])
         4
     """
-    if not constraints:
-        return sets
-    t0, t1 = constraints[0]
-    rest = constraints[1:]
-    if t0 != t1:
-        s0 = sets.setdefault(t0, set())
-        s1 = sets.setdefault(t1, set())
-        new_set = s0 | s1 | {t0, t1}
-        for type_name in new_set:
-            sets[type_name] = new_set
-    return unify(rest, sets)
+    classes = UnionFind()
+    for type_name, type_set in sets.items():
+        for member in type_set:
+            classes.union(type_name, member)
+    for t0, t1 in constraints:
+        if t0 != t1:
+            classes.union(t0, t1)
+    return classes.sets()
 
 
+class UnionFind:
+    """
+    This class keeps the equivalence classes of type names (type variables
+    and types) as a forest: each type name points to a parent in its class,
+    and the root of each tree represents the class. 'find' compresses the
+    path from a type name to its root, and 'union' hangs the shorter tree
+    under the root of the taller one (union by rank). Thus, a sequence of n
+    operations takes time almost linear in n, and no recursion.
+
+    Example:
+        >>> classes = UnionFind()
+        >>> classes.union('a', 'b')
+        'a'
+        >>> classes.union('c', type(1))
+        'c'
+        >>> classes.find('a') == classes.find('b'), classes.find('a') == classes.find('c')
+        (True, False)
+        >>> classes.union('b', 'c')
+        'a'
+        >>> sorted(str(e) for e in classes.sets()['a'])
+        ["<class 'int'>", 'a', 'b', 'c']
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.rank = {}
+
+    def find(self, type_name):
+        parent = self.parent
+        root = parent.get(type_name)
+        if root is None:
+            parent[type_name] = type_name
+            self.rank[type_name] = 0
+            return type_name
+        while parent[root] != root:
+            root = parent[root]
+        while parent[type_name] != root:
+            parent[type_name], type_name = root, parent[type_name]
+        return root
+
+    def union(self, t0, t1):
+        """
+        Merges the classes of t0 and t1, and returns the root of the result.
+        """
+        r0 = self.find(t0)
+        r1 = self.find(t1)
+        if r0 == r1:
+            return r0
+        if self.rank[r0] < self.rank[r1]:
+            r0, r1 = r1, r0
+        self.parent[r1] = r0
+        if self.rank[r0] == self.rank[r1]:
+            self.rank[r0] += 1
+        return r0
+
+    def sets(self):
+        """
+        Maps each type name to the set of type names in its class. All the
+        members of a class share the same set.
+        """
+        roots = {type_name: self.find(type_name) for type_name in self.parent}
+        members = {}
+        for type_name, root in roots.items():
+            members.setdefault(root, set()).add(type_name)
+        return {type_name: members[root] for type_name, root in roots.items()}
+
 
 def name_sets(sets):
     """
@@ -77,26 +140,110 @@ def name_sets(sets):
         [<class 'int'>, <class 'bool'>]
     """
     def canonicalize(s):
-        aux = set(s)
-        for e in aux:
-            if not isinstance(e, type):
-                s.remove(e)
-        if len(s) == 0 or len(s) > 1:
+        types = [e for e in s if isinstance(e, type)]
+        if len(types) != 1:
             sys.exit("Type error")
+        return types[0]
+
+    names = {}
+    type_names = {}
+    for v, type_set in sets.items():
+        key = id(type_set)
+        if key not in names:
+            names[key] = canonicalize(type_set)
+        type_names[v] = names[key]
+    return type_names
+
+
+class IncrementalUnifier(UnionFind):
+    """
+    This class unifies constraints as they arrive, e.g., from the generator
+    of CtrGenVisitor, so that the constraints never need to be in memory at
+    the same time: its memory grows with the number of distinct type names,
+    not with the number of constraints. Arrow types are unified by their
+    parts: each class keeps at most one arrow type, and merging two classes
+    with arrows also merges their domains and their images.
+
+    Example:
+        >>> u = IncrementalUnifier()
+        >>> u.add('f', ArrowType('a', 'b'))
+        >>> u.add('f', ArrowType(type(1), type(True)))
+        >>> u.find('a') == u.find(type(1)), u.find('b') == u.find(type(True))
+        (True, True)
+        >>> u.type_names()['f'] == ArrowType(type(1), type(True))
+        True
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.arrows = {}
+
+    def add(self, t0, t1):
+        if not self.arrows and not isinstance(t0, ArrowType) and not isinstance(t1, ArrowType):
+            if t0 != t1:
+                self.union(t0, t1)
+            return
+        pending = [(t0, t1)]
+        while pending:
+            t0, t1 = pending.pop()
+            if t0 == t1:
+                continue
+            for type_name in (t0, t1):
+                if isinstance(type_name, ArrowType) and type_name not in self.parent:
+                    self.arrows[type_name] = type_name
+            r0 = self.find(t0)
+            r1 = self.find(t1)
+            if r0 == r1:
+                continue
+            a0 = self.arrows.pop(r0, None)
+            a1 = self.arrows.pop(r1, None)
+            root = self.union(r0, r1)
+            if a0 is not None and a1 is not None:
+                pending.append((a0.domain, a1.domain))
+                pending.append((a0.image, a1.image))
+            if a0 is not None or a1 is not None:
+                self.arrows[root] = a1 if a0 is None else a0
 
-    for type_set in sets.values():
-        canonicalize(type_set)
-    return {v: list(e)[0] for v, e in sets.items()}
+    def type_names(self):
+        """
+        Maps each type name to its type, like name_sets: a type, such as
+        type(1), or an arrow of types. The program stops with 'Type error' if
+        a class has no type, more than one type, or a type that contains
+        itself.
+        """
+        types = {}
+        for type_name in self.parent:
+            if isinstance(type_name, type):
+                types.setdefault(self.find(type_name), []).append(type_name)
+        names = {}
+        visiting = set()
 
+        def canonicalize(type_name):
+            root = self.find(type_name)
+            if root in names:
+                return names[root]
+            arrow = self.arrows.get(root)
+            candidates = types.get(root, [])
+            if root in visiting or len(candidates) + (arrow is not None) != 1:
+                sys.exit("Type error")
+            if arrow is None:
+                names[root] = candidates[0]
+            else:
+                visiting.add(root)
+                names[root] = ArrowType(canonicalize(arrow.domain), canonicalize(arrow.image))
+                visiting.remove(root)
+            return names[root]
 
+        return {type_name: canonicalize(type_name) for type_name in self.parent}
 
 
 def infer_types(expression):
     """
-    This method maps all the program variables to type names. We have
-    implemented this method for you. This implementation might help you to
-    understand how the other two methods, unify and name_sets are meant to
-    work.
+    This method maps all the program variables to type names. The
+    constraints of the expression go from the generator of CtrGenVisitor
+    into an IncrementalUnifier, one at a time, so the list of constraints
+    is never built. The result is the same as unifying the list with unify,
+    and naming its classes with name_sets, plus the types of functions.
 
     Example:
         >>> e = Let('v', Num(42), Var('v'))
@@ -117,6 +264,7 @@ def infer_types(expression):
         [<class 'int'>, <class 'bool'>, <class 'int'>]
     """
     ev = CtrGenVisitor()
-    constraints = list(expression.accept(ev, ev.fresh_type_var()))
-    type_sets = unify(constraints, {})
-    return name_sets(type_sets)
\ No newline at end of file
+    unifier = IncrementalUnifier()
+    for t0, t1 in expression.accept(ev, ev.fresh_type_var()):
+        unifier.add(t0, t1)
+    return unifier.type_names()
\ No newline at end of file
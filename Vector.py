@@ -0,0 +1,125 @@
+"""
+This file implements a batched interpreter of Asm programs, which evaluates
+the same program over many environments at once. Every register holds a
+NumPy vector of 64-bit integers, with one lane per environment (a row of
+the batch), and every instruction runs once, over all the lanes:
+
+    * add, sub, mul, xor, and, and their immediate forms are ufuncs.
+    * div is np.floor_divide, which rounds towards negative infinity, like
+      the operator // of Python. Dividing by zero in any lane raises
+      ZeroDivisionError, like the scalar interpreter.
+    * slt and slti are vectorized comparisons, converted to 0/1 integers.
+    * sll, slli and srai are shifts; srai is arithmetic on int64.
+
+Only straight-line programs can be batched: every lane of a program with
+branches could follow a different path. Values wrap around at 64 bits, so
+results match Program.eval in the lanes where no intermediate value
+overflows int64. This file needs NumPy.
+
+This file uses doctests. To test it, run "python3 -m doctest Vector.py".
+"""
+
+import sys
+
+import numpy as np
+
+import Asm as AsmModule
+
+
+def vector_div(a, b):
+    if not np.all(b):
+        raise ZeroDivisionError("integer division by zero")
+    return np.floor_divide(a, b)
+
+
+def vector_slt(a, b):
+    return np.less(a, b).astype(np.int64)
+
+
+def vector_shift(shift):
+    def apply(a, b):
+        if np.any(np.asarray(b) < 0):
+            raise ValueError("negative shift count")
+        return shift(a, b)
+    return apply
+
+
+OPERATIONS = {
+    "add": np.add, "addi": np.add,
+    "mul": np.multiply,
+    "sub": np.subtract,
+    "xor": np.bitwise_xor, "xori": np.bitwise_xor,
+    "div": vector_div,
+    "slt": vector_slt, "slti": vector_slt,
+    "sll": vector_shift(np.left_shift), "slli": vector_shift(np.left_shift),
+    "srai": vector_shift(np.right_shift),
+    "and": np.bitwise_and, "andi": np.bitwise_and,
+}
+
+
+class VectorProgram:
+    """
+    A straight-line program that runs over batches of environments.
+
+    Example:
+        >>> insts = [AsmModule.Slt("t", "a", "b"), AsmModule.Div("q", "a", "b")]
+        >>> vp = VectorProgram(AsmModule.Program({}, insts))
+        >>> regs = vp.eval({"a": [7, -7, 2], "b": [2, 2, 3]})
+        >>> regs["t"].tolist(), regs["q"].tolist()
+        ([0, 1, 1], [3, -4, 0])
+    """
+
+    def __init__(self, prog):
+        self.code = []
+        for inst in prog.get_insts():
+            opcode = inst.get_opcode()
+            if opcode not in OPERATIONS:
+                sys.exit(f"Vector error: cannot batch '{opcode}'")
+            if isinstance(inst, AsmModule.BinOpImm):
+                self.code.append((OPERATIONS[opcode], inst.rd, inst.rs1, None, np.int64(inst.imm)))
+            else:
+                self.code.append((OPERATIONS[opcode], inst.rd, inst.rs1, inst.rs2, None))
+
+    def eval(self, inputs, lanes=None):
+        """
+        Runs the program over the inputs, a dictionary that maps names to
+        sequences with one value per lane, or to scalars, which are the same
+        in all lanes. If 'lanes' is not given, it is the length of the
+        sequences, or 1 if all the inputs are scalars. Returns a dictionary
+        that maps each register to a vector with its values. Reading a
+        register that has no value exits with a "Def error", like
+        Program.eval.
+
+        Example:
+            >>> p = AsmModule.Program({}, [AsmModule.Addi("b", "a", 1)])
+            >>> VectorProgram(p).eval({"a": 3}, lanes=2)["b"].tolist()
+            [4, 4]
+        """
+        if lanes is None:
+            sizes = [len(value) for value in inputs.values() if np.ndim(value) == 1]
+            lanes = max(sizes, default=1)
+        regs = {"x0": np.zeros(lanes, dtype=np.int64)}
+        for name, value in inputs.items():
+            regs[name] = np.broadcast_to(np.asarray(value, dtype=np.int64), (lanes,))
+        for operation, rd, rs1, rs2, imm in self.code:
+            if rs1 not in regs or (rs2 is not None and rs2 not in regs):
+                sys.exit("Def error")
+            regs[rd] = operation(regs[rs1], regs[rs2] if rs2 is not None else imm)
+        return regs
+
+
+def run_batch(prog, envs):
+    """
+    Evaluates the program in each environment of the list 'envs', and returns
+    a dictionary that maps each register to the vector of its values, one
+    per environment. All the environments must define the same names.
+
+    Example:
+        >>> envs = [{"a": 2, "b": 3}, {"a": 5, "b": 1}, {"a": -4, "b": -2}]
+        >>> regs = run_batch(AsmModule.Program({}, [AsmModule.Mul("c", "a", "b")]), envs)
+        >>> regs["c"].tolist()
+        [6, 5, 8]
+    """
+    names = envs[0].keys() if envs else []
+    inputs = {name: [env[name] for env in envs] for name in names}
+    return VectorProgram(prog).eval(inputs, len(envs))
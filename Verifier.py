@@ -0,0 +1,257 @@
+"""
+This file implements a static verifier of Asm programs, plus an interpreter
+that trusts its verdict. Program.get_val checks, on every read, that the
+register has a value, and exits with "Def error" otherwise. The verifier
+proves, once, that no execution of a program can read a register without a
+value, given the names of the inputs that the environment provides. It does
+so with a forward data-flow analysis over the basic blocks of the program:
+a register is defined at a point if it is defined along every path that
+reaches that point (a "must" analysis). Unreachable code is not checked.
+
+Programs that pass the verifier can run in UncheckedProgram, which links
+them (see Linker.py), and runs them with 'execute', an interpreter of
+linked code without the checks of Linker.execute: reads are plain list
+indexing, equality branches do not look for registers without a value,
+and no TypeError is trapped. Programs that fail the verifier, or that are
+given an environment without the inputs that the verifier assumed, keep
+running in Program.eval, with all its checks.
+
+This file uses doctests. To test it, run "python3 -m doctest Verifier.py".
+"""
+
+import Asm as AsmModule
+import Linker
+from Linker import ADD, ADDI, MUL, SUB, XOR, XORI, DIV, SLT, SLTI
+from Linker import SLL, SLLI, SRAI, AND, ANDI, BEQ, BNE, BLT, JAL, JMP
+from Optimizer import defined_reg, used_regs
+
+
+def basic_blocks(prog):
+    """
+    Splits the program into basic blocks. Returns a list of pairs (start,
+    end), plus, for each block, the indices of its successors. The end of the
+    program is not a block. Labels must exist.
+
+    Example:
+        >>> p = AsmModule.Program({}, [AsmModule.Beq("a", "x0", "L1"),
+        ...                            AsmModule.Addi("b", "x0", 1)])
+        >>> p.add_label("L1")
+        >>> p.add_inst(AsmModule.Addi("c", "b", 1))
+        >>> basic_blocks(p)
+        ([(0, 1), (1, 2), (2, 3)], [[1, 2], [2], []])
+    """
+    insts = prog.get_insts()
+    labels = prog.get_labels()
+    leaders = {0} | {pc for pc in labels.values() if pc < len(insts)}
+    for pc, inst in enumerate(insts):
+        if hasattr(inst, "lab") and pc + 1 < len(insts):
+            leaders.add(pc + 1)
+    starts = sorted(pc for pc in leaders if pc < len(insts))
+    ranges = list(zip(starts, starts[1:] + [len(insts)]))
+    index = {start: i for i, (start, _) in enumerate(ranges)}
+    succs = []
+    for start, end in ranges:
+        last = insts[end - 1]
+        targets = []
+        if not isinstance(last, AsmModule.Jal):
+            targets.append(end)
+        if hasattr(last, "lab"):
+            targets.append(labels[last.lab])
+        succs.append(sorted({index[pc] for pc in targets if pc in index}))
+    return ranges, succs
+
+
+def undefined_reads(prog, inputs=None):
+    """
+    Returns the reads that might find their register without a value, as a
+    list of pairs (position, register), in the order of the instructions.
+    The inputs are the names that the environment will define; by default,
+    the names in the environment of the program. Branches and jumps to
+    labels that do not exist count as reads of their label.
+
+    Example:
+        >>> p = AsmModule.Program({"a": 1}, [AsmModule.Beq("a", "x0", "L1"),
+        ...                                  AsmModule.Addi("b", "x0", 1)])
+        >>> p.add_label("L1")
+        >>> p.add_inst(AsmModule.Add("c", "b", "a"))
+        >>> undefined_reads(p)
+        [(2, 'b')]
+        >>> undefined_reads(p, ["a", "b"])
+        []
+    """
+    insts = prog.get_insts()
+    labels = prog.get_labels()
+    missing = [(pc, inst.lab) for pc, inst in enumerate(insts)
+               if hasattr(inst, "lab") and inst.lab not in labels]
+    if missing or not insts:
+        return missing
+    if inputs is None:
+        inputs = prog.get_env()
+    ranges, succs = basic_blocks(prog)
+    gens = [{defined_reg(insts[pc]) for pc in range(start, end)} - {None}
+            for start, end in ranges]
+    entries = [None] * len(ranges)
+    entries[0] = frozenset(inputs) | {"x0"}
+    worklist = [0]
+    while worklist:
+        block = worklist.pop()
+        exit_set = entries[block] | gens[block]
+        for succ in succs[block]:
+            if entries[succ] is None:
+                entries[succ] = exit_set
+            elif entries[succ] <= exit_set:
+                continue
+            else:
+                entries[succ] = entries[succ] & exit_set
+            worklist.append(succ)
+    result = []
+    for block, (start, end) in enumerate(ranges):
+        if entries[block] is None:
+            continue
+        defined = set(entries[block])
+        for pc in range(start, end):
+            for reg in used_regs(insts[pc]):
+                if reg not in defined:
+                    result.append((pc, reg))
+            defined.add(defined_reg(insts[pc]))
+    return sorted(result)
+
+
+def verify(prog, inputs=None):
+    """
+    Tells if no read of the program can find its register without a value:
+
+    >>> verify(AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", 1)]))
+    True
+    >>> verify(AsmModule.Program({}, [AsmModule.Addi("b", "a", 1)]))
+    False
+    """
+    return not undefined_reads(prog, inputs)
+
+
+def execute(code, regs):
+    """
+    Runs linked code (see Linker.py) like Linker.execute, but without any of
+    its checks: equality branches do not look for registers without a
+    value, and a TypeError is not turned into a "Def error". Thus, it must
+    only run the code of verified programs, over all of their inputs.
+
+    Example:
+        >>> execute(((Linker.ADDI, 1, 0, 3), (Linker.ADD, 1, 1, 1)), [0, None])
+        2
+    """
+    size = len(code)
+    pc = 0
+    while pc < size:
+        op, a, b, c = code[pc]
+        pc += 1
+        if op == ADD:
+            regs[a] = regs[b] + regs[c]
+        elif op == ADDI:
+            regs[a] = regs[b] + c
+        elif op == SUB:
+            regs[a] = regs[b] - regs[c]
+        elif op == MUL:
+            regs[a] = regs[b] * regs[c]
+        elif op == SLTI:
+            regs[a] = 1 if regs[b] < c else 0
+        elif op == XOR:
+            regs[a] = regs[b] ^ regs[c]
+        elif op == SLT:
+            regs[a] = 1 if regs[b] < regs[c] else 0
+        elif op == DIV:
+            regs[a] = regs[b] // regs[c]
+        elif op == XORI:
+            regs[a] = regs[b] ^ c
+        elif op == BEQ:
+            if regs[a] == regs[b]:
+                pc = c
+        elif op == BNE:
+            if regs[a] != regs[b]:
+                pc = c
+        elif op == BLT:
+            if regs[a] < regs[b]:
+                pc = c
+        elif op == JMP:
+            pc = b
+        elif op == JAL:
+            regs[a] = pc
+            pc = b
+        elif op == SLLI:
+            regs[a] = regs[b] << c
+        elif op == SRAI:
+            regs[a] = regs[b] >> c
+        elif op == ANDI:
+            regs[a] = regs[b] & c
+        elif op == SLL:
+            regs[a] = regs[b] << regs[c]
+        elif op == AND:
+            regs[a] = regs[b] & regs[c]
+    return pc
+
+
+class UncheckedProgram:
+    """
+    The linked form (see Linker.py) of a verified program. Creating an
+    UncheckedProgram runs the verifier; the attribute 'verified' tells if it
+    succeeded. Programs with loads and stores are not verified, as linked
+    code has no data memory.
+
+    Example:
+        >>> p = AsmModule.Program({"n": 5}, [AsmModule.Addi("s", "x0", 0)])
+        >>> p.add_label("loop")
+        >>> p.add_inst(AsmModule.Add("s", "s", "n"))
+        >>> p.add_inst(AsmModule.Addi("n", "n", -1))
+        >>> p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+        >>> up = UncheckedProgram(p)
+        >>> up.verified, sorted(up.inputs)
+        (True, ['n', 'x0'])
+        >>> up.eval(p)
+        >>> p.get_val("s")
+        15
+    """
+
+    def __init__(self, prog, inputs=None):
+        if inputs is None:
+            inputs = prog.get_env()
+        self.inputs = frozenset(inputs) | {"x0"}
+        self.verified = verify(prog, self.inputs) and Linker.linkable(prog)
+        self.linked = Linker.LinkedProgram(prog) if self.verified else None
+
+    def eval(self, prog):
+        """
+        Evaluates a program with the same instructions, like Program.eval,
+        with the unchecked 'execute'. If the program was not verified, if the
+        environment of 'prog' lacks some of the inputs that the verifier
+        assumed, or if the program does not start from its first
+        instruction, it runs in Program.eval instead, with its checks:
+
+        >>> up = UncheckedProgram(AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", 1)]))
+        >>> q = AsmModule.Program({}, [AsmModule.Addi("b", "a", 1)])
+        >>> up.eval(q)
+        Traceback (most recent call last):
+        ...
+        SystemExit: Def error
+        """
+        if not self.verified or prog.pc != 0 or not self.inputs <= prog.get_env().keys():
+            prog.eval()
+            return
+        linked = self.linked
+        linked.load(prog)
+        try:
+            execute(linked.code, linked.regs)
+        finally:
+            linked.store(prog)
+
+
+def run(prog):
+    """
+    Verifies the program, and evaluates it without checks if the verifier
+    succeeds, or with Program.eval otherwise. To run the same instructions
+    many times, create an UncheckedProgram once, and call its method eval.
+
+    Example:
+        >>> AsmModule.distance_with_acceleration(3, 4, 5, run)
+        65
+    """
+    UncheckedProgram(prog).eval(prog)
@@ -1,6 +1,7 @@
 import sys
 from abc import ABC, abstractmethod
 from Expression import *
+import Expression as ExpressionModule
 import Asm as AsmModule
 
 
@@ -46,6 +47,10 @@ class Visitor(ABC):
     def visit_div(self, exp, arg):
         pass
 
+    @abstractmethod
+    def visit_mod(self, exp, arg):
+        pass
+
     @abstractmethod
     def visit_leq(self, exp, arg):
         pass
@@ -66,15 +71,162 @@ class Visitor(ABC):
     def visit_let(self, exp, arg):
         pass
 
+    @abstractmethod
+    def visit_and(self, exp, arg):
+        pass
+
+    @abstractmethod
+    def visit_or(self, exp, arg):
+        pass
+
+    @abstractmethod
+    def visit_ifThenElse(self, exp, arg):
+        pass
+
+    @abstractmethod
+    def visit_fn(self, exp, arg):
+        pass
+
+    @abstractmethod
+    def visit_app(self, exp, arg):
+        pass
+
+
+class TransformVisitor(Visitor):
+    """
+    This visitor rebuilds the expression that it visits. Each visit method
+    returns an expression equivalent to the one it visits, whose
+    sub-expressions have been transformed by the same visitor. Leaves are
+    shared, not copied. New nodes are built with type(exp), so that this
+    module does not depend on the names that it imports from Expression.
+    Program transformations extend this class, and override only the
+    methods of the expressions that they rewrite.
+
+    Example:
+        >>> e = Let('v', Num(1), Add(Var('v'), Num(2)))
+        >>> t = e.accept(TransformVisitor(), None)
+        >>> t is e, type(t.exp_body).__name__, t.exp_body.right is e.exp_body.right
+        (False, 'Add', True)
+    """
+
+    def visit_var(self, exp, arg):
+        return exp
+
+    def visit_bln(self, exp, arg):
+        return exp
+
+    def visit_num(self, exp, arg):
+        return exp
+
+    def visit_binary(self, exp, arg):
+        left = exp.left.accept(self, arg)
+        right = exp.right.accept(self, arg)
+        return type(exp)(left, right)
+
+    def visit_unary(self, exp, arg):
+        return type(exp)(exp.exp.accept(self, arg))
+
+    def visit_eql(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_add(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_sub(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_mul(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_div(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_mod(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_leq(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_lth(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_and(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_or(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_neg(self, exp, arg):
+        return self.visit_unary(exp, arg)
+
+    def visit_not(self, exp, arg):
+        return self.visit_unary(exp, arg)
+
+    def visit_let(self, exp, arg):
+        exp_def = exp.exp_def.accept(self, arg)
+        exp_body = exp.exp_body.accept(self, arg)
+        return type(exp)(exp.identifier, exp_def, exp_body)
+
+    def visit_ifThenElse(self, exp, arg):
+        cond = exp.cond.accept(self, arg)
+        e0 = exp.e0.accept(self, arg)
+        e1 = exp.e1.accept(self, arg)
+        return type(exp)(cond, e0, e1)
+
+    def visit_fn(self, exp, arg):
+        return type(exp)(exp.formal, exp.tp_var, exp.body.accept(self, arg))
+
+    def visit_app(self, exp, arg):
+        function = exp.function.accept(self, arg)
+        actual = exp.actual.accept(self, arg)
+        return type(exp)(function, actual)
+
 
 class GenVisitor(Visitor):
+    """
+    The GenVisitor translates expressions into sequences of Asm instructions.
+    Each visit method adds instructions to the program that it receives as
+    argument, and returns the name of the register that holds the value of the
+    expression. Conditionals and boolean connectives are translated with
+    branches, so that only the sub-expressions that are needed are evaluated:
+
+        >>> e = And(Lth(Var('x'), Num(0)), Lth(Num(0), Div(Num(1), Var('x'))))
+        >>> prog = AsmModule.Program({'x': 0}, [])
+        >>> gen = GenVisitor()
+        >>> var_answer = e.accept(gen, prog)
+        >>> prog.eval()
+        >>> prog.get_val(var_answer)
+        0
+    """
+
     def __init__(self):
         self.label_counter = 0
+        self.jump_counter = 0
 
     def new_var(self):
         self.label_counter += 1
         return f"v{self.label_counter}"
 
+    def new_label(self):
+        self.jump_counter += 1
+        return f"L{self.jump_counter}"
+
+    def release(self, *regs):
+        """
+        Tells the code generator that the registers will not be read anymore.
+        This generator never reuses registers, so it ignores this information.
+        """
+        pass
+
+    def gen_operands(self, exp, prog):
+        """
+        Generates code for both operands of a binary expression, and returns
+        the registers that hold their values. The left operand comes first.
+        """
+        lhs = exp.left.accept(self, prog)
+        rhs = exp.right.accept(self, prog)
+        return lhs, rhs
+
     def visit_var(self, exp, prog):
         return exp.identifier
 
@@ -93,76 +245,423 @@ class GenVisitor(Visitor):
         delta = self.new_var()
         cond1 = self.new_var()
         cond2 = self.new_var()
-        equal_reg = self.new_var()
 
         prog.add_inst(AsmModule.Sub(delta, lhs_reg, rhs_reg))
         prog.add_inst(AsmModule.Slti(cond1, delta, 1))
         prog.add_inst(AsmModule.Slti(cond2, delta, 0))
+        self.release(delta, cond1, cond2)
+        equal_reg = self.new_var()
         prog.add_inst(AsmModule.Xor(equal_reg, cond1, cond2))
         return equal_reg
 
     def visit_eql(self, exp, prog):
-        lhs = exp.left.accept(self, prog)
-        rhs = exp.right.accept(self, prog)
+        lhs, rhs = self.gen_operands(exp, prog)
+        self.release(lhs, rhs)
         return self.compute_equality(lhs, rhs, prog)
 
     def visit_add(self, exp, prog):
-        lhs = exp.left.accept(self, prog)
-        rhs = exp.right.accept(self, prog)
+        lhs, rhs = self.gen_operands(exp, prog)
+        self.release(lhs, rhs)
         result_reg = self.new_var()
         prog.add_inst(AsmModule.Add(result_reg, lhs, rhs))
         return result_reg
 
     def visit_sub(self, exp, prog):
-        lhs = exp.left.accept(self, prog)
-        rhs = exp.right.accept(self, prog)
+        lhs, rhs = self.gen_operands(exp, prog)
+        self.release(lhs, rhs)
         result_reg = self.new_var()
         prog.add_inst(AsmModule.Sub(result_reg, lhs, rhs))
         return result_reg
 
     def visit_mul(self, exp, prog):
-        lhs = exp.left.accept(self, prog)
-        rhs = exp.right.accept(self, prog)
+        lhs, rhs = self.gen_operands(exp, prog)
+        self.release(lhs, rhs)
         result_reg = self.new_var()
         prog.add_inst(AsmModule.Mul(result_reg, lhs, rhs))
         return result_reg
 
     def visit_div(self, exp, prog):
-        lhs = exp.left.accept(self, prog)
-        rhs = exp.right.accept(self, prog)
+        lhs, rhs = self.gen_operands(exp, prog)
+        self.release(lhs, rhs)
         result_reg = self.new_var()
         prog.add_inst(AsmModule.Div(result_reg, lhs, rhs))
         return result_reg
 
+    def visit_mod(self, exp, prog):
+        """
+        The remainder is computed as lhs - (lhs div rhs) * rhs, which follows
+        the floor semantics of the Div instruction:
+
+            >>> e = Mod(Num(-7), Num(4))
+            >>> prog = AsmModule.Program({}, [])
+            >>> gen = GenVisitor()
+            >>> var_answer = e.accept(gen, prog)
+            >>> prog.eval()
+            >>> prog.get_val(var_answer)
+            1
+        """
+        lhs, rhs = self.gen_operands(exp, prog)
+        quotient_reg = self.new_var()
+        product_reg = self.new_var()
+        result_reg = self.new_var()
+        prog.add_inst(AsmModule.Div(quotient_reg, lhs, rhs))
+        prog.add_inst(AsmModule.Mul(product_reg, quotient_reg, rhs))
+        prog.add_inst(AsmModule.Sub(result_reg, lhs, product_reg))
+        self.release(lhs, rhs, quotient_reg, product_reg)
+        return result_reg
+
     def visit_lth(self, exp, prog):
-        lhs = exp.left.accept(self, prog)
-        rhs = exp.right.accept(self, prog)
+        lhs, rhs = self.gen_operands(exp, prog)
+        self.release(lhs, rhs)
         result_reg = self.new_var()
         prog.add_inst(AsmModule.Slt(result_reg, lhs, rhs))
         return result_reg
 
     def visit_leq(self, exp, prog):
-        lhs = exp.left.accept(self, prog)
-        rhs = exp.right.accept(self, prog)
+        lhs, rhs = self.gen_operands(exp, prog)
         less_reg = self.new_var()
         eq_reg = self.compute_equality(lhs, rhs, prog)
         prog.add_inst(AsmModule.Slt(less_reg, lhs, rhs))
+        self.release(lhs, rhs, less_reg, eq_reg)
         leq_reg = self.new_var()
         prog.add_inst(AsmModule.Add(leq_reg, less_reg, eq_reg))
         return leq_reg
 
     def visit_neg(self, exp, prog):
         value_reg = exp.exp.accept(self, prog)
+        self.release(value_reg)
         result_reg = self.new_var()
         prog.add_inst(AsmModule.Sub(result_reg, "x0", value_reg))
         return result_reg
 
     def visit_not(self, exp, prog):
         value_reg = exp.exp.accept(self, prog)
+        self.release(value_reg)
         return self.compute_equality(value_reg, "x0", prog)
 
     def visit_let(self, exp, prog):
         init_value = exp.exp_def.accept(self, prog)
         prog.add_inst(AsmModule.Add(exp.identifier, init_value, "x0"))
+        self.release(init_value)
         body_value = exp.exp_body.accept(self, prog)
-        return body_value
\ No newline at end of file
+        return body_value
+
+    def visit_and(self, exp, prog):
+        """
+        Example:
+            >>> e = And(Bln(True), Lth(Num(2), Num(3)))
+            >>> prog = AsmModule.Program({}, [])
+            >>> gen = GenVisitor()
+            >>> var_answer = e.accept(gen, prog)
+            >>> prog.eval()
+            >>> prog.get_val(var_answer)
+            1
+        """
+        result_reg = self.new_var()
+        end_label = self.new_label()
+        lhs = exp.left.accept(self, prog)
+        prog.add_inst(AsmModule.Add(result_reg, lhs, "x0"))
+        self.release(lhs)
+        prog.add_inst(AsmModule.Beq(result_reg, "x0", end_label))
+        rhs = exp.right.accept(self, prog)
+        prog.add_inst(AsmModule.Add(result_reg, rhs, "x0"))
+        self.release(rhs)
+        prog.add_label(end_label)
+        return result_reg
+
+    def visit_or(self, exp, prog):
+        """
+        Example:
+            >>> e = Or(Bln(False), Lth(Num(3), Num(2)))
+            >>> prog = AsmModule.Program({}, [])
+            >>> gen = GenVisitor()
+            >>> var_answer = e.accept(gen, prog)
+            >>> prog.eval()
+            >>> prog.get_val(var_answer)
+            0
+        """
+        result_reg = self.new_var()
+        end_label = self.new_label()
+        lhs = exp.left.accept(self, prog)
+        prog.add_inst(AsmModule.Add(result_reg, lhs, "x0"))
+        self.release(lhs)
+        prog.add_inst(AsmModule.Bne(result_reg, "x0", end_label))
+        rhs = exp.right.accept(self, prog)
+        prog.add_inst(AsmModule.Add(result_reg, rhs, "x0"))
+        self.release(rhs)
+        prog.add_label(end_label)
+        return result_reg
+
+    def visit_ifThenElse(self, exp, prog):
+        """
+        Example:
+            >>> e = IfThenElse(Lth(Var('x'), Num(3)), Num(1), Div(Num(1), Var('x')))
+            >>> prog = AsmModule.Program({'x': 0}, [])
+            >>> gen = GenVisitor()
+            >>> var_answer = e.accept(gen, prog)
+            >>> prog.eval()
+            >>> prog.get_val(var_answer)
+            1
+        """
+        result_reg = self.new_var()
+        else_label = self.new_label()
+        end_label = self.new_label()
+        cond = exp.cond.accept(self, prog)
+        prog.add_inst(AsmModule.Beq(cond, "x0", else_label))
+        self.release(cond)
+        then_value = exp.e0.accept(self, prog)
+        prog.add_inst(AsmModule.Add(result_reg, then_value, "x0"))
+        self.release(then_value)
+        prog.add_inst(AsmModule.Jal("x0", end_label))
+        prog.add_label(else_label)
+        else_value = exp.e1.accept(self, prog)
+        prog.add_inst(AsmModule.Add(result_reg, else_value, "x0"))
+        self.release(else_value)
+        prog.add_label(end_label)
+        return result_reg
+
+    def visit_fn(self, exp, prog):
+        sys.exit("Code generation error: functions must be inlined")
+
+    def visit_app(self, exp, prog):
+        sys.exit("Code generation error: functions must be inlined")
+
+
+class NeedVisitor(Visitor):
+    """
+    This visitor labels each expression with the number of temporary
+    registers that the code generator needs to evaluate it (its Sethi-Ullman
+    number). Variables already live in registers, so they need none. A binary
+    expression needs as many registers as its heavier operand, plus one if
+    both operands are equally heavy. Labels are memoized, so each node is
+    labeled only once.
+
+    Example:
+        >>> nv = NeedVisitor()
+        >>> [nv.label(e) for e in [Var('a'), Num(1), Add(Num(1), Num(2))]]
+        [0, 1, 2]
+        >>> nv.label(Add(Num(1), Add(Num(2), Add(Num(3), Num(4)))))
+        2
+    """
+
+    def __init__(self):
+        self.labels = {}
+
+    def label(self, exp):
+        key = id(exp)
+        if key not in self.labels:
+            # Keeping the node alive ensures that its id is not reused.
+            self.labels[key] = (exp, exp.accept(self, None))
+        return self.labels[key][1]
+
+    def visit_var(self, exp, arg):
+        return 0
+
+    def visit_bln(self, exp, arg):
+        return 1
+
+    def visit_num(self, exp, arg):
+        return 1
+
+    def visit_binary(self, exp, arg):
+        left = self.label(exp.left)
+        right = self.label(exp.right)
+        return left + 1 if left == right else max(left, right)
+
+    def visit_eql(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_add(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_sub(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_mul(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_div(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_mod(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_leq(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_lth(self, exp, arg):
+        return self.visit_binary(exp, arg)
+
+    def visit_and(self, exp, arg):
+        return 1 + max(self.label(exp.left), self.label(exp.right))
+
+    def visit_or(self, exp, arg):
+        return 1 + max(self.label(exp.left), self.label(exp.right))
+
+    def visit_neg(self, exp, arg):
+        return max(self.label(exp.exp), 1)
+
+    def visit_not(self, exp, arg):
+        return max(self.label(exp.exp), 1)
+
+    def visit_let(self, exp, arg):
+        return max(self.label(exp.exp_def), self.label(exp.exp_body))
+
+    def visit_ifThenElse(self, exp, arg):
+        cond = self.label(exp.cond)
+        return 1 + max(cond, self.label(exp.e0), self.label(exp.e1))
+
+    def visit_fn(self, exp, arg):
+        return 0
+
+    def visit_app(self, exp, arg):
+        return 0
+
+
+class SethiUllmanGenVisitor(GenVisitor):
+    """
+    This code generator evaluates first the operand of each binary expression
+    that needs more registers, following the labels of NeedVisitor, and reuses
+    the registers of temporaries that are no longer read. Expressions have no
+    side effects, other than stopping the program, so the order in which
+    operands are evaluated does not change the result. Registers are reused,
+    so the optimizations that expect temporaries to be defined only once
+    (such as Optimizer.strength_reduce) should run on code produced by
+    GenVisitor instead.
+
+    Example:
+        >>> e = Add(Num(1), Add(Num(2), Add(Num(3), Num(4))))
+        >>> prog = AsmModule.Program({}, [])
+        >>> var_answer = e.accept(SethiUllmanGenVisitor(), prog)
+        >>> prog.eval()
+        >>> prog.get_val(var_answer)
+        10
+        >>> prog.print_env()
+        v1: 1
+        v2: 10
+        x0: 0
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.needs = NeedVisitor()
+        self.free_regs = []
+        self.in_use = set()
+
+    def new_var(self):
+        reg = self.free_regs.pop() if self.free_regs else super().new_var()
+        self.in_use.add(reg)
+        return reg
+
+    def release(self, *regs):
+        for reg in regs:
+            if reg in self.in_use:
+                self.in_use.remove(reg)
+                self.free_regs.append(reg)
+
+    def gen_operands(self, exp, prog):
+        if self.needs.label(exp.right) > self.needs.label(exp.left):
+            rhs = exp.right.accept(self, prog)
+            lhs = exp.left.accept(self, prog)
+            return lhs, rhs
+        return super().gen_operands(exp, prog)
+
+
+class CtrGenVisitor(Visitor):
+    """
+    This visitor generates the type constraints of an expression. Each visit
+    method receives the type variable of the expression, and is a generator
+    of pairs (t0, t1), meaning that the type names t0 and t1 denote the same
+    type. Type names are the names of program variables, fresh type
+    variables (TV_1, TV_2, ...), types, such as type(1), and arrow types.
+    Constraints are produced one at a time, so the caller can consume them
+    without keeping them all in memory:
+
+        >>> e = Let('v', Num(1), Lth(Var('v'), Num(2)))
+        >>> ev = CtrGenVisitor()
+        >>> for t0, t1 in e.accept(ev, ev.fresh_type_var()):
+        ...     print(getattr(t0, '__name__', t0), getattr(t1, '__name__', t1))
+        int v
+        bool TV_1
+        v int
+        int int
+    """
+
+    def __init__(self):
+        self.fresh_type_counter = 0
+
+    def fresh_type_var(self):
+        self.fresh_type_counter += 1
+        return f"TV_{self.fresh_type_counter}"
+
+    def visit_var(self, exp, type_var):
+        yield (exp.identifier, type_var)
+
+    def visit_bln(self, exp, type_var):
+        yield (type(True), type_var)
+
+    def visit_num(self, exp, type_var):
+        yield (type(1), type_var)
+
+    def visit_operands(self, exp, operand_type, type_var, result_type):
+        yield (result_type, type_var)
+        yield from exp.left.accept(self, operand_type)
+        yield from exp.right.accept(self, operand_type)
+
+    def visit_eql(self, exp, type_var):
+        return self.visit_operands(exp, self.fresh_type_var(), type_var, type(True))
+
+    def visit_add(self, exp, type_var):
+        return self.visit_operands(exp, type(1), type_var, type(1))
+
+    def visit_sub(self, exp, type_var):
+        return self.visit_operands(exp, type(1), type_var, type(1))
+
+    def visit_mul(self, exp, type_var):
+        return self.visit_operands(exp, type(1), type_var, type(1))
+
+    def visit_div(self, exp, type_var):
+        return self.visit_operands(exp, type(1), type_var, type(1))
+
+    def visit_mod(self, exp, type_var):
+        return self.visit_operands(exp, type(1), type_var, type(1))
+
+    def visit_leq(self, exp, type_var):
+        return self.visit_operands(exp, type(1), type_var, type(True))
+
+    def visit_lth(self, exp, type_var):
+        return self.visit_operands(exp, type(1), type_var, type(True))
+
+    def visit_and(self, exp, type_var):
+        return self.visit_operands(exp, type(True), type_var, type(True))
+
+    def visit_or(self, exp, type_var):
+        return self.visit_operands(exp, type(True), type_var, type(True))
+
+    def visit_neg(self, exp, type_var):
+        yield (type(1), type_var)
+        yield from exp.exp.accept(self, type(1))
+
+    def visit_not(self, exp, type_var):
+        yield (type(True), type_var)
+        yield from exp.exp.accept(self, type(True))
+
+    def visit_let(self, exp, type_var):
+        yield from exp.exp_def.accept(self, exp.identifier)
+        yield from exp.exp_body.accept(self, type_var)
+
+    def visit_ifThenElse(self, exp, type_var):
+        yield from exp.cond.accept(self, type(True))
+        yield from exp.e0.accept(self, type_var)
+        yield from exp.e1.accept(self, type_var)
+
+    def visit_fn(self, exp, type_var):
+        body_var = self.fresh_type_var()
+        yield (exp.formal, exp.tp_var)
+        yield (ExpressionModule.ArrowType(exp.tp_var, body_var), type_var)
+        yield from exp.body.accept(self, body_var)
+
+    def visit_app(self, exp, type_var):
+        actual_var = self.fresh_type_var()
+        yield from exp.function.accept(self, ExpressionModule.ArrowType(actual_var, type_var))
+        yield from exp.actual.accept(self, actual_var)
@@ -0,0 +1,103 @@
+import unittest
+import os
+import sys
+import tempfile
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor, SethiUllmanGenVisitor
+import Asm as AsmModule
+import Assembler
+import Sink
+
+
+def compile_source(source, env, gen_class=GenVisitor):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(gen_class(), prog)
+    return prog, reg
+
+
+class TestAssembler(unittest.TestCase):
+
+    sources = [
+        'x * y + 3 * x',
+        'if x < 3 then x * y div 2 else y mod 3',
+        'let k <- x * 4 + 1 in if k = 9 then k * y else k - y end',
+        'not (x = 2) or y <= 1 and 5 < x + y',
+    ]
+
+    def testRoundTrip(self):
+        rng = random.Random(8)
+        for source in self.sources:
+            for gen_class in [GenVisitor, SethiUllmanGenVisitor]:
+                prog, reg = compile_source(source, {}, gen_class)
+                text = Assembler.dumps(prog)
+                loaded = Assembler.loads(text)
+                self.assertEqual(Assembler.dumps(loaded), text)
+                self.assertEqual(loaded.get_labels(), prog.get_labels())
+                for _ in range(5):
+                    env = {'x': rng.randrange(-4, 8), 'y': rng.randrange(1, 8)}
+                    expected, _ = compile_source(source, env, gen_class)
+                    expected.eval()
+                    run = Assembler.loads(Assembler.dumps(expected), dict(env))
+                    run.eval()
+                    self.assertEqual(run.get_env(), expected.get_env())
+
+    def testEveryInstruction(self):
+        insts = [
+            AsmModule.Add('a', 'b', 'c'), AsmModule.Sub('a', 'b', 'c'),
+            AsmModule.Mul('a', 'b', 'c'), AsmModule.Div('a', 'b', 'c'),
+            AsmModule.Xor('a', 'b', 'c'), AsmModule.Slt('a', 'b', 'c'),
+            AsmModule.Sll('a', 'b', 'c'), AsmModule.And('a', 'b', 'c'),
+            AsmModule.Addi('a', 'b', -1), AsmModule.Xori('a', 'b', 2),
+            AsmModule.Slti('a', 'b', 3), AsmModule.Slli('a', 'b', 4),
+            AsmModule.Srai('a', 'b', 5), AsmModule.Andi('a', 'b', 6),
+            AsmModule.Lw('a', 'b', 8), AsmModule.Lb('a', 'b', -9),
+            AsmModule.Sw('a', 'b', 12), AsmModule.Sb('a', 'b', 13),
+            AsmModule.Beq('a', 'b', 'L1'), AsmModule.Bne('a', 'b', 'L1'),
+            AsmModule.Blt('a', 'b', 'L1'), AsmModule.Jal('ra', 'L1'),
+        ]
+        prog = AsmModule.Program({}, list(insts))
+        prog.add_label('L1')
+        loaded = Assembler.loads(Assembler.dumps(prog))
+        for inst, copy in zip(insts, loaded.get_insts()):
+            self.assertIs(type(copy), type(inst))
+            self.assertEqual(str(copy), str(inst))
+        self.assertEqual(len(loaded.get_insts()), len(insts))
+
+    def testFiles(self):
+        prog, reg = compile_source('if x < 3 then x * 5 else x - 1', {})
+        path = os.path.join(tempfile.mkdtemp(), 'program.s')
+        with open(path, 'w') as file:
+            Assembler.write(prog, file, buffer_lines=2)
+        with open(path) as file:
+            loaded = Assembler.read(file, {'x': 2})
+        os.remove(path)
+        loaded.eval()
+        self.assertEqual(loaded.get_val(reg), 10)
+
+    def testReadIntoSink(self):
+        prog, reg = compile_source('x * x + 1', {})
+        sink = Sink.PackedSink()
+        self.assertIsNone(Assembler.read(Assembler.dumps(prog).splitlines(), sink=sink))
+        self.assertEqual(sink.close().eval({'x': 4})[reg], 17)
+
+    def testBlankLinesAndSpaces(self):
+        prog = Assembler.loads('\n  a = addi   x0 5\n\nL1:\n  b = add a a  \n')
+        self.assertEqual(prog.get_labels(), {'L1': 1})
+        prog.eval()
+        self.assertEqual(prog.get_val('b'), 10)
+
+    def testErrors(self):
+        for text in ['a = nop b c', 'a = addi b c', 'beq a b', 'a addi b 1', 'sw a b lab']:
+            with self.assertRaises(SystemExit) as context:
+                Assembler.loads(text)
+            self.assertTrue(context.exception.code.startswith('Assembly error'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Code
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+def loop():
+    p = AsmModule.Program({'n': 0}, [AsmModule.Addi('s', 'x0', 0)])
+    p.add_label('loop')
+    p.add_inst(AsmModule.Add('s', 's', 'n'))
+    p.add_inst(AsmModule.Addi('n', 'n', -1))
+    p.add_inst(AsmModule.Blt('x0', 'n', 'loop'))
+    return p
+
+
+class TestCompiledCode(unittest.TestCase):
+
+    def testSameResults(self):
+        source = 'if x < 3 then x * x div 2 else x mod 3'
+        prog, _ = compile_source(source, {'x': 0})
+        code = Code.CompiledCode(prog)
+        for x in range(-2, 6):
+            plain, _ = compile_source(source, {'x': x})
+            plain.eval()
+            self.assertEqual(code.run({'x': x}), plain.get_env())
+
+    def testCodeIsImmutable(self):
+        code = Code.CompiledCode(loop())
+        self.assertIsInstance(code.code, tuple)
+        self.assertIsInstance(code.names, tuple)
+        with self.assertRaises(TypeError):
+            code.slots['s'] = 0
+
+    def testRunDoesNotModifyEnv(self):
+        code = Code.CompiledCode(loop())
+        env = {'n': 3}
+        self.assertEqual(code.run(env)['s'], 6)
+        self.assertEqual(env, {'n': 3})
+
+    def testRegistersAreReused(self):
+        code = Code.CompiledCode(loop())
+        for n in range(100):
+            code.run({'n': n})
+        self.assertEqual(code.pool.created, 1)
+
+    def testThreads(self):
+        code = Code.CompiledCode(loop())
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda n: code.run({'n': n})['s'], range(200)))
+        self.assertEqual(results, [n * (n + 1) // 2 if n > 0 else 0 for n in range(200)])
+        self.assertLessEqual(code.pool.created, 8)
+
+    def testAsyncTasks(self):
+        code = Code.CompiledCode(loop())
+
+        async def main():
+            return await asyncio.gather(*[code.run_async({'n': n}, 7) for n in range(1, 30)])
+
+        results = [env['s'] for env in asyncio.run(main())]
+        self.assertEqual(results, [n * (n + 1) // 2 for n in range(1, 30)])
+
+    def testDefErrorReleasesRegisters(self):
+        code = Code.CompiledCode(loop())
+        with self.assertRaises(SystemExit) as context:
+            code.run({})
+        self.assertEqual(context.exception.code, 'Def error')
+        self.assertEqual(len(code.pool.free), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
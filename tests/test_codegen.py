@@ -0,0 +1,92 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor, SethiUllmanGenVisitor
+import Asm as AsmModule
+import Optimizer
+
+
+def compile_source(source, env, gen_class=GenVisitor):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(gen_class(), prog)
+    return prog, reg
+
+
+def run(source, env, gen_class=GenVisitor):
+    prog, reg = compile_source(source, env, gen_class)
+    prog.eval()
+    return prog.get_val(reg)
+
+
+class TestCodeGen(unittest.TestCase):
+
+    def testIfThenElseTrue(self):
+        self.assertEqual(run('if x < 3 then 1 else 2', {'x': 0}), 1)
+
+    def testIfThenElseFalse(self):
+        self.assertEqual(run('if x < 3 then 1 else 2', {'x': 5}), 2)
+
+    def testIfThenElseSkipsElse(self):
+        self.assertEqual(run('if x = 0 then 0 else 1 div x', {'x': 0}), 0)
+
+    def testIfThenElseSkipsThen(self):
+        self.assertEqual(run('if x = 0 then 1 div x else 7', {'x': 1}), 7)
+
+    def testNestedIfThenElse(self):
+        source = 'if x < 0 then 0 else if x < 10 then 1 else 2'
+        self.assertEqual([run(source, {'x': v}) for v in [-1, 5, 10]], [0, 1, 2])
+
+    def testAndShortCircuit(self):
+        self.assertEqual(run('x < 0 and 1 div x < 2', {'x': 0}), 0)
+
+    def testAndBothTrue(self):
+        self.assertEqual(run('0 < x and x < 2', {'x': 1}), 1)
+
+    def testOrShortCircuit(self):
+        self.assertEqual(run('x = 0 or 1 div x < 2', {'x': 0}), 1)
+
+    def testOrBothFalse(self):
+        self.assertEqual(run('x < 0 or 2 < x', {'x': 1}), 0)
+
+    def testLetWithConditional(self):
+        source = 'let y <- 3 in if y < x then y else x end'
+        self.assertEqual(run(source, {'x': 5}), 3)
+
+
+class TestSethiUllman(unittest.TestCase):
+
+    sources = [
+        '1 + (2 + (3 + (4 + x)))',
+        '(x * 2 - 3) * (4 - (x + (5 * x)))',
+        'x mod 3 + 7 div (x * x + 1)',
+        'if 1 + (2 + x) <= x * x then x = 2 else not (x < 3)',
+        'let y <- 2 * (x + 1) in y * (y + (y + 1)) end',
+        '(x < 1 or x = 2) and ~x < 0',
+    ]
+
+    def testSameResults(self):
+        for source in self.sources:
+            for x in range(-2, 4):
+                expected = run(source, {'x': x})
+                self.assertEqual(run(source, {'x': x}, SethiUllmanGenVisitor), expected)
+
+    def testHeavierOperandFirst(self):
+        prog, _ = compile_source('x + (1 + (2 + 3))', {'x': 0}, SethiUllmanGenVisitor)
+        self.assertEqual(Optimizer.max_live(prog), 2)
+
+    def testFewerLiveRegisters(self):
+        source = ' + ('.join(str(i) for i in range(1, 30)) + ')' * 28
+        prog, _ = compile_source(source, {})
+        su_prog, _ = compile_source(source, {}, SethiUllmanGenVisitor)
+        self.assertEqual(Optimizer.max_live(prog), 29)
+        self.assertEqual(Optimizer.max_live(su_prog), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import io
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Encoding
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+class TestEncoding(unittest.TestCase):
+
+    def testFourBytesPerInstruction(self):
+        prog, _ = compile_source('let x <- 3 in x * x + 100000 end', {})
+        encoded = Encoding.encode(prog)
+        self.assertEqual(encoded.words.itemsize, 4)
+        self.assertEqual(len(encoded.words), len(prog.get_insts()))
+        self.assertEqual(encoded.pool, [100000])
+
+    def testSameResults(self):
+        sources = [
+            'if x < 3 then x * x div 2 else x mod 3',
+            'not (x = 2) or x <= 1 and 5 < x + 1000',
+            'let y <- x * 700 in y - 1000 end',
+        ]
+        for source in sources:
+            for x in range(-2, 6):
+                prog, _ = compile_source(source, {'x': x})
+                encoded = Encoding.encode(prog)
+                prog.eval()
+                self.assertEqual(encoded.eval({'x': x}), prog.get_env())
+
+    def testImmediateLimits(self):
+        for imm in [Encoding.MIN_IMM, Encoding.MAX_IMM,
+                    Encoding.MIN_IMM - 1, Encoding.MAX_IMM + 1, 1 << 40]:
+            prog = AsmModule.Program({}, [AsmModule.Addi('a', 'x0', imm)])
+            encoded = Encoding.encode(prog)
+            self.assertEqual(encoded.eval({})['a'], imm)
+            self.assertEqual(str(encoded.decode().get_insts()[0]), f'a = addi x0 {imm}')
+
+    def testDecode(self):
+        prog, _ = compile_source('if x < 3 then x + 1 else x - 1', {'x': 2})
+        decoded = Encoding.decode(Encoding.encode(prog), {'x': 2})
+        self.assertEqual([str(inst) for inst in decoded.get_insts()],
+                         [str(inst) for inst in prog.get_insts()])
+        self.assertEqual(decoded.get_labels(), prog.get_labels())
+        decoded.eval()
+        prog.eval()
+        self.assertEqual(decoded.get_env(), prog.get_env())
+
+    def testSaveAndLoad(self):
+        prog, reg = compile_source('if x < 3 then x * 5000 else x - 1', {'x': 1})
+        buffer = io.BytesIO()
+        Encoding.encode(prog).tofile(buffer)
+        buffer.seek(0)
+        loaded = Encoding.EncodedProgram.fromfile(buffer)
+        self.assertEqual(loaded.eval({'x': 1})[reg], 5000)
+        self.assertEqual(loaded.eval({'x': 4})[reg], 3)
+
+    def testDefError(self):
+        prog = AsmModule.Program({}, [AsmModule.Add('a', 'b', 'x0')])
+        with self.assertRaises(SystemExit) as context:
+            Encoding.encode(prog).eval({})
+        self.assertEqual(context.exception.code, 'Def error')
+
+    def testManyRegisters(self):
+        source = ' + '.join(f'x * {i}' for i in range(300))
+        prog, reg = compile_source(source, {'x': 3})
+        encoded = Encoding.encode(prog)
+        self.assertGreater(len(encoded.names), 512)
+        self.assertGreater(len(encoded.words), len(prog.get_insts()))
+        prog.eval()
+        self.assertEqual(encoded.eval({'x': 3}), prog.get_env())
+
+    def testManyLabels(self):
+        source = ' + '.join(f'(if x < {i} then {i} else x * {i + 1000})' for i in range(300))
+        for x in [-1, 150, 400]:
+            prog, _ = compile_source(source, {'x': x})
+            encoded = Encoding.encode(prog)
+            self.assertGreater(len(encoded.labels), 512)
+            decoded = Encoding.decode(encoded, {'x': x})
+            self.assertEqual(decoded.get_labels(), prog.get_labels())
+            prog.eval()
+            decoded.eval()
+            self.assertEqual(decoded.get_env(), prog.get_env())
+            self.assertEqual(encoded.eval({'x': x}), prog.get_env())
+
+    def testJumpAndLinkAfterExtensionWords(self):
+        insts = [AsmModule.Addi(f'r{i}', 'x0', i) for i in range(600)]
+        prog = AsmModule.Program({}, insts + [AsmModule.Jal('ra', 'end'),
+                                              AsmModule.Addi('r0', 'x0', 7)])
+        prog.add_label('end')
+        prog.add_inst(AsmModule.Add('s', 'ra', 'r599'))
+        encoded = Encoding.encode(prog)
+        self.assertGreater(len(encoded.words), len(prog.get_insts()))
+        prog.eval()
+        self.assertEqual(encoded.eval({}), prog.get_env())
+
+    def testManyConstants(self):
+        insts = [AsmModule.Addi(f'r{i}', 'x0', 1000 + i) for i in range(600)]
+        buffer = io.BytesIO()
+        Encoding.encode(AsmModule.Program({}, insts)).tofile(buffer)
+        buffer.seek(0)
+        loaded = Encoding.EncodedProgram.fromfile(buffer)
+        self.assertEqual(len(loaded.pool), 600)
+        self.assertEqual(loaded.eval({})['r599'], 1599)
+
+
+if __name__ == '__main__':
+    unittest.main()
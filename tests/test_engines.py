@@ -0,0 +1,364 @@
+import unittest
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Linker
+import Threaded
+import Jit
+import Tiered
+import Fusion
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+def random_program(rng, size):
+    """
+    A straight-line program over the inputs a and b, whose divisors are
+    never zero.
+    """
+    regs = ["a", "b"]
+    insts = []
+    for i in range(size):
+        rd = f"r{i}"
+        rs1, rs2 = rng.choice(regs), rng.choice(regs)
+        kind = rng.randrange(6)
+        if kind == 0:
+            insts.append(AsmModule.Add(rd, rs1, rs2))
+        elif kind == 1:
+            insts.append(AsmModule.Sub(rd, rs1, rs2))
+        elif kind == 2:
+            insts.append(AsmModule.Mul(rd, rs1, "a"))
+        elif kind == 3:
+            insts.append(AsmModule.Xori(rd, rs1, rng.randrange(-8, 8)))
+        elif kind == 4:
+            insts.append(AsmModule.Slt(rd, rs1, rs2))
+        else:
+            insts.append(AsmModule.Addi(rd, rs1, rng.randrange(-8, 8)))
+        regs.append(rd)
+    return AsmModule.Program({"a": rng.randrange(-5, 6), "b": 7}, insts)
+
+
+class TestLinker(unittest.TestCase):
+
+    engine = Linker.LinkedProgram
+
+    sources = [
+        'if x < 3 then x * 2 else x div 2',
+        'x mod 3 + 7 div (x * x + 1)',
+        '(x < 1 or x = 2) and ~x < 0',
+        'let y <- 2 * (x + 1) in y * (y + (y + 1)) end',
+    ]
+
+    def assertSameEnv(self, prog):
+        linked = self.engine(prog)
+        prog.eval()
+        linked.eval()
+        self.assertEqual(linked.get_env(), prog.get_env())
+
+    def testGeneratedPrograms(self):
+        for source in self.sources:
+            for x in range(-3, 4):
+                prog, _ = compile_source(source, {'x': x})
+                self.assertSameEnv(prog)
+
+    def testRandomPrograms(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            self.assertSameEnv(random_program(rng, 30))
+
+    def testLoop(self):
+        p = AsmModule.Program({"n": 10}, [AsmModule.Addi("s", "x0", 0)])
+        p.add_label("loop")
+        p.add_inst(AsmModule.Add("s", "s", "n"))
+        p.add_inst(AsmModule.Addi("n", "n", -1))
+        p.add_inst(AsmModule.Bne("n", "x0", "loop"))
+        self.assertSameEnv(p)
+
+    def testUndefinedRegister(self):
+        prog = AsmModule.Program({}, [AsmModule.Add("a", "b", "x0")])
+        with self.assertRaises(SystemExit):
+            self.engine(prog).eval()
+
+    def testUndefinedRegisterInBranch(self):
+        prog = AsmModule.Program({}, [AsmModule.Beq("b", "x0", "end")])
+        prog.add_label("end")
+        with self.assertRaises(SystemExit):
+            self.engine(prog).eval()
+
+
+    def testRun(self):
+        evaluate = lambda prog: Linker.run(prog, self.engine)
+        self.assertEqual(AsmModule.max(-2, -3, evaluate), -2)
+        self.assertEqual(AsmModule.distance_with_acceleration(3, 4, 5, evaluate), 65)
+
+    def testRunFromProgramCounter(self):
+        prog = AsmModule.Program({'a': 2}, [AsmModule.Addi('b', 'a', 2),
+                                            AsmModule.Add('c', 'b', 'n')])
+        prog.get_inst().eval(prog)
+        fork = prog.snapshot().fork({'n': 1, 'b': 100})
+        Linker.run(fork, self.engine)
+        self.assertEqual(fork.get_val('c'), 101)
+        for run in [Linker.run, Threaded.run]:
+            fork = prog.snapshot().fork({'n': 1, 'b': 100})
+            run(fork)
+            self.assertEqual(fork.get_val('c'), 101)
+
+
+class TestThreaded(TestLinker):
+
+    engine = Threaded.ThreadedProgram
+
+    def testRerun(self):
+        prog, reg = compile_source('x * x + 1', {'x': 3})
+        threaded = self.engine(prog)
+        slot = threaded.slots['x']
+        results = []
+        for x in range(4):
+            threaded.regs[slot] = x
+            threaded.eval()
+            results.append(threaded.get_val(reg))
+        self.assertEqual(results, [1, 2, 5, 10])
+
+
+class TestFusion(TestLinker):
+
+    engine = Fusion.FusedProgram
+
+    def testFusesGenVisitorIdioms(self):
+        prog, reg = compile_source('(x + 1 = 3) + (2 * x = 4)', {'x': 2})
+        fused = self.engine(prog)
+        self.assertEqual(fused.fused['seq'], 2)
+        self.assertEqual(fused.fused['const'], 2)
+        fused.eval()
+        self.assertEqual(fused.get_val(reg), 2)
+
+    def testBranchTargetInsideIdiom(self):
+        p = AsmModule.Program({"a": 1}, [AsmModule.Addi("t", "x0", 5)])
+        p.add_label("mid")
+        p.add_inst(AsmModule.Add("r", "a", "t"))
+        self.assertEqual(self.engine(p).sites, {})
+
+    def testUndefinedOperandInIdiom(self):
+        prog = AsmModule.Program({}, [AsmModule.Addi("t", "x0", 5),
+                                      AsmModule.Add("r", "a", "t")])
+        with self.assertRaises(SystemExit):
+            self.engine(prog).eval()
+
+
+class TestProfileGuidedFusion(unittest.TestCase):
+
+    def profileOf(self, progs):
+        profile = Fusion.Profile()
+        for prog in progs:
+            profile.record(prog)
+        return profile
+
+    def testRandomPrograms(self):
+        rng = random.Random(2)
+        progs = [random_program(rng, 40) for _ in range(20)]
+        profile = self.profileOf(progs)
+        for prog in progs:
+            fused = Fusion.fuse_with_profile(prog, profile, min_share=0.01)
+            self.assertTrue(fused.sites)
+            fused.eval()
+            prog.eval()
+            self.assertEqual(fused.get_env(), prog.get_env())
+
+    def testSaveAndLoad(self):
+        prog, _ = compile_source('if x < 3 then x * 2 + 1 else x div 2', {'x': 1})
+        profile = self.profileOf([prog])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.json')
+            profile.save(path)
+            loaded = Fusion.Profile.load(path)
+        self.assertEqual(loaded.opcodes, profile.opcodes)
+        self.assertEqual(loaded.pairs, profile.pairs)
+        self.assertEqual(loaded.triples, profile.triples)
+        self.assertEqual(loaded.hits, profile.hits)
+        self.assertEqual(loaded.choose(), profile.choose())
+
+    def testSpecializedBranches(self):
+        source = '(x < 1 or x = 2) and not (x < 0)'
+        for x in range(-2, 4):
+            prog, reg = compile_source(source, {'x': x})
+            profile = self.profileOf([prog])
+            fused = Fusion.fuse_with_profile(prog, profile, min_share=0.0)
+            self.assertIn('beq', profile.choose(min_share=0.0)[1])
+            fused.eval()
+            prog.eval()
+            self.assertEqual(fused.get_val(reg), prog.get_val(reg))
+
+    def testNoSpecializationWhenX0IsWritten(self):
+        prog = AsmModule.Program({}, [AsmModule.Addi("x0", "x0", 5),
+                                      AsmModule.Addi("a", "x0", 1)])
+        profile = self.profileOf([prog])
+        fused = Fusion.fuse_with_profile(prog, profile, min_share=0.0)
+        fused.eval()
+        self.assertEqual(fused.get_val("a"), 6)
+
+    def testNoSpecializationWhenFusedIdiomWritesX0(self):
+        prog = AsmModule.Program({'a': 1, 'b': 5}, [AsmModule.Addi('x0', 'x0', 5),
+                                                    AsmModule.Add('c', 'a', 'x0'),
+                                                    AsmModule.Beq('b', 'x0', 'L1'),
+                                                    AsmModule.Addi('r', 'x0', 1)])
+        prog.add_label('L1')
+        prog.add_inst(AsmModule.Addi('s', 'x0', 1))
+        fused = Fusion.FusedProgram(prog, specialize=('addi', 'beq', 'bne'))
+        self.assertEqual(fused.fused['const'], 1)
+        fused.eval()
+        prog.eval()
+        self.assertEqual(fused.get_env(), prog.get_env())
+
+    def testUndefinedRegisterInSpecializedBranch(self):
+        prog = AsmModule.Program({}, [AsmModule.Beq("b", "x0", "end")])
+        prog.add_label("end")
+        fused = Fusion.FusedProgram(prog, specialize=['beq'])
+        with self.assertRaises(SystemExit):
+            fused.eval()
+
+
+class TestJit(unittest.TestCase):
+
+    def testRandomPrograms(self):
+        rng = random.Random(1)
+        for _ in range(30):
+            prog = random_program(rng, 30)
+            jitted = AsmModule.Program(dict(prog.get_env()), prog.get_insts())
+            prog.eval()
+            Jit.run(jitted)
+            self.assertEqual(jitted.get_env(), prog.get_env())
+
+    def testGeneratedPrograms(self):
+        for source in ['x mod 3 + 7 div (x * x + 1)', '(x * 2 - 3) * (4 - x)']:
+            for x in range(-3, 4):
+                prog, reg = compile_source(source, {'x': x})
+                expected = AsmModule.Program(dict(prog.get_env()), prog.get_insts())
+                expected.eval()
+                Jit.run(prog)
+                self.assertEqual(prog.get_val(reg), expected.get_val(reg))
+
+    def testCacheSharesFunctions(self):
+        insts = [AsmModule.Mul("b", "a", "a")]
+        f0 = Jit.compile_program(AsmModule.Program({"a": 1}, list(insts)))
+        f1 = Jit.compile_program(AsmModule.Program({"a": 2}, list(insts)))
+        self.assertIs(f0, f1)
+        self.assertIn(f0.key, Jit.cache)
+
+    def testKeyIsRemembered(self):
+        insts = [AsmModule.Mul("b", "a", "a")]
+        key = Jit.program_key(AsmModule.Program({"a": 1}, insts))
+        self.assertEqual(Jit.keys[id(insts)][2], key)
+        insts.append(AsmModule.Addi("c", "b", 1))
+        self.assertNotEqual(Jit.program_key(AsmModule.Program({"a": 1}, insts)), key)
+
+    def testCacheIsBounded(self):
+        size = Jit.MAX_FUNCTIONS
+        Jit.MAX_FUNCTIONS = 4
+        try:
+            for i in range(10):
+                Jit.run(AsmModule.Program({"a": 1}, [AsmModule.Addi("b", "a", i)]))
+            self.assertEqual(len(Jit.cache), 4)
+        finally:
+            Jit.MAX_FUNCTIONS = size
+
+    def testBranchesUseInterpreter(self):
+        prog, reg = compile_source('if x < 3 then 1 else 2', {'x': 5})
+        self.assertIsNone(Jit.compile_program(prog))
+        Jit.run(prog)
+        self.assertEqual(prog.get_val(reg), 2)
+
+    def testUndefinedRegister(self):
+        prog = AsmModule.Program({}, [AsmModule.Addi("a", "x0", 1),
+                                      AsmModule.Add("c", "a", "b")])
+        with self.assertRaises(SystemExit) as context:
+            Jit.run(prog)
+        self.assertEqual(context.exception.code, "Def error")
+        self.assertEqual(prog.get_val("a"), 1)
+
+    def testDivisionByZero(self):
+        prog = AsmModule.Program({"a": 1}, [AsmModule.Div("b", "a", "x0")])
+        with self.assertRaises(ZeroDivisionError):
+            Jit.run(prog)
+
+
+class TestTiered(unittest.TestCase):
+
+    def runMany(self, runner, source, inputs):
+        results = []
+        for x in inputs:
+            prog, reg = compile_source(source, {'x': x})
+            runner.run(prog)
+            results.append(prog.get_val(reg))
+        return results
+
+    def testPromotesAfterThreshold(self):
+        runner = Tiered.TieredRunner(threshold=3, background=False)
+        results = self.runMany(runner, 'x * x + 1', range(6))
+        self.assertEqual(results, [x * x + 1 for x in range(6)])
+        self.assertEqual(runner.metrics['interpreted'], 3)
+        self.assertGreaterEqual(runner.metrics['jit'], 3)
+        self.assertEqual(runner.metrics['interpreted'] + runner.metrics['jit'], 6)
+        self.assertEqual(runner.metrics['promoted'], 1)
+
+    def testBranchesPromoteToThreaded(self):
+        runner = Tiered.TieredRunner(threshold=2, background=False)
+        source = 'if x < 3 then x * 2 else x div 2'
+        results = self.runMany(runner, source, range(6))
+        self.assertEqual(results, [0, 2, 4, 1, 2, 2])
+        self.assertEqual(runner.metrics['threaded'], 4)
+
+    def testNoThreshold(self):
+        runner = Tiered.TieredRunner(threshold=None)
+        self.runMany(runner, 'x + 1', range(20))
+        runner.shutdown()
+        self.assertEqual(runner.metrics['interpreted'], 20)
+        self.assertEqual(runner.metrics['promoted'], 0)
+
+    def testBackgroundPromotion(self):
+        runner = Tiered.TieredRunner(threshold=2)
+        self.runMany(runner, 'x - 1', range(3))
+        runner.wait()
+        results = self.runMany(runner, 'x - 1', range(3))
+        runner.shutdown()
+        self.assertEqual(results, [-1, 0, 1])
+        self.assertEqual(runner.metrics['started'], 1)
+        self.assertEqual(runner.metrics['promoted'], 1)
+        self.assertGreaterEqual(runner.metrics['jit'], 3)
+        self.assertEqual(runner.metrics['interpreted'] + runner.metrics['jit'], 6)
+
+    def testDefErrorAfterPromotion(self):
+        runner = Tiered.TieredRunner(threshold=1, background=False)
+        insts = [AsmModule.Add("b", "a", "x0")]
+        runner.run(AsmModule.Program({"a": 1}, insts))
+        with self.assertRaises(SystemExit):
+            runner.run(AsmModule.Program({}, insts))
+
+    def testLabelsArePartOfTheKey(self):
+        runner = Tiered.TieredRunner(threshold=1, background=False)
+        insts = [AsmModule.Addi("r", "x0", 0), AsmModule.Jal("x0", "L"),
+                 AsmModule.Addi("r", "x0", 10)]
+        results = []
+        for pc in [3, 2, 3, 2]:
+            prog = AsmModule.Program({}, list(insts))
+            prog.get_labels()["L"] = pc
+            runner.run(prog)
+            results.append(prog.get_val("r"))
+        self.assertEqual(results, [0, 10, 0, 10])
+        self.assertEqual(runner.metrics['promoted'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
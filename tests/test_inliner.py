@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+from Expression import *
+import Asm as AsmModule
+import Inliner
+
+
+def parse(source):
+    return Parser(Lexer(source).tokens()).parse()
+
+
+def run(exp, env):
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    prog.eval()
+    return prog.get_val(reg)
+
+
+class TestInliner(unittest.TestCase):
+
+    def inline(self, source, budget=64):
+        inliner = Inliner.InlineVisitor(budget)
+        return parse(source).accept(inliner, None), inliner.removed
+
+    def testConstantArgument(self):
+        exp, removed = self.inline('(fn x: int => x + 1) 41')
+        self.assertIsInstance(exp, Add)
+        self.assertEqual((run(exp, {}), removed), (42, 1))
+
+    def testCurriedFunction(self):
+        exp, removed = self.inline('(fn x: int => fn y: int => x * y) 6 7')
+        self.assertEqual((run(exp, {}), removed), (42, 2))
+
+    def testComplexArgumentBecomesLet(self):
+        exp, removed = self.inline('(fn x: int => x * x) (y + 1)')
+        self.assertIsInstance(exp, Let)
+        self.assertEqual(run(exp, {'y': 4}), 25)
+
+    def testFreshLetDoesNotShadow(self):
+        exp, _ = self.inline('x + (fn x: int => x * 2) (x + 1)')
+        self.assertEqual(run(exp, {'x': 3}), 11)
+
+    def testCaptureAvoidance(self):
+        exp, _ = self.inline('(fn x: int => fn y: int => x - y) y 10')
+        self.assertEqual(run(exp, {'y': 3}), -7)
+
+    def testFunctionArgument(self):
+        source = '(fn f: int -> int => f 1 + f 2) (fn x: int => x * 10)'
+        exp, removed = self.inline(source)
+        self.assertEqual((run(exp, {}), removed), (30, 3))
+
+    def testLetBoundFunction(self):
+        exp, _ = self.inline('let f <- fn x: int => x + 1 in f (f 1) end')
+        self.assertEqual(run(exp, {}), 3)
+
+    def testBudgetLimitsDuplication(self):
+        source = '(fn f: int -> int => f 1 + f 2) (fn x: int => x * 10)'
+        exp, removed = self.inline(source, budget=0)
+        self.assertEqual(removed, 1)
+        self.assertIsInstance(exp, Let)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Memo
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+class CountingProgram(AsmModule.Program):
+
+    runs = 0
+
+    def eval(self):
+        CountingProgram.runs += 1
+        super().eval()
+
+
+def square(a):
+    return AsmModule.Program({'a': a}, [AsmModule.Mul('r', 'a', 'a')])
+
+
+class TestResultCache(unittest.TestCase):
+
+    def testSameResults(self):
+        source = 'if x < 3 then x * x div 2 else x mod 3'
+        cache = Memo.ResultCache()
+        for _ in range(3):
+            for x in range(-2, 6):
+                prog, reg = compile_source(source, {'x': x})
+                plain, _ = compile_source(source, {'x': x})
+                plain.eval()
+                self.assertEqual(cache.run(prog, [reg]), {reg: plain.get_val(reg)})
+        self.assertEqual((cache.hits, cache.misses), (16, 8))
+
+    def testHitsSkipRuns(self):
+        cache = Memo.ResultCache()
+        insts = [AsmModule.Mul('r', 'a', 'a')]
+        CountingProgram.runs = 0
+        for a in [2, 2, 3, 2]:
+            prog = CountingProgram({'a': a}, insts)
+            cache.run(prog, ['r'], CountingProgram.eval)
+            self.assertEqual(prog.get_val('r'), a * a)
+        self.assertEqual(CountingProgram.runs, 2)
+
+    def testKeysDependOnProgramAndOutputs(self):
+        cache = Memo.ResultCache()
+        cache.run(square(3), ['r'])
+        cache.run(AsmModule.Program({'a': 3}, [AsmModule.Add('r', 'a', 'a')]), ['r'])
+        cache.run(square(3), ['r', 'a'])
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+
+    def testLabelsArePartOfTheKey(self):
+        cache = Memo.ResultCache()
+        insts = [AsmModule.Addi('r', 'x0', 1), AsmModule.Beq('a', 'x0', 'L1'),
+                 AsmModule.Addi('r', 'x0', 2)]
+        first = AsmModule.Program({'a': 0}, insts)
+        first.add_label('L1')
+        second = AsmModule.Program({'a': 0}, insts)
+        second.get_labels()['L1'] = 2
+        self.assertEqual(cache.run(first, ['r']), {'r': 1})
+        self.assertEqual(cache.run(second, ['r']), {'r': 2})
+        self.assertEqual(cache.misses, 2)
+
+    def testReplacedInstructionsChangeTheKey(self):
+        cache = Memo.ResultCache()
+        insts = [AsmModule.Addi('r', 'a', 1)]
+        self.assertEqual(cache.run(AsmModule.Program({'a': 3}, insts), ['r']), {'r': 4})
+        insts[0] = AsmModule.Addi('r', 'a', 100)
+        self.assertEqual(cache.run(AsmModule.Program({'a': 3}, insts), ['r']), {'r': 103})
+        self.assertEqual(cache.misses, 2)
+
+    def testProgramsThatStartedAreNotCached(self):
+        cache = Memo.ResultCache()
+        insts = [AsmModule.Addi('b', 'a', 2), AsmModule.Add('c', 'b', 'n')]
+        cache.run(AsmModule.Program({'a': 2, 'b': 100, 'n': 1}, insts), ['c'])
+        prog = AsmModule.Program({'a': 2, 'b': 100, 'n': 1}, insts)
+        prog.set_pc(1)
+        self.assertEqual(cache.run(prog, ['c']), {'c': 101})
+        self.assertEqual(len(cache.entries), 1)
+
+    def testByteBudget(self):
+        cache = Memo.ResultCache(max_bytes=2000)
+        for a in range(100):
+            cache.run(square(a), ['r'])
+        self.assertLessEqual(cache.size, 2000)
+        self.assertGreater(cache.evictions, 0)
+        self.assertEqual(len(cache.entries), 100 - cache.evictions)
+        cache.run(square(99), ['r'])
+        cache.run(square(0), ['r'])
+        self.assertEqual(cache.hits, 1)
+
+    def testLeastRecentlyUsedIsEvicted(self):
+        cache = Memo.ResultCache()
+        size = Memo.entry_size(cache.key(square(0), ['r']), {'r': 0})
+        cache.max_bytes = 2 * size
+        cache.run(square(0), ['r'])
+        cache.run(square(1), ['r'])
+        cache.run(square(0), ['r'])
+        cache.run(square(2), ['r'])
+        cache.run(square(0), ['r'])
+        self.assertEqual(cache.hits, 2)
+        cache.run(square(1), ['r'])
+        self.assertEqual(cache.misses, 4)
+
+    def testDefErrorsAreNotCached(self):
+        cache = Memo.ResultCache()
+        prog = AsmModule.Program({}, [AsmModule.Mul('r', 'a', 'a')])
+        with self.assertRaises(SystemExit):
+            cache.run(prog, ['r'])
+        self.assertEqual(len(cache.entries), 0)
+
+    def testProgramsWithMemoryAreNotCached(self):
+        cache = Memo.ResultCache()
+        for value in [1, 2]:
+            prog = AsmModule.Program({}, [AsmModule.Lw('a', 'x0', 0)])
+            prog.set_memory(AsmModule.Memory(bytearray([value, 0, 0, 0])))
+            self.assertEqual(cache.run(prog, ['a']), {'a': value})
+        for _ in range(2):
+            data = bytearray(4)
+            prog = AsmModule.Program({'v': 9}, [AsmModule.Sw('x0', 'v', 0)])
+            prog.set_memory(AsmModule.Memory(data))
+            cache.run(prog, [])
+            self.assertEqual(data, bytearray([9, 0, 0, 0]))
+        self.assertEqual(len(cache.entries), 0)
+
+    def testThreads(self):
+        cache = Memo.ResultCache()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda a: cache.run(square(a % 10), ['r'])['r'],
+                                        range(500)))
+        self.assertEqual(results, [(a % 10) ** 2 for a in range(500)])
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 500)
+        self.assertEqual(stats['entries'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import os
+import struct
+import sys
+from array import array
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Asm as AsmModule
+import Encoding
+import Linker
+import Optimizer
+import Threaded
+import Tiered
+import Tracer
+import Verifier
+
+
+def sum_words(n):
+    """
+    A program that sums the n words at address 0, and stores the sum after
+    them.
+    """
+    p = AsmModule.Program({"n": n}, [AsmModule.Addi("s", "x0", 0),
+                                     AsmModule.Addi("p", "x0", 0),
+                                     AsmModule.Slli("end", "n", 2)])
+    p.add_label("loop")
+    p.add_inst(AsmModule.Lw("w", "p", 0))
+    p.add_inst(AsmModule.Add("s", "s", "w"))
+    p.add_inst(AsmModule.Addi("p", "p", 4))
+    p.add_inst(AsmModule.Blt("p", "end", "loop"))
+    p.add_inst(AsmModule.Sw("end", "s", 0))
+    return p
+
+
+class TestMemory(unittest.TestCase):
+
+    def testSumOfArray(self):
+        values = array("i", [3, -1, 40, 7, -20])
+        data = bytearray(values.tobytes() + bytes(4))
+        prog = sum_words(len(values))
+        prog.set_memory(AsmModule.Memory(data))
+        prog.eval()
+        self.assertEqual(prog.get_val("s"), 29)
+        self.assertEqual(struct.unpack_from("<i", data, 20)[0], 29)
+
+    def testZeroCopyBuffers(self):
+        data = bytearray(8)
+        memory = AsmModule.Memory(data)
+        data[0] = 9
+        view = memory.read(0, 8)
+        prog = AsmModule.Program({}, [AsmModule.Lb("a", "x0", 0),
+                                      AsmModule.Sb("x0", "a", 7)])
+        prog.set_memory(memory)
+        prog.eval()
+        self.assertEqual(view[7], 9)
+        self.assertEqual(data[7], 9)
+
+    def testArrayBuffer(self):
+        values = array("i", [1, 2, 3, 0])
+        prog = sum_words(3)
+        prog.set_memory(AsmModule.Memory(values))
+        prog.eval()
+        self.assertEqual(values[3], 6)
+
+    def testWordsAreTruncated(self):
+        data = bytearray(4)
+        prog = AsmModule.Program({"v": (1 << 40) - 1}, [AsmModule.Sw("x0", "v", 0),
+                                                        AsmModule.Lw("a", "x0", 0)])
+        prog.set_memory(AsmModule.Memory(data))
+        prog.eval()
+        self.assertEqual(prog.get_val("a"), -1)
+
+    def testBoundsChecks(self):
+        for inst in [AsmModule.Lw("a", "x0", -1), AsmModule.Lw("a", "x0", 5),
+                     AsmModule.Sw("x0", "x0", 6), AsmModule.Lb("a", "x0", 8),
+                     AsmModule.Sb("x0", "x0", -4)]:
+            prog = AsmModule.Program({}, [inst])
+            prog.set_memory(AsmModule.Memory(8))
+            with self.assertRaises(SystemExit) as context:
+                prog.eval()
+            self.assertEqual(context.exception.code, "Memory error")
+
+    def testReadOnlyBuffer(self):
+        with self.assertRaises(SystemExit):
+            AsmModule.Memory(b"abcd")
+
+    def testVerifierFallsBack(self):
+        prog = sum_words(2)
+        self.assertTrue(Verifier.verify(prog))
+        self.assertFalse(Verifier.UncheckedProgram(prog).verified)
+        prog.set_memory(AsmModule.Memory(array("i", [5, 6, 0])))
+        Verifier.run(prog)
+        self.assertEqual(prog.get_val("s"), 11)
+
+    def testEnginesFallBack(self):
+        engines = [Linker.run, Threaded.run, lambda prog: prog.eval(tracer=Tracer.Tracer(4))]
+        runner = Tiered.TieredRunner(threshold=1, background=False)
+        engines += [runner.run, runner.run]
+        for evaluate in engines:
+            data = bytearray(4)
+            prog = AsmModule.Program({"v": 7}, [AsmModule.Sw("x0", "v", 0),
+                                                AsmModule.Lw("a", "x0", 0)])
+            prog.set_memory(AsmModule.Memory(data))
+            evaluate(prog)
+            self.assertEqual(prog.get_val("a"), 7)
+            self.assertEqual(data, bytearray([7, 0, 0, 0]))
+
+    def testEnginesWithoutMemoryExit(self):
+        prog = AsmModule.Program({"v": 7}, [AsmModule.Sw("x0", "v", 0)])
+        for engine, message in [(Linker.link, "Link error"), (Encoding.encode, "Encoding error")]:
+            with self.assertRaises(SystemExit) as context:
+                engine(prog)
+            self.assertTrue(context.exception.code.startswith(message))
+
+    def testForksCopyTheMemory(self):
+        data = bytearray(4)
+        prog = AsmModule.Program({}, [AsmModule.Lw("a", "x0", 0),
+                                      AsmModule.Sw("x0", "v", 0)])
+        prog.set_memory(AsmModule.Memory(data))
+        snapshot = prog.snapshot()
+        forks = [snapshot.fork({"v": v}) for v in [5, 6]]
+        for fork in forks:
+            fork.eval()
+            self.assertEqual(fork.get_val("a"), 0)
+        self.assertEqual([fork.get_memory().load_word(0) for fork in forks], [5, 6])
+        self.assertEqual(data, bytearray(4))
+
+    def testRebuildKeepsTheMemory(self):
+        data = bytearray(4)
+        prog = AsmModule.Program({"v": 3}, [AsmModule.Sw("x0", "v", 0)])
+        prog.set_memory(AsmModule.Memory(data))
+        Optimizer.rebuild(prog, prog.get_insts()).eval()
+        self.assertEqual(data, bytearray([3, 0, 0, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
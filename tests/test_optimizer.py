@@ -0,0 +1,117 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Optimizer
+import Reassociator
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+def opcodes(prog):
+    return [inst.get_opcode() for inst in prog.get_insts()]
+
+
+class TestStrengthReduction(unittest.TestCase):
+
+    def assertSameResults(self, source, values):
+        for x in values:
+            prog, reg = compile_source(source, {'x': x})
+            reduced = Optimizer.strength_reduce(prog)
+            prog.eval()
+            reduced.eval()
+            self.assertEqual(prog.get_val(reg), reduced.get_val(reg))
+
+    def testReducedProgramHasItsOwnEnvironment(self):
+        prog, reg = compile_source('x * 8', {'x': 3})
+        reduced = Optimizer.strength_reduce(prog)
+        self.assertIsNot(reduced.get_env(), prog.get_env())
+        reduced.eval()
+        self.assertEqual(reduced.get_val(reg), 24)
+        self.assertEqual(prog.get_env(), {'x': 3, 'x0': 0})
+
+    def testMulByPowerOfTwo(self):
+        prog, _ = compile_source('x * 8', {'x': 1})
+        self.assertEqual(opcodes(Optimizer.strength_reduce(prog)), ['addi', 'slli'])
+
+    def testMulByPowerOfTwoOnTheLeft(self):
+        prog, _ = compile_source('4 * x', {'x': 1})
+        self.assertEqual(opcodes(Optimizer.strength_reduce(prog)), ['addi', 'slli'])
+
+    def testDivByPowerOfTwo(self):
+        prog, _ = compile_source('x div 4', {'x': 1})
+        self.assertEqual(opcodes(Optimizer.strength_reduce(prog)), ['addi', 'srai'])
+
+    def testModByPowerOfTwo(self):
+        prog, _ = compile_source('x mod 16', {'x': 1})
+        self.assertEqual(opcodes(Optimizer.strength_reduce(prog)), ['addi', 'andi'])
+
+    def testNotPowerOfTwo(self):
+        prog, _ = compile_source('x * 6 + x div 3 + x mod 5', {'x': 1})
+        self.assertEqual(opcodes(Optimizer.strength_reduce(prog)), opcodes(prog))
+
+    def testFloorSemantics(self):
+        source = 'x div 8 + x mod 8 * 100 + x * 2'
+        self.assertSameResults(source, range(-33, 34))
+
+    def testReductionInsideBranches(self):
+        source = 'if x < 0 then x div 2 else x mod 4'
+        self.assertSameResults(source, range(-9, 10))
+
+
+class TestReassociation(unittest.TestCase):
+
+    def assertSameResults(self, source, values):
+        exp = Parser(Lexer(source).tokens()).parse()
+        balanced = Reassociator.reassociate(exp)
+        for x in values:
+            results = []
+            for e in [exp, balanced]:
+                prog = AsmModule.Program({'x': x}, [])
+                reg = e.accept(GenVisitor(), prog)
+                prog.eval()
+                results.append(prog.get_val(reg))
+            self.assertEqual(results[0], results[1])
+
+    def testArithmeticChains(self):
+        self.assertSameResults('1 + x + 2 * x * 4 + 3 - x * x * 5 * 2', range(-3, 4))
+
+    def testBooleanChains(self):
+        source = 'x < 1 and true and x < 5 or false or x = 3'
+        self.assertSameResults(source, range(-1, 5))
+
+    def testConstantsFold(self):
+        exp = Reassociator.reassociate(Parser(Lexer('2 + x + 3 + 4').tokens()).parse())
+        self.assertEqual((exp.left.identifier, exp.right.num), ('x', 9))
+
+    def testDecidedConjunctionDropsRest(self):
+        exp = Reassociator.reassociate(Parser(Lexer('x < 1 and false and 1 div x < 2').tokens()).parse())
+        prog = AsmModule.Program({'x': 0}, [])
+        reg = exp.accept(GenVisitor(), prog)
+        prog.eval()
+        self.assertEqual(prog.get_val(reg), 0)
+        self.assertEqual(Reassociator.depth(exp), 3)
+
+    def testLongChainIsBalanced(self):
+        source = ' + '.join(['x'] * 5000)
+        exp = Reassociator.reassociate(Parser(Lexer(source).tokens()).parse())
+        self.assertLessEqual(Reassociator.depth(exp), 14)
+        prog = AsmModule.Program({'x': 2}, [])
+        reg = exp.accept(GenVisitor(), prog)
+        prog.eval()
+        self.assertEqual(prog.get_val(reg), 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import json
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Profiler
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+class TestProfiler(unittest.TestCase):
+
+    source = 'if x < 3 then x * x div 2 else x mod 3'
+
+    def testSameResults(self):
+        for x in range(-2, 6):
+            plain, reg = compile_source(self.source, {'x': x})
+            profiled, _ = compile_source(self.source, {'x': x})
+            plain.eval()
+            profiled.eval(Profiler.Profiler())
+            self.assertEqual(profiled.get_env(), plain.get_env())
+
+    def testCountsMatchPositions(self):
+        profiler = Profiler.Profiler()
+        for x in range(6):
+            prog, _ = compile_source(self.source, {'x': x})
+            prog.eval(profiler)
+        self.assertEqual(sum(profiler.counts.values()), sum(profiler.hits.values()))
+        self.assertEqual(profiler.counts['div'], 6)
+        self.assertEqual(profiler.counts['jal'], 3)
+
+    def testCostModel(self):
+        prog = AsmModule.Program({'a': 4}, [AsmModule.Mul('b', 'a', 'a'),
+                                            AsmModule.Div('c', 'b', 'a'),
+                                            AsmModule.Add('d', 'c', 'a')])
+        profiler = Profiler.Profiler({'mul': 5, 'div': 7})
+        prog.eval(profiler)
+        self.assertEqual(profiler.cycles(), {'add': 1, 'div': 7, 'mul': 5})
+        self.assertEqual(profiler.to_dict()['total']['cycles'], 13)
+
+    def testReportIsSortedByTime(self):
+        prog, _ = compile_source(self.source, {'x': 1})
+        profiler = Profiler.Profiler()
+        prog.eval(profiler)
+        lines = profiler.report().splitlines()
+        opcodes = [line.split()[0] for line in lines[1:1 + len(profiler.counts)]]
+        times = [profiler.times[opcode] for opcode in opcodes]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+    def testJson(self):
+        prog, _ = compile_source(self.source, {'x': 4})
+        profiler = Profiler.Profiler()
+        prog.eval(profiler)
+        data = json.loads(profiler.to_json())
+        self.assertEqual(data['total']['count'], sum(profiler.counts.values()))
+        self.assertEqual(data['classes']['div']['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
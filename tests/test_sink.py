@@ -0,0 +1,129 @@
+import unittest
+import os
+import sys
+import io
+import random
+import contextlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor, SethiUllmanGenVisitor
+import Asm as AsmModule
+import Sink
+
+
+def parse(source):
+    return Parser(Lexer(source).tokens()).parse()
+
+
+def compile_source(source, env, gen_class=GenVisitor):
+    prog = AsmModule.Program(dict(env), [])
+    reg = parse(source).accept(gen_class(), prog)
+    return prog, reg
+
+
+class TestSink(unittest.TestCase):
+
+    sources = [
+        'x * y + 3 * x',
+        'if x < 3 then x * y div 2 else y mod 3',
+        'let k <- x * 4 + 1 in if k = 9 then k * y else k - y end',
+        'not (x = 2) or y <= 1 and 5 < x + y',
+        'x * 8 + y div 4 + 16 * (2 + 3)',
+    ]
+
+    def testTextSinkPrintsLikeProgram(self):
+        for source in self.sources:
+            prog, reg = compile_source(source, {'x': 1, 'y': 2})
+            expected = io.StringIO()
+            with contextlib.redirect_stdout(expected):
+                prog.print_insts()
+            text = io.StringIO()
+            sink = Sink.TextSink(text, buffer_lines=3)
+            self.assertEqual(parse(source).accept(GenVisitor(), sink), reg)
+            sink.close()
+            self.assertEqual(text.getvalue(), expected.getvalue())
+            self.assertEqual(sink.size, len(prog.get_insts()))
+
+    def testPackedAndBinarySinksRunLikeProgram(self):
+        rng = random.Random(6)
+        for source in self.sources:
+            for gen_class in [GenVisitor, SethiUllmanGenVisitor]:
+                packed = Sink.PackedSink()
+                parse(source).accept(gen_class(), packed)
+                encoded = packed.close()
+                data = io.BytesIO()
+                binary = Sink.BinarySink(data, buffer_words=4)
+                parse(source).accept(gen_class(), binary)
+                binary.close()
+                loaded = Sink.load(data)
+                for _ in range(5):
+                    env = {'x': rng.randrange(-4, 8), 'y': rng.randrange(1, 8)}
+                    prog, _ = compile_source(source, env, gen_class)
+                    prog.eval()
+                    self.assertEqual(encoded.eval(env), prog.get_env())
+                    self.assertEqual(loaded.eval(env), prog.get_env())
+
+    def testLargeGenVisitorPrograms(self):
+        sources = [
+            ' + '.join(f'x * {i}' for i in range(300)),
+            ' + '.join(f'(if x < {i} then y else x * {i + 1000})' for i in range(300)),
+        ]
+        for source in sources:
+            env = {'x': 150, 'y': 2}
+            prog, _ = compile_source(source, env)
+            prog.eval()
+            packed = Sink.PackedSink()
+            parse(source).accept(GenVisitor(), packed)
+            encoded = packed.close()
+            self.assertGreater(len(encoded.names), 512)
+            data = io.BytesIO()
+            binary = Sink.BinarySink(data, buffer_words=100)
+            parse(source).accept(GenVisitor(), binary)
+            binary.close()
+            self.assertEqual(encoded.eval(env), prog.get_env())
+            self.assertEqual(Sink.load(data).eval(env), prog.get_env())
+
+    def testMissingLabel(self):
+        sink = Sink.PackedSink()
+        sink.add_inst(AsmModule.Jal('x0', 'nowhere'))
+        with self.assertRaises(SystemExit) as context:
+            sink.close()
+        self.assertEqual(context.exception.code, 'Label error')
+
+    def testPeepholeKeepsResults(self):
+        rng = random.Random(7)
+        for source in self.sources:
+            for _ in range(10):
+                env = {'x': rng.randrange(-4, 8), 'y': rng.randrange(1, 8)}
+                prog, reg = compile_source(source, env)
+                prog.eval()
+                optimized = AsmModule.Program(dict(env), [])
+                sink = Sink.PeepholeSink(optimized)
+                self.assertEqual(parse(source).accept(GenVisitor(), sink), reg)
+                sink.close()
+                self.assertLessEqual(len(optimized.get_insts()), len(prog.get_insts()))
+                optimized.eval()
+                self.assertEqual(optimized.get_env(), prog.get_env())
+
+    def testPeepholeOutputs(self):
+        prog = AsmModule.Program({'x': 3}, [])
+        sink = Sink.PeepholeSink(prog, outputs=[])
+        reg = parse('x * 8 + 16 * (2 + 3)').accept(GenVisitor(), sink)
+        sink.close()
+        self.assertEqual([inst.get_opcode() for inst in prog.get_insts()], ['slli', 'addi'])
+        prog.eval()
+        self.assertEqual(prog.get_val(reg), 104)
+
+    def testChainedSinks(self):
+        text = io.StringIO()
+        sink = Sink.PeepholeSink(Sink.TextSink(text), outputs=[])
+        parse('x * 4').accept(GenVisitor(), sink)
+        self.assertIsNone(sink.close())
+        self.assertEqual(text.getvalue(), 'v2 = slli x 2\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
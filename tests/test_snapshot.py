@@ -0,0 +1,104 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Linker
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+def run_prefix(prog, size):
+    for _ in range(size):
+        prog.get_inst().eval(prog)
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def testForksMatchFullRuns(self):
+        source = 'let y <- x * x + 3 in if y < 20 then y * 2 else y - 20 end'
+        prog, reg = compile_source(source, {'x': 4})
+        run_prefix(prog, 4)
+        snapshot = prog.snapshot()
+        full, _ = compile_source(source, {'x': 4})
+        full.eval()
+        fork = snapshot.fork()
+        fork.eval()
+        self.assertEqual(dict(fork.get_env()), full.get_env())
+        self.assertEqual(fork.get_val(reg), full.get_val(reg))
+
+    def testForksAreIndependent(self):
+        prog = AsmModule.Program({'a': 5}, [AsmModule.Addi('b', 'a', 1),
+                                            AsmModule.Add('a', 'b', 'n')])
+        run_prefix(prog, 1)
+        snapshot = prog.snapshot()
+        forks = [snapshot.fork({'n': n}) for n in range(10)]
+        for fork in forks:
+            fork.eval()
+        self.assertEqual([fork.get_val('a') for fork in forks], list(range(6, 16)))
+        self.assertEqual(snapshot.env['a'], 5)
+        self.assertEqual(prog.get_val('a'), 5)
+        self.assertEqual(set(forks[0].get_env().maps[0]), {'n', 'x0', 'a'})
+
+    def testSnapshotIsFrozen(self):
+        prog = AsmModule.Program({'a': 1}, [AsmModule.Addi('a', 'a', 1)])
+        snapshot = prog.snapshot()
+        prog.eval()
+        self.assertEqual(prog.get_val('a'), 2)
+        self.assertEqual(snapshot.env['a'], 1)
+        with self.assertRaises(TypeError):
+            snapshot.env['a'] = 3
+
+    def testLaterInstructionsDoNotReachForks(self):
+        prog = AsmModule.Program({'a': 1}, [AsmModule.Addi('b', 'a', 1)])
+        snapshot = prog.snapshot()
+        prog.add_inst(AsmModule.Addi('c', 'b', 1))
+        fork = snapshot.fork()
+        fork.eval()
+        self.assertEqual(len(fork.get_insts()), 1)
+        self.assertNotIn('c', fork.get_env())
+
+    def testForkWithLoopAndLabels(self):
+        prog = AsmModule.Program({}, [AsmModule.Addi('s', 'x0', 0)])
+        prog.add_label('loop')
+        prog.add_inst(AsmModule.Add('s', 's', 'n'))
+        prog.add_inst(AsmModule.Addi('n', 'n', -1))
+        prog.add_inst(AsmModule.Blt('x0', 'n', 'loop'))
+        run_prefix(prog, 1)
+        snapshot = prog.snapshot()
+        for n in range(1, 6):
+            fork = snapshot.fork({'n': n})
+            fork.eval()
+            self.assertEqual(fork.get_val('s'), n * (n + 1) // 2)
+
+    def testSuffix(self):
+        prog, reg = compile_source('x * x', {'x': 7})
+        prog.eval()
+        snapshot = prog.snapshot()
+        suffix = AsmModule.Program({}, [AsmModule.Addi('r', reg, 1)])
+        fork = snapshot.fork(suffix=suffix)
+        fork.eval()
+        self.assertEqual(fork.get_val('r'), 50)
+
+    def testForkWithLinker(self):
+        prog = AsmModule.Program({'a': 2}, [AsmModule.Mul('b', 'a', 'a'),
+                                            AsmModule.Add('c', 'b', 'n')])
+        snapshot = prog.snapshot()
+        fork = snapshot.fork({'n': 3})
+        Linker.run(fork)
+        self.assertEqual(fork.get_val('c'), 7)
+        self.assertNotIn('c', snapshot.env)
+
+
+if __name__ == '__main__':
+    unittest.main()
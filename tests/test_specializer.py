@@ -0,0 +1,136 @@
+import unittest
+import os
+import sys
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Specializer
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+def run_residual(residual, inputs):
+    prog = AsmModule.Program(dict(residual.get_env(), **inputs), residual.get_insts())
+    prog.get_labels().update(residual.get_labels())
+    prog.eval()
+    return prog
+
+
+class TestSpecializer(unittest.TestCase):
+
+    sources = [
+        'x * y + 3 * x',
+        'if x < 3 then x * y div 2 else y mod 3',
+        'let k <- x * 4 + 1 in if k = 9 then k * y else k - y end',
+        'not (x = 2) or y <= 1 and 5 < x + y',
+    ]
+
+    def testSameEnvironments(self):
+        rng = random.Random(5)
+        for source in self.sources:
+            for _ in range(10):
+                x, y = rng.randrange(-4, 8), rng.randrange(1, 8)
+                full, _ = compile_source(source, {'x': x, 'y': y})
+                full.eval()
+                for known, inputs in [({'x': x}, {'y': y}), ({'y': y}, {'x': x}),
+                                      ({'x': x, 'y': y}, {})]:
+                    prog, _ = compile_source(source, {'x': 0, 'y': 0})
+                    residual = Specializer.specialize(prog, known)
+                    self.assertEqual(run_residual(residual, inputs).get_env(), full.get_env())
+
+    def testResidualIsSmaller(self):
+        prog, reg = compile_source('x * y + 3 * x', {'x': 0, 'y': 0})
+        residual = Specializer.specialize(prog, {'x': 2})
+        self.assertLess(len(residual.get_insts()), len(prog.get_insts()))
+        self.assertEqual(run_residual(residual, {'y': 5}).get_val(reg), 16)
+        fully = Specializer.specialize(prog, {'x': 2, 'y': 5})
+        self.assertEqual(fully.get_insts(), [])
+        self.assertEqual(fully.get_val(reg), 16)
+
+    def testOutputs(self):
+        rng = random.Random(6)
+        for source in self.sources:
+            for _ in range(10):
+                x, y = rng.randrange(-4, 8), rng.randrange(1, 8)
+                full, reg = compile_source(source, {'x': x, 'y': y})
+                full.eval()
+                prog, _ = compile_source(source, {'x': 0, 'y': 0})
+                residual = Specializer.specialize(prog, {'x': x}, [reg])
+                everything = Specializer.specialize(prog, {'x': x})
+                self.assertLessEqual(len(residual.get_insts()), len(everything.get_insts()))
+                self.assertEqual(run_residual(residual, {'y': y}).get_val(reg), full.get_val(reg))
+
+    def testDecidedBranches(self):
+        prog, reg = compile_source('if x < 3 then y + 1 else y - 1', {'x': 0, 'y': 0})
+        residual = Specializer.specialize(prog, {'x': 1})
+        self.assertFalse(any(isinstance(inst, (AsmModule.Blt, AsmModule.Beq, AsmModule.Bne))
+                             for inst in residual.get_insts()))
+        self.assertEqual(run_residual(residual, {'y': 7}).get_val(reg), 8)
+
+    def testConstantsInLoops(self):
+        prog = AsmModule.Program({'n': 0, 'z': 0}, [AsmModule.Addi('s', 'x0', 0)])
+        prog.add_label('loop')
+        prog.add_inst(AsmModule.Addi('r', 'x0', 5))
+        prog.add_inst(AsmModule.Mul('y', 'r', 'z'))
+        prog.add_inst(AsmModule.Add('r', 'r', 'y'))
+        prog.add_inst(AsmModule.Add('s', 's', 'r'))
+        prog.add_inst(AsmModule.Addi('n', 'n', -1))
+        prog.add_inst(AsmModule.Blt('x0', 'n', 'loop'))
+        for n in range(1, 4):
+            full = AsmModule.Program({'n': n, 'z': 2}, prog.get_insts())
+            full.get_labels().update(prog.get_labels())
+            full.eval()
+            residual = Specializer.specialize(prog, {'z': 2})
+            self.assertEqual(run_residual(residual, {'n': n}).get_env(), full.get_env())
+
+    def testDivisionByZeroIsKept(self):
+        prog = AsmModule.Program({}, [AsmModule.Div('q', 'a', 'b')])
+        residual = Specializer.specialize(prog, {'a': 1, 'b': 0})
+        with self.assertRaises(ZeroDivisionError):
+            run_residual(residual, {})
+
+    def testJumpAndLinkIsNotSpecialized(self):
+        prog = AsmModule.Program({}, [AsmModule.Addi('a', 'x0', 1), AsmModule.Jal('ra', 'L1')])
+        prog.add_label('L1')
+        residual = Specializer.specialize(prog, {})
+        self.assertEqual([str(i) for i in residual.get_insts()],
+                         [str(i) for i in prog.get_insts()])
+
+    def testCache(self):
+        prog, reg = compile_source('x * y + 3 * x', {'x': 0, 'y': 0})
+        specializer = Specializer.Specializer(prog, [reg], max_entries=2)
+        for x in [1, 2, 1, 3, 1, 2]:
+            self.assertEqual(specializer.run({'x': x}, {'y': 4}).get_val(reg), 7 * x)
+        self.assertEqual((specializer.hits, specializer.misses), (2, 4))
+
+    def testMemory(self):
+        insts = [AsmModule.Lw('w', 'x0', 0), AsmModule.Mul('w', 'w', 'k'),
+                 AsmModule.Addi('p', 'x0', 4), AsmModule.Sw('p', 'w', 0)]
+        for known in [{'k': 3}, {}]:
+            data = bytearray([5, 0, 0, 0, 0, 0, 0, 0])
+            prog = AsmModule.Program({'k': 0}, list(insts))
+            prog.set_memory(AsmModule.Memory(data))
+            residual = Specializer.specialize(prog, known)
+            residual.set_val('k', 3)
+            residual.eval()
+            self.assertEqual(residual.get_val('w'), 15)
+            self.assertEqual(data[4], 15)
+        data = bytearray([2, 0, 0, 0, 0, 0, 0, 0])
+        prog.set_memory(AsmModule.Memory(data))
+        specializer = Specializer.Specializer(prog)
+        self.assertEqual(specializer.run({'k': 3}, {}).get_val('w'), 6)
+        self.assertEqual(data[4], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import io
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Tracer
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+def loop(n):
+    p = AsmModule.Program({"n": n}, [AsmModule.Addi("s", "x0", 0)])
+    p.add_label("loop")
+    p.add_inst(AsmModule.Add("s", "s", "n"))
+    p.add_inst(AsmModule.Addi("n", "n", -1))
+    p.add_inst(AsmModule.Blt("x0", "n", "loop"))
+    return p
+
+
+class TestTracer(unittest.TestCase):
+
+    def testSameResults(self):
+        source = 'if x < 3 then x * x div 2 else x mod 3'
+        for x in range(-2, 6):
+            plain, _ = compile_source(source, {'x': x})
+            traced, _ = compile_source(source, {'x': x})
+            plain.eval()
+            traced.eval(tracer=Tracer.Tracer(16))
+            self.assertEqual(traced.get_env(), plain.get_env())
+
+    def testKeepsLastEntries(self):
+        tracer = Tracer.Tracer(5)
+        loop(100).eval(tracer=tracer)
+        self.assertEqual(tracer.count, 301)
+        entries = tracer.entries()
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(entries[-1], (3, 'blt', None, 4))
+        self.assertEqual(entries[-2], (2, 'addi', 'n', 0))
+        self.assertEqual(entries[-3], (1, 'add', 's', 5050))
+
+    def testBigValues(self):
+        prog = AsmModule.Program({'a': 1 << 70}, [AsmModule.Add('b', 'a', 'a'),
+                                                   AsmModule.Addi('c', 'x0', 1)])
+        tracer = Tracer.Tracer(2)
+        prog.eval(tracer=tracer)
+        self.assertEqual(tracer.entries(), [(0, 'add', 'b', 1 << 71), (1, 'addi', 'c', 1)])
+
+    def testDumpOnDefError(self):
+        out = io.StringIO()
+        prog = AsmModule.Program({'a': 1}, [AsmModule.Addi('b', 'a', 1),
+                                            AsmModule.Mul('c', 'b', 'undefined')])
+        with self.assertRaises(SystemExit) as context:
+            prog.eval(tracer=Tracer.Tracer(4, out))
+        self.assertEqual(context.exception.code, 'Def error')
+        dump = out.getvalue()
+        self.assertIn('addi', dump)
+        self.assertIn('failed: c = mul b undefined', dump)
+        self.assertIn("SystemExit('Def error')", dump)
+
+    def testDumpOnDivisionByZero(self):
+        out = io.StringIO()
+        prog = AsmModule.Program({'a': 1}, [AsmModule.Div('b', 'a', 'x0')])
+        with self.assertRaises(ZeroDivisionError):
+            prog.eval(tracer=Tracer.Tracer(4, out))
+        self.assertIn('ZeroDivisionError', out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import os
+import sys
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Expression import *
+from Visitor import CtrGenVisitor
+import Unifier
+
+
+def reference_classes(constraints):
+    """
+    Computes the equivalence classes by merging sets, like the first
+    implementation of unify.
+    """
+    sets = {}
+    for t0, t1 in constraints:
+        if t0 != t1:
+            new_set = sets.get(t0, set()) | sets.get(t1, set()) | {t0, t1}
+            for type_name in new_set:
+                sets[type_name] = new_set
+    return sets
+
+
+class TestUnifier(unittest.TestCase):
+
+    def testSameClassesAsSetMerging(self):
+        rng = random.Random(9)
+        names = [f'TV_{i}' for i in range(40)] + [int, bool]
+        for _ in range(50):
+            constraints = [(rng.choice(names), rng.choice(names))
+                           for _ in range(rng.randrange(1, 60))]
+            self.assertEqual(Unifier.unify(constraints, {}), reference_classes(constraints))
+
+    def testMembersShareTheirSet(self):
+        sets = Unifier.unify([('a', 'b'), ('b', int), ('c', bool)], {})
+        self.assertIs(sets['a'], sets[int])
+        self.assertIsNot(sets['a'], sets['c'])
+
+    def testLongChainsDoNotRecurse(self):
+        size = 200000
+        constraints = [(f'TV_{i}', f'TV_{i + 1}') for i in range(size)]
+        constraints.append((f'TV_{size}', int))
+        type_names = Unifier.name_sets(Unifier.unify(constraints, {}))
+        self.assertEqual(len(type_names), size + 2)
+        self.assertTrue(all(name is int for name in type_names.values()))
+
+    def testSeedSets(self):
+        sets = Unifier.unify([('b', 'c')], {'a': {'a', 'b'}})
+        self.assertEqual(sets['c'], {'a', 'b', 'c'})
+
+    def testNameSetsErrors(self):
+        for constraints in [[('a', 'b')], [('a', int), ('a', bool)]]:
+            with self.assertRaises(SystemExit) as context:
+                Unifier.name_sets(Unifier.unify(constraints, {}))
+            self.assertEqual(context.exception.code, 'Type error')
+
+    def parse(self, source):
+        return Parser(Lexer(source).tokens()).parse()
+
+    def testStreamingMatchesListUnification(self):
+        sources = [
+            'let v <- 1 in let y <- v in y < 3 end end',
+            'let w <- if (let v <- 1 in v end) < 2 then true else false in w and w end',
+            'let k <- 3 * 4 in if k = 12 then not (k <= 2) else k < 0 end',
+        ]
+        for source in sources:
+            exp = self.parse(source)
+            ev = CtrGenVisitor()
+            constraints = list(exp.accept(ev, ev.fresh_type_var()))
+            expected = Unifier.name_sets(Unifier.unify(constraints, {}))
+            self.assertEqual(Unifier.infer_types(exp), expected)
+
+    def testConstraintsAreGenerated(self):
+        ev = CtrGenVisitor()
+        constraints = self.parse('1 + 2').accept(ev, ev.fresh_type_var())
+        self.assertEqual(next(constraints), (int, 'TV_1'))
+
+    def testFunctionTypes(self):
+        types = Unifier.infer_types(self.parse(
+            'let f <- fn x: int -> int => x 3 in f (fn y: int => y * 2) end'))
+        self.assertEqual(types['f'], ArrowType(ArrowType(int, int), int))
+        self.assertEqual(types['y'], int)
+        for source in ['let f <- fn x: int => x in f true end', '(fn x: int => x) 1 2']:
+            with self.assertRaises(SystemExit) as context:
+                Unifier.infer_types(self.parse(source))
+            self.assertEqual(context.exception.code, 'Type error')
+
+    def testLargeExpression(self):
+        exp = Num(0)
+        for i in range(300):
+            exp = Let(f'v{i}', exp, Add(Var(f'v{i}'), Num(i)))
+        types = Unifier.infer_types(exp)
+        self.assertTrue(all(types[f'v{i}'] is int for i in range(300)))
+
+
+if __name__ == '__main__':
+    unittest.main()
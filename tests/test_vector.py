@@ -0,0 +1,86 @@
+import unittest
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+
+try:
+    import Vector
+except ImportError:
+    Vector = None
+
+
+def compile_source(source):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program({}, [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+def run_scalar(prog, env):
+    copy = AsmModule.Program(dict(env), prog.get_insts())
+    copy.eval()
+    return copy.get_env()
+
+
+@unittest.skipIf(Vector is None, 'NumPy is not installed')
+class TestVector(unittest.TestCase):
+
+    sources = [
+        'x mod 3 + 7 div (x * x + 1)',
+        '(x * 2 - 3) * (4 - (y + (5 * x)))',
+        'x = y',
+        'not (x <= y) = (y < x)',
+        'x div 4 + x * 8 - x mod 16',
+    ]
+
+    def testLanesMatchScalar(self):
+        rng = random.Random(0)
+        envs = [{'x': rng.randint(-50, 50), 'y': rng.randint(-50, 50)} for _ in range(200)]
+        for source in self.sources:
+            prog, _ = compile_source(source)
+            regs = Vector.run_batch(prog, envs)
+            for lane, env in enumerate(envs):
+                for reg, value in run_scalar(prog, env).items():
+                    self.assertEqual(regs[reg][lane], value, (source, env, reg))
+
+    def testFloorDivision(self):
+        prog = AsmModule.Program({}, [AsmModule.Div("q", "a", "b")])
+        regs = Vector.VectorProgram(prog).eval({"a": [7, -7, 7, -7], "b": [2, 2, -2, -2]})
+        self.assertEqual(regs["q"].tolist(), [3, -4, -4, 3])
+
+    def testScalarInputsBroadcast(self):
+        prog = AsmModule.Program({}, [AsmModule.Slti("t", "a", 0), AsmModule.Add("s", "a", "b")])
+        regs = Vector.VectorProgram(prog).eval({"a": [-1, 0, 1], "b": 10})
+        self.assertEqual(regs["t"].tolist(), [1, 0, 0])
+        self.assertEqual(regs["s"].tolist(), [9, 10, 11])
+
+    def testOnlyScalarInputs(self):
+        prog = AsmModule.Program({}, [AsmModule.Mul("p", "a", "b")])
+        regs = Vector.VectorProgram(prog).eval({"a": 6, "b": 7})
+        self.assertEqual(regs["p"].tolist(), [42])
+
+    def testDivisionByZero(self):
+        prog = AsmModule.Program({}, [AsmModule.Div("q", "a", "b")])
+        with self.assertRaises(ZeroDivisionError):
+            Vector.VectorProgram(prog).eval({"a": [1, 2], "b": [1, 0]})
+
+    def testUndefinedRegister(self):
+        prog = AsmModule.Program({}, [AsmModule.Add("c", "a", "b")])
+        with self.assertRaises(SystemExit):
+            Vector.VectorProgram(prog).eval({"a": [1, 2]})
+
+    def testBranchesAreRejected(self):
+        prog, _ = compile_source('if x < 0 then 1 else 2')
+        with self.assertRaises(SystemExit):
+            Vector.VectorProgram(prog)
+
+
+if __name__ == '__main__':
+    unittest.main()
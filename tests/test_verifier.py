@@ -0,0 +1,106 @@
+import unittest
+import os
+import sys
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Lexer import Lexer
+from Parser import Parser
+from Visitor import GenVisitor
+import Asm as AsmModule
+import Linker
+import Verifier
+
+
+def compile_source(source, env):
+    exp = Parser(Lexer(source).tokens()).parse()
+    prog = AsmModule.Program(dict(env), [])
+    reg = exp.accept(GenVisitor(), prog)
+    return prog, reg
+
+
+class TestVerifier(unittest.TestCase):
+
+    def testGeneratedCodeVerifies(self):
+        sources = [
+            'if x < 3 then x * x div 2 else x mod 3',
+            'let y <- x * 7 in if y = 14 then y else 0 - y end',
+            'not (x = 2) or x <= 1 and 5 < x',
+        ]
+        for source in sources:
+            prog, _ = compile_source(source, {'x': 1})
+            self.assertTrue(Verifier.verify(prog))
+            self.assertFalse(Verifier.verify(prog, []))
+
+    def testDefinedOnOnePathOnly(self):
+        prog = AsmModule.Program({'a': 1}, [AsmModule.Beq('a', 'x0', 'L1'),
+                                            AsmModule.Addi('b', 'x0', 2)])
+        prog.add_label('L1')
+        prog.add_inst(AsmModule.Add('c', 'b', 'a'))
+        self.assertEqual(Verifier.undefined_reads(prog), [(2, 'b')])
+        prog.get_insts().insert(0, AsmModule.Addi('b', 'x0', 3))
+        prog.get_labels()['L1'] += 1
+        self.assertTrue(Verifier.verify(prog))
+
+    def testLoopCarriedDefinition(self):
+        prog = AsmModule.Program({'n': 3}, [])
+        prog.add_label('loop')
+        prog.add_inst(AsmModule.Add('s', 's', 'n'))
+        prog.add_inst(AsmModule.Addi('n', 'n', -1))
+        prog.add_inst(AsmModule.Blt('x0', 'n', 'loop'))
+        self.assertEqual(Verifier.undefined_reads(prog), [(0, 's')])
+
+    def testUnreachableCodeIsNotChecked(self):
+        prog = AsmModule.Program({}, [AsmModule.Jal('x0', 'L1'),
+                                      AsmModule.Add('a', 'b', 'c')])
+        prog.add_label('L1')
+        self.assertTrue(Verifier.verify(prog))
+
+    def testMissingLabel(self):
+        prog = AsmModule.Program({}, [AsmModule.Jal('x0', 'nowhere')])
+        self.assertEqual(Verifier.undefined_reads(prog), [(0, 'nowhere')])
+
+    def testSameResults(self):
+        source = 'if x < 3 then x * x div 2 else x mod 3'
+        for x in range(-2, 6):
+            plain, _ = compile_source(source, {'x': x})
+            unchecked, _ = compile_source(source, {'x': x})
+            plain.eval()
+            Verifier.run(unchecked)
+            self.assertEqual(unchecked.get_env(), plain.get_env())
+            self.assertEqual(unchecked.pc, plain.pc)
+
+    def testReuseOverOtherInputs(self):
+        prog, reg = compile_source('x * x + y', {'x': 0, 'y': 0})
+        code = Verifier.UncheckedProgram(prog)
+        rng = random.Random(3)
+        for _ in range(20):
+            x, y = rng.randrange(-50, 50), rng.randrange(-50, 50)
+            run = AsmModule.Program({'x': x, 'y': y}, prog.get_insts())
+            code.eval(run)
+            self.assertEqual(run.get_val(reg), x * x + y)
+
+    def testUnverifiedProgramsKeepChecks(self):
+        prog = AsmModule.Program({'a': 1}, [AsmModule.Addi('b', 'a', 1),
+                                            AsmModule.Add('c', 'b', 'd')])
+        code = Verifier.UncheckedProgram(prog)
+        self.assertFalse(code.verified)
+        with self.assertRaises(SystemExit) as context:
+            code.eval(prog)
+        self.assertEqual(context.exception.code, 'Def error')
+        self.assertEqual(prog.get_val('b'), 2)
+
+    def testVerifiedCodeRunsWithoutChecks(self):
+        prog = AsmModule.Program({'a': 1}, [AsmModule.Beq('a', 'b', 'L1')])
+        prog.add_label('L1')
+        linked = Linker.LinkedProgram(prog)
+        with self.assertRaises(SystemExit):
+            Linker.execute(linked.code, list(linked.regs))
+        self.assertEqual(Verifier.execute(linked.code, list(linked.regs)), 1)
+        with self.assertRaises(TypeError):
+            Verifier.execute(((Linker.ADD, 1, 2, 0),), [0, None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()